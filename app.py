@@ -6,6 +6,7 @@ from models import db, User
 from routes import main
 from auth import auth
 from tasks import tasks
+from cli import atd_cli
 import secrets
 from zoneinfo import ZoneInfo
 
@@ -23,6 +24,37 @@ def create_app(config_class=Config):
     # データベース初期化
     db.init_app(app)
     
+    # UserPerformance の増分更新（設定で有効な場合のみ）
+    if app.config.get('PERFORMANCE_INCREMENTAL'):
+        from performance_tracker import register_performance_listeners
+        register_performance_listeners(db.session)
+    
+    # チームタスクの担当者数カウンター（TaskAssignee の変更時に同期）
+    from team_task_counters import register_team_task_counter_listeners
+    register_team_task_counter_listeners(db.session)
+    
+    # マインドマップノードの階層パス（ノードの追加・移動時に設定）
+    from mindmap_hierarchy import register_mindmap_hierarchy_listeners
+    register_mindmap_hierarchy_listeners(db.session)
+    
+    # マインドマップの達成度の伝播（担当者数カウンターの更新後に実行するため、その後に登録）
+    from mindmap_progress import register_mindmap_progress_listeners
+    register_mindmap_progress_listeners(db.session)
+    
+    # マインドマップの差分同期用リビジョン（達成度の伝播で更新されたノードも含めるため、その後に登録）
+    from mindmap_sync import register_mindmap_sync_listeners
+    register_mindmap_sync_listeners(db.session)
+    
+    # ユーザー単位の集計スナップショットキャッシュ（タスク更新のコミット時に破棄）
+    # 未読通知数キャッシュ（通知の作成・既読のコミット時に差分で更新）
+    from cache import snapshot_cache, unread_counter
+    snapshot_cache.init_app(app)
+    unread_counter.init_app(app)
+    
+    # 通知の一括作成（設定で有効な場合はコミット後にバックグラウンドで作成）
+    from notification_fanout import notification_fanout
+    notification_fanout.init_app(app)
+    
     # Flask-Migrate 初期化
     migrate = Migrate(app, db)
     
@@ -49,12 +81,9 @@ def create_app(config_class=Config):
         }
 
         if current_user.is_authenticated:
-            from models import Notification
-            unread_count = Notification.query.filter_by(
-                user_id=current_user.id,
-                read=False
-            ).count()
-            context['unread_notifications'] = unread_count
+            # 未読通知数はキャッシュから取得（キャッシュが無い場合のみ COUNT）
+            from cache import unread_counter
+            context['unread_notifications'] = unread_counter.get(current_user.id)
         else:
             context['unread_notifications'] = 0
 
@@ -65,6 +94,9 @@ def create_app(config_class=Config):
     app.register_blueprint(auth, url_prefix='/auth')
     app.register_blueprint(tasks, url_prefix='')
     
+    # CLI コマンド登録（flask atd ...）
+    app.cli.add_command(atd_cli)
+    
     # データベース作成と初期ユーザー作成
     with app.app_context():
         try:
@@ -78,17 +110,123 @@ def create_app(config_class=Config):
                 db.create_all()
                 print('✅ データベーステーブルを作成しました')
             else:
-                # 新しいカラム task_card_node_id が無い場合は追加
+                # 新しいテーブルが無い場合は作成（既存のテーブルはそのまま）
+                db.create_all()
+                
+                # 新しいカラムが無い場合は追加
+                new_columns = [
+                    ('tasks', 'task_card_node_id', 'INTEGER'),
+                    ('users', 'last_rollover_date', 'DATE'),
+                    ('tasks', 'template_id', 'INTEGER'),
+                    ('tasks', 'occurrence_date', 'DATE'),
+                    ('team_tasks', 'assignee_count', 'INTEGER NOT NULL DEFAULT 0'),
+                    ('team_tasks', 'completed_assignee_count', 'INTEGER NOT NULL DEFAULT 0'),
+                    ('mindmaps', 'progress', 'INTEGER NOT NULL DEFAULT 0'),
+                    ('mindmaps', 'leaf_count', 'INTEGER NOT NULL DEFAULT 0'),
+                    ('mindmaps', 'leaf_progress_sum', 'INTEGER NOT NULL DEFAULT 0'),
+                    ('mindmaps', 'revision', 'INTEGER NOT NULL DEFAULT 0'),
+                    ('mindmap_nodes', 'revision', 'INTEGER NOT NULL DEFAULT 0'),
+                    ('mindmap_nodes', 'path', 'VARCHAR(1024)'),
+                    ('notifications', 'related_team_task_id', 'INTEGER'),
+                ]
+                added_columns = set()
+                for table_name, column_name, column_type in new_columns:
+                    if table_name not in existing_tables:
+                        continue
+                    columns = [column['name'] for column in inspector.get_columns(table_name)]
+                    if column_name in columns:
+                        continue
+                    try:
+                        with db.engine.connect() as conn:
+                            conn.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}'))
+                            conn.commit()
+                        added_columns.add((table_name, column_name))
+                        print(f'✅ {table_name} テーブルに {column_name} カラムを追加しました')
+                    except Exception as alter_error:
+                        print(f'⚠️ {column_name} カラムの追加に失敗しました: {alter_error}')
+                
+                # 担当者数カウンターを追加した場合は既存のチームタスクの件数を数える
+                if ('team_tasks', 'assignee_count') in added_columns:
+                    try:
+                        from team_task_counters import recompute_team_task_counters
+                        repaired = recompute_team_task_counters()
+                        db.session.commit()
+                        print(f'✅ チームタスク {repaired} 件の担当者数を集計しました')
+                    except Exception as repair_error:
+                        db.session.rollback()
+                        print(f'⚠️ 担当者数の集計に失敗しました: {repair_error}')
+                
+                # 達成度カラムを追加した場合は既存のマップの達成度を計算して保存
+                if ('mindmaps', 'progress') in added_columns:
+                    try:
+                        from mindmap_progress import repair_mindmap_progress
+                        repaired = repair_mindmap_progress()
+                        db.session.commit()
+                        print(f'✅ マインドマップの達成度を保存しました（ノード {repaired} 件を更新）')
+                    except Exception as repair_error:
+                        db.session.rollback()
+                        print(f'⚠️ マインドマップの達成度の保存に失敗しました: {repair_error}')
+                
+                # 階層パスを追加した場合は既存のノードのパスを設定
+                if ('mindmap_nodes', 'path') in added_columns:
+                    try:
+                        from mindmap_hierarchy import rebuild_node_paths
+                        updated = rebuild_node_paths()
+                        db.session.commit()
+                        print(f'✅ マインドマップノード {updated} 件の階層パスを設定しました')
+                    except Exception as backfill_error:
+                        db.session.rollback()
+                        print(f'⚠️ 階層パスの設定に失敗しました: {backfill_error}')
+                
+                # 未読通知数の COUNT 用複合インデックス
+                if 'notifications' in existing_tables:
+                    try:
+                        with db.engine.connect() as conn:
+                            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_notifications_user_id_read ON notifications (user_id, read)'))
+                            conn.commit()
+                    except Exception as index_error:
+                        print(f'⚠️ ix_notifications_user_id_read インデックスの作成に失敗しました: {index_error}')
+                
+                # マインドマップの差分取得用インデックス
+                if 'mindmap_nodes' in existing_tables:
+                    try:
+                        with db.engine.connect() as conn:
+                            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_mindmap_nodes_mindmap_id_revision ON mindmap_nodes (mindmap_id, revision)'))
+                            conn.commit()
+                    except Exception as index_error:
+                        print(f'⚠️ ix_mindmap_nodes_mindmap_id_revision インデックスの作成に失敗しました: {index_error}')
+                    
+                    # 子孫ノードの検索用インデックス
+                    try:
+                        with db.engine.connect() as conn:
+                            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_mindmap_nodes_mindmap_id_path ON mindmap_nodes (mindmap_id, path)'))
+                            conn.commit()
+                    except Exception as index_error:
+                        print(f'⚠️ ix_mindmap_nodes_mindmap_id_path インデックスの作成に失敗しました: {index_error}')
+                
+                # テンプレート生成タスクの重複防止用ユニークインデックス
                 if 'tasks' in existing_tables:
-                    columns = [column['name'] for column in inspector.get_columns('tasks')]
-                    if 'task_card_node_id' not in columns:
-                        try:
-                            with db.engine.connect() as conn:
-                                conn.execute(text('ALTER TABLE tasks ADD COLUMN task_card_node_id INTEGER'))
-                                conn.commit()
-                            print('✅ tasks テーブルに task_card_node_id カラムを追加しました')
-                        except Exception as alter_error:
-                            print(f'⚠️ task_card_node_id カラムの追加に失敗しました: {alter_error}')
+                    try:
+                        with db.engine.connect() as conn:
+                            conn.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS uq_tasks_template_occurrence ON tasks (template_id, occurrence_date)'))
+                            conn.commit()
+                    except Exception as index_error:
+                        print(f'⚠️ uq_tasks_template_occurrence インデックスの作成に失敗しました: {index_error}')
+                    
+                    # 分類ごとのタスク一覧のページ送り用インデックス
+                    try:
+                        with db.engine.connect() as conn:
+                            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_tasks_user_id_category_id ON tasks (user_id, category, id)'))
+                            conn.commit()
+                    except Exception as index_error:
+                        print(f'⚠️ ix_tasks_user_id_category_id インデックスの作成に失敗しました: {index_error}')
+                    
+                    try:
+                        with db.engine.connect() as conn:
+                            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_tasks_user_id_team_id ON tasks (user_id, archived, id) WHERE team_task_id IS NOT NULL'))
+                            conn.commit()
+                    except Exception as index_error:
+                        print(f'⚠️ ix_tasks_user_id_team_id インデックスの作成に失敗しました: {index_error}')
             
             # 初期管理者ユーザーを作成（存在しない場合のみ）
             admin_user = User.query.filter_by(username='亀山瑞喜').first()
@@ -131,6 +269,11 @@ def create_app(config_class=Config):
         except Exception as e:
             print(f'⚠️ データベース初期化エラー: {e}')
     
+    # 日次処理のプロセス内スケジューラー（設定で有効な場合のみ）
+    if app.config.get('ROLLOVER_SCHEDULER_ENABLED'):
+        from daily_processor import start_rollover_scheduler
+        start_rollover_scheduler(app)
+    
     return app
 
 # Render デプロイ用の app オブジェクト
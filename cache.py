@@ -0,0 +1,300 @@
+"""
+ユーザーごとの集計スナップショット・未読通知数のキャッシュ
+- ダッシュボード・モバイルホーム・プロフィールで使う集計値をユーザー単位で保持する
+- 未読通知数は書き込み時（通知の作成・既読・一括既読）に差分で更新し、描画時は COUNT しない
+- 既定のバックエンドはプロセス内の LRU（TTL 付き）。get / set / incr / delete / clear / size を
+  持つオブジェクトを渡せば別のバックエンドに差し替えられる
+- タスク・通知の書き込み（ORM の flush）を検知し、コミット時に該当ユーザーのキャッシュへ反映する
+- ORM を経由しない一括更新では invalidate_user / reset / clear（コミット時に反映する場合は
+  invalidate_users_on_commit / adjust_unread_on_commit）を明示的に呼ぶ
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+
+_DIRTY_USERS_KEY = 'snapshot_cache_dirty_users'
+_UNREAD_DELTAS_KEY = 'unread_counter_deltas'
+
+
+class MemoryLRUBackend:
+    """プロセス内の LRU キャッシュ（TTL 付き、スレッドセーフ）"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def incr(self, key, delta):
+        """キャッシュ済みの数値に加算（キーが無い・期限切れの場合は何もせず None を返す）"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            value = max(value + delta, 0)
+            self._data[key] = (expires_at, value)
+            return value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def size(self):
+        with self._lock:
+            return len(self._data)
+
+
+class SnapshotCache:
+    """ユーザー単位の集計スナップショットキャッシュ（ヒット・ミス数を記録）"""
+
+    def __init__(self, backend=None, ttl=60):
+        self.backend = backend or MemoryLRUBackend()
+        self.ttl = ttl
+        self.enabled = True
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+        self._stats_lock = threading.Lock()
+        self._listeners_registered = False
+
+    def init_app(self, app, backend=None):
+        """アプリの設定からバックエンドと TTL を設定し、無効化用のリスナーを登録"""
+        from models import db
+
+        self.enabled = app.config.get('SNAPSHOT_CACHE_ENABLED', True)
+        self.ttl = app.config.get('SNAPSHOT_CACHE_TTL', self.ttl)
+        if backend is not None:
+            self.backend = backend
+        else:
+            self.backend = MemoryLRUBackend(maxsize=app.config.get('SNAPSHOT_CACHE_MAXSIZE', 1024))
+
+        if not self._listeners_registered:
+            event.listen(db.session, 'after_flush', _collect_dirty_users)
+            event.listen(db.session, 'after_commit', self._invalidate_committed)
+            event.listen(db.session, 'after_rollback', _discard_dirty_users)
+            self._listeners_registered = True
+
+        app.extensions['snapshot_cache'] = self
+
+    @staticmethod
+    def _key(user_id):
+        return f'user_snapshot:{user_id}'
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def get_or_build(self, user_id, version, builder):
+        """
+        キャッシュ済みのスナップショットを返す。無い場合は builder() で作成して保存
+        - version（日付など）が一致しないスナップショットはミス扱い
+        """
+        if not self.enabled:
+            return builder()
+
+        cached = self.backend.get(self._key(user_id))
+        if cached is not None and cached.get('version') == version:
+            self._count('hits')
+            return cached['snapshot']
+
+        self._count('misses')
+        snapshot = builder()
+        self.backend.set(self._key(user_id), {'version': version, 'snapshot': snapshot}, self.ttl)
+        return snapshot
+
+    def invalidate_user(self, user_id):
+        """指定ユーザーのスナップショットを破棄"""
+        self.backend.delete(self._key(user_id))
+        self._count('invalidations')
+
+    def clear(self):
+        """全ユーザーのスナップショットを破棄"""
+        self.backend.clear()
+        self._count('invalidations')
+
+    def stats(self):
+        """ヒット・ミス数などの統計"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups * 100, 1) if lookups else 0.0
+        stats['size'] = self.backend.size() if hasattr(self.backend, 'size') else None
+        stats['ttl'] = self.ttl
+        stats['enabled'] = self.enabled
+        return stats
+
+    def _invalidate_committed(self, session):
+        user_ids = session.info.pop(_DIRTY_USERS_KEY, None)
+        for user_id in user_ids or ():
+            self.invalidate_user(user_id)
+
+
+def _collect_dirty_users(session, flush_context):
+    """flush されたタスク・パフォーマンスの user_id を記録（コミット時に破棄する）"""
+    from models import Task, UserPerformance
+    from sqlalchemy import inspect as sa_inspect
+
+    user_ids = session.info.setdefault(_DIRTY_USERS_KEY, set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Task, UserPerformance)):
+            # 削除済みの行を再読み込みしないよう、読み込み済みの値だけを見る
+            user_id = sa_inspect(obj).dict.get('user_id')
+            if user_id is not None:
+                user_ids.add(user_id)
+
+
+def _discard_dirty_users(session):
+    session.info.pop(_DIRTY_USERS_KEY, None)
+
+
+def invalidate_users_on_commit(session, user_ids):
+    """ORM を経由せずに変更したユーザーのスナップショットを、コミット時に破棄するよう登録"""
+    session.info.setdefault(_DIRTY_USERS_KEY, set()).update(
+        user_id for user_id in user_ids if user_id is not None
+    )
+
+
+class UnreadNotificationCounter:
+    """
+    ユーザーごとの未読通知数キャッシュ
+    - キャッシュに無い場合のみ (user_id, read) インデックスで COUNT して保存する
+    - 通知の作成・既読・削除はコミット時に差分で反映する
+    - TTL は他プロセスでの更新を取り込むための上限
+    """
+
+    def __init__(self, backend=None, ttl=300):
+        self.backend = backend or MemoryLRUBackend()
+        self.ttl = ttl
+        self._listeners_registered = False
+
+    def init_app(self, app, backend=None):
+        """アプリの設定からバックエンドと TTL を設定し、差分反映用のリスナーを登録"""
+        from models import db
+
+        self.ttl = app.config.get('UNREAD_COUNTER_TTL', self.ttl)
+        if backend is not None:
+            self.backend = backend
+        else:
+            self.backend = MemoryLRUBackend(maxsize=app.config.get('SNAPSHOT_CACHE_MAXSIZE', 1024))
+
+        if not self._listeners_registered:
+            event.listen(db.session, 'after_flush', _collect_unread_deltas)
+            event.listen(db.session, 'after_commit', self._apply_committed)
+            event.listen(db.session, 'after_rollback', _discard_unread_deltas)
+            self._listeners_registered = True
+
+        app.extensions['unread_counter'] = self
+
+    @staticmethod
+    def _key(user_id):
+        return f'unread_notifications:{user_id}'
+
+    def get(self, user_id):
+        """未読通知数（キャッシュに無い場合のみ DB で COUNT）"""
+        count = self.backend.get(self._key(user_id))
+        if count is None:
+            from models import Notification
+            count = Notification.query.filter_by(user_id=user_id, read=False).count()
+            self.backend.set(self._key(user_id), count, self.ttl)
+        return count
+
+    def adjust(self, user_id, delta):
+        """キャッシュ済みの未読数に差分を加算（キャッシュが無い場合は次回 COUNT する）"""
+        if delta:
+            self.backend.incr(self._key(user_id), delta)
+
+    def reset(self, user_id, count=0):
+        """未読数を指定値に設定（一括既読など）"""
+        self.backend.set(self._key(user_id), count, self.ttl)
+
+    def invalidate(self, user_id):
+        self.backend.delete(self._key(user_id))
+
+    def clear(self):
+        self.backend.clear()
+
+    def _apply_committed(self, session):
+        deltas = session.info.pop(_UNREAD_DELTAS_KEY, None)
+        for user_id, delta in (deltas or {}).items():
+            if delta is None:
+                self.invalidate(user_id)
+            else:
+                self.adjust(user_id, delta)
+
+
+def _add_unread_delta(deltas, user_id, delta):
+    if user_id is None or (user_id in deltas and deltas[user_id] is None):
+        return
+    deltas[user_id] = deltas.get(user_id, 0) + delta
+
+
+def _collect_unread_deltas(session, flush_context):
+    """flush された通知から未読数の差分を計算（コミット時に反映する）"""
+    from models import Notification
+    from sqlalchemy import inspect as sa_inspect
+
+    deltas = session.info.setdefault(_UNREAD_DELTAS_KEY, {})
+    for obj in session.new:
+        if isinstance(obj, Notification) and not obj.read:
+            _add_unread_delta(deltas, obj.user_id, 1)
+    for obj in session.dirty:
+        if isinstance(obj, Notification):
+            history = sa_inspect(obj).attrs.read.history
+            if history.has_changes() and history.deleted:
+                was_read, is_read = bool(history.deleted[0]), bool(obj.read)
+                if was_read != is_read:
+                    _add_unread_delta(deltas, obj.user_id, 1 if was_read else -1)
+            elif history.has_changes():
+                # 変更前の値が不明な場合は次回 COUNT し直す
+                deltas[obj.user_id] = None
+    for obj in session.deleted:
+        if isinstance(obj, Notification):
+            state = sa_inspect(obj).dict
+            user_id = state.get('user_id')
+            if 'read' not in state:
+                if user_id is not None:
+                    deltas[user_id] = None
+            elif not state['read']:
+                _add_unread_delta(deltas, user_id, -1)
+
+
+def _discard_unread_deltas(session):
+    session.info.pop(_UNREAD_DELTAS_KEY, None)
+
+
+def adjust_unread_on_commit(session, counts):
+    """ORM を経由せずに作成した未読通知の件数 {user_id: 件数} を、コミット時に未読数キャッシュへ加算するよう登録"""
+    deltas = session.info.setdefault(_UNREAD_DELTAS_KEY, {})
+    for user_id, count in counts.items():
+        _add_unread_delta(deltas, user_id, count)
+
+
+snapshot_cache = SnapshotCache()
+unread_counter = UnreadNotificationCounter()
@@ -0,0 +1,162 @@
+"""
+管理用 CLI コマンド（flask atd ...）
+"""
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup
+
+atd_cli = AppGroup('atd', help='ATD の運用コマンド')
+
+
+@atd_cli.command('rollover')
+@click.option('--date', 'date_str', default=None, help='処理対象の日付（YYYY-MM-DD、省略時は日本時間の今日）')
+@click.option('--user-id', 'user_ids', type=int, multiple=True, help='対象ユーザーID（複数指定可、省略時は全ユーザー）')
+def rollover_command(date_str, user_ids):
+    """全ユーザーの日次処理（タスク繰り越し・アーカイブ・テンプレート生成）を実行"""
+    from daily_processor import run_daily_rollover_batch
+
+    today = None
+    if date_str:
+        try:
+            today = datetime.strptime(date_str, '%Y-%m-%d').date()
+        except ValueError:
+            raise click.BadParameter('YYYY-MM-DD 形式で指定してください', param_hint='--date')
+
+    result = run_daily_rollover_batch(today=today, user_ids=list(user_ids) or None)
+
+    for entry in result['users']:
+        line = (
+            f"user={entry['user_id']} advanced={entry['advanced']} calendar={entry['calendar_moved']} "
+            f"archived={entry['archived']} generated={entry['generated']} time={entry['elapsed_ms']}ms"
+        )
+        if entry['error']:
+            line += f" error={entry['error']}"
+        click.echo(line)
+
+    totals = result['totals']
+    click.echo(
+        f"date={result['date']} users={totals['users']} failed={totals['failed']} "
+        f"advanced={totals['advanced']} calendar={totals['calendar_moved']} "
+        f"archived={totals['archived']} generated={totals['generated']} time={result['elapsed_ms']}ms"
+    )
+
+
+@atd_cli.command('reconcile-performance')
+@click.option('--date', 'date_str', default=None, help='再計算の最終日（YYYY-MM-DD、省略時は日本時間の今日）')
+@click.option('--days', default=1, show_default=True, type=click.IntRange(min=1), help='最終日から遡って再計算する日数')
+@click.option('--user-id', 'user_ids', type=int, multiple=True, help='対象ユーザーID（複数指定可、省略時は全ユーザー）')
+def reconcile_performance_command(date_str, days, user_ids):
+    """UserPerformance をタスクから全件再計算し、増分更新のずれを補正（連続日数も履歴から再構築）"""
+    from datetime import timedelta
+    from zoneinfo import ZoneInfo
+    from models import User, UserPerformance, db
+
+    if date_str:
+        try:
+            end_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        except ValueError:
+            raise click.BadParameter('YYYY-MM-DD 形式で指定してください', param_hint='--date')
+    else:
+        end_date = datetime.now(ZoneInfo('Asia/Tokyo')).date()
+
+    if user_ids:
+        target_ids = list(user_ids)
+    else:
+        target_ids = [row[0] for row in db.session.query(User.id).order_by(User.id).all()]
+
+    tracked = ('tasks_created', 'tasks_completed', 'total_work_seconds', 'streak_days')
+    corrected = 0
+    for user_id in target_ids:
+        for offset in range(days - 1, -1, -1):
+            target_date = end_date - timedelta(days=offset)
+            before = db.session.query(
+                *(getattr(UserPerformance, name) for name in tracked)
+            ).filter_by(user_id=user_id, date=target_date).first()
+            performance = UserPerformance.update_daily_performance(user_id, date=target_date, rebuild_streak=True)
+            after = tuple(getattr(performance, name) for name in tracked)
+            if (tuple(before) if before is not None else (0, 0, 0, 0)) != after:
+                corrected += 1
+                click.echo(
+                    f"user={user_id} date={target_date} "
+                    f"before={tuple(before) if before is not None else None} after={after}"
+                )
+
+    click.echo(f"users={len(target_ids)} days={days} corrected={corrected}")
+
+
+@atd_cli.command('backfill-rollups')
+@click.option('--start', 'start_str', default=None, help='開始日（YYYY-MM-DD、省略時は最初のタスクの作成日）')
+@click.option('--end', 'end_str', default=None, help='終了日（YYYY-MM-DD、省略時は日本時間の昨日）')
+@click.option('--user-id', 'user_ids', type=int, multiple=True, help='対象ユーザーID（複数指定可、省略時は全ユーザー）')
+@click.option('--chunk-days', default=31, show_default=True, type=click.IntRange(min=1), help='1回のトランザクションで処理する日数')
+def backfill_rollups_command(start_str, end_str, user_ids, chunk_days):
+    """既存のタスク履歴から日別集計（daily_task_rollups）を作成"""
+    from datetime import timedelta
+    from zoneinfo import ZoneInfo
+    from models import db
+    from report_stats import earliest_task_date, refresh_daily_rollups
+
+    def parse(value, name):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise click.BadParameter('YYYY-MM-DD 形式で指定してください', param_hint=name)
+
+    end_date = parse(end_str, '--end') if end_str else datetime.now(ZoneInfo('Asia/Tokyo')).date() - timedelta(days=1)
+    if start_str:
+        start_date = parse(start_str, '--start')
+    else:
+        start_date = earliest_task_date(list(user_ids) or None)
+        if start_date is None:
+            click.echo('タスクがありません')
+            return
+
+    target_ids = list(user_ids) or None
+    written = 0
+    chunk_start = start_date
+    while chunk_start <= end_date:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end_date)
+        count = refresh_daily_rollups(chunk_start, chunk_end, user_ids=target_ids)
+        db.session.commit()
+        click.echo(f"{chunk_start}〜{chunk_end}: rows={count}")
+        written += count
+        chunk_start = chunk_end + timedelta(days=1)
+
+    click.echo(f"start={start_date} end={end_date} rows={written}")
+
+
+@atd_cli.command('repair-team-counters')
+@click.option('--team-task-id', 'team_task_ids', type=int, multiple=True, help='対象チームタスクID（複数指定可、省略時は全件）')
+def repair_team_counters_command(team_task_ids):
+    """チームタスクの担当者数・完了済み担当者数を task_assignees から数え直す"""
+    from models import db
+    from team_task_counters import recompute_team_task_counters
+
+    repaired = recompute_team_task_counters(list(team_task_ids) or None)
+    db.session.commit()
+    click.echo(f"repaired={repaired}")
+
+
+@atd_cli.command('repair-mindmap-progress')
+@click.option('--mindmap-id', 'mindmap_ids', type=int, multiple=True, help='対象マインドマップID（複数指定可、省略時は全件）')
+def repair_mindmap_progress_command(mindmap_ids):
+    """保存済みのノード・マインドマップの達成度を全件再計算して補正"""
+    from models import db
+    from mindmap_progress import repair_mindmap_progress
+
+    repaired = repair_mindmap_progress(list(mindmap_ids) or None)
+    db.session.commit()
+    click.echo(f"repaired_nodes={repaired}")
+
+
+@atd_cli.command('backfill-node-paths')
+@click.option('--mindmap-id', 'mindmap_ids', type=int, multiple=True, help='対象マインドマップID（複数指定可、省略時は全件）')
+def backfill_node_paths_command(mindmap_ids):
+    """マインドマップノードの階層パスを parent_id から設定し直す（値が異なるノードのみ更新）"""
+    from models import db
+    from mindmap_hierarchy import rebuild_node_paths
+
+    updated = rebuild_node_paths(list(mindmap_ids) or None)
+    db.session.commit()
+    click.echo(f"updated={updated}")
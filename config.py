@@ -18,6 +18,26 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', f'sqlite:///{os.path.join(instance_path, "atd.db")}')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # 日次処理（0時の繰り越し）をプロセス内スケジューラーで実行するか
+    # 無効の場合は `flask atd rollover` を cron などから実行する
+    # （どちらも無い場合でも、各ユーザーのその日の最初のリクエストで実行される）
+    ROLLOVER_SCHEDULER_ENABLED = os.getenv('ROLLOVER_SCHEDULER', 'False').lower() == 'true'
+    
+    # UserPerformance をタスクの変更イベントから差分更新するか（増分モード）
+    # 有効な場合、集計のずれは `flask atd reconcile-performance` で補正する
+    PERFORMANCE_INCREMENTAL = os.getenv('PERFORMANCE_INCREMENTAL', 'False').lower() == 'true'
+    
+    # ダッシュボード等の集計スナップショットキャッシュ（ユーザー単位、プロセス内 LRU）
+    SNAPSHOT_CACHE_ENABLED = os.getenv('SNAPSHOT_CACHE', 'True').lower() == 'true'
+    SNAPSHOT_CACHE_TTL = int(os.getenv('SNAPSHOT_CACHE_TTL', '60'))  # 秒
+    SNAPSHOT_CACHE_MAXSIZE = int(os.getenv('SNAPSHOT_CACHE_MAXSIZE', '1024'))  # 保持するユーザー数
+    UNREAD_COUNTER_TTL = int(os.getenv('UNREAD_COUNTER_TTL', '300'))  # 未読通知数キャッシュの有効期間（秒）
+    
+    # 通知の一括作成（チームタスクの割り当てなど）
+    # 有効な場合はリクエストのコミット後にバックグラウンドのワーカーで作成する
+    NOTIFICATION_ASYNC = os.getenv('NOTIFICATION_ASYNC', 'False').lower() == 'true'
+    NOTIFICATION_COALESCE_SECONDS = int(os.getenv('NOTIFICATION_COALESCE_SECONDS', '60'))  # 同じ通知をまとめる期間（秒）
+    
     # その他
     DEBUG = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
     
@@ -2,12 +2,242 @@
 日次の自動処理を実行するモジュール
 - 24時の日付切り替え
 - タスクの繰り越し処理
+- 全ユーザー一括の日次バッチ（CLI / スケジューラー）
+- バッチが未実行の場合の、その日の最初のリクエストでの補完（ensure_daily_rollover）
 """
-from datetime import datetime, timedelta, date as date_module
+import threading
+import time
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
 
-def process_daily_rollover(user_id=None):
+def _claim_rollover(user_id, today):
+    """
+    当日の日次処理の実行権を取得する
+    - users.last_rollover_date を条件付き UPDATE で今日に更新できた場合のみ実行する
+    - 複数ワーカー・複数プロセスから同時に呼ばれても1回しか実行されない
+    - last_rollover_date が未設定のユーザーは従来の判定（昨日のUserPerformanceあり・今日なし）を使う
+    戻り値: (実行するか, 前回の実行日)
+    """
+    from models import User, UserPerformance, db as db_instance
+    from sqlalchemy import or_
+
+    last_rollover_date = db_instance.session.query(User.last_rollover_date).filter(
+        User.id == user_id
+    ).scalar()
+
+    if last_rollover_date is None:
+        yesterday = today - timedelta(days=1)
+        has_yesterday = db_instance.session.query(UserPerformance.id).filter_by(
+            user_id=user_id,
+            date=yesterday
+        ).first() is not None
+        has_today = db_instance.session.query(UserPerformance.id).filter_by(
+            user_id=user_id,
+            date=today
+        ).first() is not None
+        should_run = has_yesterday and not has_today
+    else:
+        should_run = last_rollover_date < today
+
+    claimed = User.query.filter(
+        User.id == user_id,
+        or_(User.last_rollover_date.is_(None), User.last_rollover_date < today)
+    ).update({'last_rollover_date': today}, synchronize_session=False)
+
+    return should_run and claimed == 1, last_rollover_date
+
+
+def _due_repeat_types(today):
+    """指定日に生成対象となるテンプレートの繰り返し種別を返す"""
+    repeat_types = ['daily']
+    if today.weekday() == 0:
+        # 毎週の場合は月曜日
+        repeat_types.append('weekly')
+    if today.day == 1:
+        # 毎月の場合は1日
+        repeat_types.append('monthly')
+    return repeat_types
+
+
+def _generate_template_tasks(user_id, today):
+    """
+    テンプレートから今日のタスクを生成（INSERT ... SELECT の1文で実行し、作成件数を返す）
+    - 生成したタスクには template_id と occurrence_date を記録する
+    - 同じテンプレート・同じ日付のタスクが既にある場合はユニーク制約
+      （uq_tasks_template_occurrence）で弾き、重複チェックのクエリは発行しない
+    - template_id を記録する前に生成されたタスク（template_id が NULL）は、従来と同じ
+      ユーザー・タイトル・開始日が一致する未アーカイブのタスクがあれば生成しない（同じ文の中で除外）
+    - order_index は同じカテゴリの最大値の後ろにテンプレートID順で並べる
+    """
+    from models import Task, TaskTemplate, db as db_instance
+    from sqlalchemy import select, insert, func, literal, and_, exists
+    from sqlalchemy.orm import aliased
+
+    category = func.coalesce(TaskTemplate.category, 'other')
+    existing = aliased(Task)
+    legacy = aliased(Task)
+    max_order = select(func.coalesce(func.max(existing.order_index), 0)).where(
+        existing.user_id == user_id,
+        existing.category == category
+    ).scalar_subquery()
+    now_utc = datetime.utcnow()
+
+    columns = [
+        'title', 'description', 'priority', 'category', 'order_index',
+        'user_id', 'start_date', 'end_date', 'template_id', 'occurrence_date',
+        'completed', 'archived', 'is_tracking', 'total_seconds',
+        'created_at', 'updated_at'
+    ]
+    source = select(
+        TaskTemplate.title,
+        TaskTemplate.description,
+        func.coalesce(TaskTemplate.priority, 'medium'),
+        category,
+        max_order + func.row_number().over(partition_by=category, order_by=TaskTemplate.id),
+        TaskTemplate.user_id,
+        literal(today, db_instance.Date),
+        literal(today, db_instance.Date),
+        TaskTemplate.id,
+        literal(today, db_instance.Date),
+        literal(False, db_instance.Boolean),
+        literal(False, db_instance.Boolean),
+        literal(False, db_instance.Boolean),
+        literal(0, db_instance.Integer),
+        literal(now_utc, db_instance.DateTime),
+        literal(now_utc, db_instance.DateTime)
+    ).where(
+        TaskTemplate.user_id == user_id,
+        TaskTemplate.is_active == True,
+        TaskTemplate.repeat_type.in_(_due_repeat_types(today)),
+        ~exists().where(and_(
+            legacy.user_id == user_id,
+            legacy.template_id.is_(None),
+            legacy.title == TaskTemplate.title,
+            legacy.start_date == today,
+            legacy.archived == False
+        ))
+    )
+
+    dialect = db_instance.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(Task).from_select(columns, source).on_conflict_do_nothing(
+            index_elements=['template_id', 'occurrence_date']
+        )
+    else:
+        # ON CONFLICT 非対応のデータベースでは同じ文の中で既存行を除外する
+        source = source.where(~exists().where(and_(
+            Task.template_id == TaskTemplate.id,
+            Task.occurrence_date == today
+        )))
+        stmt = insert(Task).from_select(columns, source)
+
+    result = db_instance.session.execute(stmt)
+    generated_count = max(result.rowcount or 0, 0)
+
+    # 増分モードでは ORM を経由しない INSERT の分をここで UserPerformance に加算する
+    from performance_tracker import is_incremental_enabled
+    if generated_count and is_incremental_enabled():
+        from models import UserPerformance
+        UserPerformance.apply_delta(user_id, now_utc.date(), tasks_created=generated_count)
+
+    return generated_count
+
+
+def _archive_completed_tasks(user_id, today):
+    """
+    完了したタスクをアーカイブ（1回の UPDATE で実行し、更新件数を返す）
+    - 最終更新日（updated_at、無ければ created_at）が2日前以前の完了タスクが対象
+    - archived_at には最終更新日（updated_at が無い場合は2日前の日付）を設定
+    - 対象タスクが属するタスクカードの進捗率を更新する
+    - アーカイブしたタスクの作業時間は集計から外れるため、UserPerformance から差し引く（増分モードのみ）
+    """
+    from models import Task
+    from performance_tracker import apply_archived_tasks, is_incremental_enabled
+    from sqlalchemy import func
+
+    two_days_ago = today - timedelta(days=2)
+    # 日付比較は「2日前の翌日0時より前」の範囲条件にして、インデックスを使えるようにする
+    cutoff = datetime.combine(two_days_ago + timedelta(days=1), datetime.min.time())
+
+    query = Task.query.filter(
+        Task.user_id == user_id,
+        Task.completed == True,
+        Task.archived == False,
+        func.coalesce(Task.updated_at, Task.created_at) < cutoff
+    )
+    # アーカイブで件数が変わるタスクカード（一覧の取得時には再計算しないため、ここで保存し直す）
+    card_node_ids = [
+        row[0] for row in query.with_entities(Task.task_card_node_id).filter(
+            Task.task_card_node_id.isnot(None)
+        ).distinct().all()
+    ]
+
+    # UPDATE は flush のリスナーを通らないため、作業時間のあるタスクのアーカイブ前の値を先に取得しておく
+    archived_rows = []
+    if is_incremental_enabled():
+        archived_rows = query.with_entities(
+            Task.user_id, Task.created_at, Task.completed, Task.completed_at, Task.archived, Task.total_seconds
+        ).filter(
+            Task.completed_at.isnot(None),
+            Task.total_seconds > 0
+        ).all()
+
+    archived_count = query.update({
+        Task.archived: True,
+        Task.archived_at: func.coalesce(func.date(Task.updated_at), two_days_ago)
+    }, synchronize_session=False)
+    apply_archived_tasks(archived_rows)
+
+    if card_node_ids:
+        from mindmap_progress import update_task_card_progress
+        from mindmap_sync import touch_nodes
+        for node_id in card_node_ids:
+            update_task_card_progress(node_id)
+        # カードのタスク数が変わるため、差分同期のリビジョンを進める
+        touch_nodes(card_node_ids)
+
+    return archived_count
+
+
+def _advance_tomorrow_tasks(user_id, now_naive):
+    """明日のタスクを本日のタスクに移動（1回の UPDATE で実行し、更新件数を返す）"""
+    from models import Task
+
+    return Task.query.filter(
+        Task.user_id == user_id,
+        Task.category == 'tomorrow',
+        Task.archived == False
+    ).update({
+        Task.category: 'today',
+        Task.updated_at: now_naive
+    }, synchronize_session=False)
+
+
+def _promote_calendar_tasks(user_id, today, now_naive):
+    """
+    カレンダーで指定されたタスクを明日のタスクに繰り上げ（1回の UPDATE で実行し、更新件数を返す）
+    - start_date <= today <= end_date で category='other' のタスクが対象
+    """
+    from models import Task
+
+    return Task.query.filter(
+        Task.user_id == user_id,
+        Task.category == 'other',
+        Task.archived == False,
+        Task.start_date <= today,
+        Task.end_date >= today
+    ).update({
+        Task.category: 'tomorrow',
+        Task.updated_at: now_naive
+    }, synchronize_session=False)
+
+
+def process_daily_rollover(user_id=None, today=None):
     """
     日次の自動処理を実行（0時00分になったら自動実行）
     - テンプレートからタスクを自動生成（毎日/毎週/毎月）
@@ -16,11 +246,13 @@ def process_daily_rollover(user_id=None):
     - カレンダーで指定されたタスク（start_date/end_dateが今日になったタスク）を明日のタスクに繰り上げ
     - 本日のタスク（未完了）はそのまま本日のタスクとして残す
     
-    注: ダッシュボードにアクセスしたときに自動実行されます（1日に1回のみ）
+    注: run_daily_rollover_batch（flask atd rollover / スケジューラー）から全ユーザー分まとめて実行されます
+    （1ユーザーにつき1日1回のみ）
     """
     # 今日の日付を取得（日本時間基準）
     now = datetime.now(ZoneInfo('Asia/Tokyo'))
-    today = now.date()
+    if today is None:
+        today = now.date()
     current_time = now.strftime('%Y-%m-%d %H:%M:%S')
     now_naive = now.replace(tzinfo=None)
     
@@ -29,109 +261,26 @@ def process_daily_rollover(user_id=None):
     if not user_id:
         return 0, 0, 0, 0
     
-    from models import Task, TaskTemplate, UserPerformance, db as db_instance
-    
-    # 日付が変わったかどうかをチェック
-    # 昨日のUserPerformanceレコードが存在し、今日のレコードが存在しない場合 = 日付が変わった
-    yesterday = today - timedelta(days=1)
-    yesterday_performance = UserPerformance.query.filter_by(
-        user_id=user_id,
-        date=yesterday
-    ).first()
+    from models import db as db_instance
     
-    today_performance = UserPerformance.query.filter_by(
-        user_id=user_id,
-        date=today
-    ).first()
-    
-    # 今日のレコードが既に存在する場合、日次処理は既に実行済み
-    if today_performance:
-        print(f"[DEBUG] Daily rollover already executed today for user {user_id}, skipping")
+    # 今日の日次処理の実行権を取得（既に実行済み、または日付が変わっていない場合はスキップ）
+    claimed, last_rollover_date = _claim_rollover(user_id, today)
+    if not claimed:
+        db_instance.session.commit()
+        print(f"[DEBUG] Daily rollover skipped for user {user_id} (already executed or date not changed)")
         return 0, 0, 0, 0
     
-    # 昨日のレコードが存在しない場合、初回アクセスまたは日付が変わっていない
-    # この場合は、日次処理を実行しない（まだ日付が変わっていない）
-    if not yesterday_performance:
-        print(f"[DEBUG] Daily rollover skipped: Yesterday's record not found (date may not have changed), user={user_id}")
-        return 0, 0, 0, 0
+    print(f"[DEBUG] Daily rollover: Date changed detected (today={today}), executing rollover")
     
-    # 昨日のレコードが存在し、今日のレコードが存在しない場合 = 日付が変わった
-    print(f"[DEBUG] Daily rollover: Date changed detected (yesterday={yesterday}, today={today}), executing rollover")
+    # 前日の連続日数を確定（前々日の streak_days から1回の UPDATE で更新）
+    from models import UserPerformance
+    UserPerformance.close_day(user_id, today - timedelta(days=1))
     
     # テンプレートからタスクを自動生成
-    templates = TaskTemplate.query.filter_by(
-        user_id=user_id,
-        is_active=True
-    ).filter(TaskTemplate.repeat_type != 'none').all()
-    
-    generated_count = 0
-    for template in templates:
-        should_generate = False
-        
-        if template.repeat_type == 'daily':
-            should_generate = True
-        elif template.repeat_type == 'weekly':
-            # 毎週の場合は月曜日
-            should_generate = today.weekday() == 0
-        elif template.repeat_type == 'monthly':
-            # 毎月の場合は1日
-            should_generate = today.day == 1
-        
-        if should_generate:
-            # 今日すでにこのテンプレートから作成されたタスクがあるかチェック
-            existing = Task.query.filter(
-                Task.user_id == user_id,
-                Task.title == template.title,
-                Task.start_date == today,
-                Task.archived == False
-            ).first()
-            
-            if not existing:
-                new_task = template.create_task_from_template(today)
-                
-                # カテゴリが正しく設定されているか確認（Noneの場合は'other'を使用）
-                category = new_task.category or 'other'
-                new_task.category = category
-                
-                # 同じカテゴリのタスクの中で最大のorder_indexを取得
-                from sqlalchemy import func
-                max_order = db_instance.session.query(func.max(Task.order_index)).filter_by(
-                    user_id=user_id,
-                    category=category
-                ).scalar() or 0
-                
-                # order_indexを設定（タスク一覧で正しく表示されるように）
-                new_task.order_index = max_order + 1
-                
-                db_instance.session.add(new_task)
-                generated_count += 1
+    generated_count = _generate_template_tasks(user_id, today)
     
     # 完了したタスクをアーカイブ（2日前以前の完了タスクで未アーカイブのもの）
-    two_days_ago = today - timedelta(days=2)
-    # SQLite互換性のため、Python側でフィルタリング
-    all_completed_tasks = Task.query.filter(
-        Task.user_id == user_id,
-        Task.completed == True,
-        Task.archived == False
-    ).all()
-    
-    completed_tasks = []
-    for task in all_completed_tasks:
-        if task.updated_at:
-            task_date = task.updated_at.date()
-        else:
-            task_date = task.created_at.date() if task.created_at else today
-        if task_date <= two_days_ago:
-            completed_tasks.append(task)
-    
-    archived_count = 0
-    for task in completed_tasks:
-        task.archived = True
-        if task.updated_at:
-            task.archived_at = task.updated_at.date()
-        else:
-            task.archived_at = two_days_ago
-        archived_count += 1
+    archived_count = _archive_completed_tasks(user_id, today)
     
     # 1. 昨日以前に作成された本日のタスク（未完了）を確認
     # 昨日以前に作成されたタスクは、start_dateが今日でない限り、そのまま残す
@@ -141,92 +290,153 @@ def process_daily_rollover(user_id=None):
     # 注意: これは日付が変わったとき（0時00分）にのみ実行すべき
     # 今日の日次処理が初めて実行される場合のみ、「明日のタスク」を「本日のタスク」に移動
     # これは、昨日の「明日のタスク」が今日の「本日のタスク」になるため
-    tomorrow_tasks = Task.query.filter(
-        Task.user_id == user_id,
-        Task.category == 'tomorrow',
-        Task.archived == False
-    ).all()
-    
-    advanced_count = 0
-    for task in tomorrow_tasks:
-        task.category = 'today'
-        task.updated_at = now_naive
-        advanced_count += 1
+    advanced_count = _advance_tomorrow_tasks(user_id, now_naive)
     
     print(f"[DEBUG] Daily rollover: Moved {advanced_count} tasks from 'tomorrow' to 'today'")
     
     # 3. カレンダーで指定されたタスク（start_date/end_dateが今日になったタスク）を明日のタスクに繰り上げ
-    # start_date <= today <= end_date のタスクで、category='other'のものを探す
-    calendar_tasks = Task.query.filter(
-        Task.user_id == user_id,
-        Task.category == 'other',
-        Task.archived == False,
-        Task.start_date <= today,
-        Task.end_date >= today
-    ).all()
-    
-    calendar_moved_count = 0
-    for task in calendar_tasks:
-        # 今日がタスクの期間内なら、明日のタスクに繰り上げ
-        if task.start_date <= today <= task.end_date:
-            task.category = 'tomorrow'
-            task.updated_at = now_naive
-            calendar_moved_count += 1
+    calendar_moved_count = _promote_calendar_tasks(user_id, today, now_naive)
     
     # 4. 昨日以前の本日のタスク（未完了）で、start_dateが昨日以前のものはそのまま残す
     # これは既にcategory='today'なので何もしない
     
+    # 確定した日の日別集計を更新
+    # - アーカイブは完了の2〜3日後に行われるため、少なくとも直近3日分を再計算する
+    # - 前回の実行日から日が空いている場合（停止期間など）は、その日以降をすべて再計算する
+    from report_stats import refresh_daily_rollups
+    refresh_start = today - timedelta(days=3)
+    if last_rollover_date is not None:
+        refresh_start = min(refresh_start, last_rollover_date)
+    refresh_daily_rollups(refresh_start, today - timedelta(days=1), user_ids=[user_id])
+    
     # コミット
     db_instance.session.commit()
     
+    # 一括 UPDATE / INSERT は ORM のイベントを通らないため、集計スナップショットを明示的に破棄
+    from cache import snapshot_cache
+    snapshot_cache.invalidate_user(user_id)
+    
     print(f"[DEBUG] Daily rollover completed: advanced={advanced_count}, calendar={calendar_moved_count}, archived={archived_count}, generated={generated_count}")
     
     return advanced_count, calendar_moved_count, archived_count, generated_count
 
 
+def ensure_daily_rollover(user, today=None):
+    """
+    ユーザーの当日の日次処理が未実行なら実行する（その日の最初のリクエストでの補完）
+    - 0時のバッチ（flask atd rollover / スケジューラー）が動いていない環境でも日付の切り替えを行う
+    - 読み込み済みの users.last_rollover_date で判定するため、実行済みの日はクエリを発行しない
+    - 実行権は process_daily_rollover 内の条件付き UPDATE で取得するため、バッチと重複しない
+    戻り値: 実行した場合は process_daily_rollover の結果、それ以外は None
+    """
+    if today is None:
+        today = datetime.now(ZoneInfo('Asia/Tokyo')).date()
+    if user.last_rollover_date is not None and user.last_rollover_date >= today:
+        return None
+    return process_daily_rollover(user.id, today=today)
+
+
+def run_daily_rollover_batch(today=None, user_ids=None):
+    """
+    全ユーザーの日次処理を1回のバッチでまとめて実行する
+    - ユーザーごとの処理時間と件数、全体の合計を返す
+    - 1ユーザーの失敗は他のユーザーの処理に影響させない
+    """
+    from models import User, db as db_instance
+
+    if today is None:
+        today = datetime.now(ZoneInfo('Asia/Tokyo')).date()
+
+    if user_ids is None:
+        user_ids = [row[0] for row in db_instance.session.query(User.id).order_by(User.id).all()]
+
+    batch_started = time.perf_counter()
+    results = []
+    totals = {
+        'users': 0,
+        'failed': 0,
+        'advanced': 0,
+        'calendar_moved': 0,
+        'archived': 0,
+        'generated': 0
+    }
+
+    for user_id in user_ids:
+        started = time.perf_counter()
+        entry = {'user_id': user_id, 'error': None}
+        try:
+            advanced, calendar_moved, archived, generated = process_daily_rollover(user_id, today=today)
+            entry.update({
+                'advanced': advanced,
+                'calendar_moved': calendar_moved,
+                'archived': archived,
+                'generated': generated
+            })
+        except Exception as e:
+            db_instance.session.rollback()
+            print(f"[ERROR] Daily rollover failed for user {user_id}: {e}")
+            entry.update({'advanced': 0, 'calendar_moved': 0, 'archived': 0, 'generated': 0, 'error': str(e)})
+        entry['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+        totals['users'] += 1
+        if entry['error']:
+            totals['failed'] += 1
+        for key in ('advanced', 'calendar_moved', 'archived', 'generated'):
+            totals[key] += entry[key]
+        results.append(entry)
+
+    elapsed_ms = round((time.perf_counter() - batch_started) * 1000, 1)
+    print(f"[DEBUG] Daily rollover batch completed: date={today}, users={totals['users']}, elapsed={elapsed_ms}ms")
+
+    return {
+        'date': today,
+        'users': results,
+        'totals': totals,
+        'elapsed_ms': elapsed_ms
+    }
+
+
+def _seconds_until_next_rollover(delay_seconds=5):
+    """次の日本時間0時（+delay_seconds秒）までの秒数"""
+    now = datetime.now(ZoneInfo('Asia/Tokyo'))
+    next_midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=now.tzinfo)
+    return (next_midnight - now).total_seconds() + delay_seconds
+
+
+def start_rollover_scheduler(app):
+    """
+    プロセス内スケジューラーを起動する（ROLLOVER_SCHEDULER=true の場合のみ）
+    - 起動直後に1回実行し、スリープ中に日付をまたいだ分を取り戻す
+    - 以降は毎日 日本時間0時に run_daily_rollover_batch を実行する
+    - 複数ワーカーで起動しても、ユーザーごとの実行権の取得で1日1回に制限される
+    """
+    if app.extensions.get('rollover_scheduler'):
+        return app.extensions['rollover_scheduler']
+
+    def run():
+        while True:
+            try:
+                with app.app_context():
+                    run_daily_rollover_batch()
+            except Exception as e:
+                print(f"[ERROR] Rollover scheduler error: {e}")
+            time.sleep(_seconds_until_next_rollover())
+
+    thread = threading.Thread(target=run, name='atd-rollover-scheduler', daemon=True)
+    thread.start()
+    app.extensions['rollover_scheduler'] = thread
+    print('✅ 日次処理スケジューラーを起動しました')
+    return thread
+
+
 def get_daily_statistics(user_id, days=7):
     """
-    過去N日間の統計データを取得
+    過去N日間の統計データを取得（確定済みの日は日別集計テーブル、今日は GROUP BY 1クエリ、タスクが無い日は0）
     """
-    from models import Task, UserPerformance, db as db_instance
+    from report_stats import get_report_series
     
-    end_date = date_module.today()
+    end_date = datetime.now(ZoneInfo('Asia/Tokyo')).date()
     start_date = end_date - timedelta(days=days - 1)
     
-    # 過去N日間のタスク統計
-    # SQLite互換性のため、Python側でフィルタリング
-    all_tasks = Task.query.filter(
-        Task.user_id == user_id
-    ).all()
-    
-    stats = []
-    for i in range(days):
-        current_date = start_date + timedelta(days=i)
-        
-        # その日のタスク数（Python側でフィルタリング）
-        total_on_date = 0
-        completed_on_date = 0
-        
-        for task in all_tasks:
-            if task.created_at:
-                created_date = task.created_at.date()
-                if created_date == current_date:
-                    total_on_date += 1
-            
-            if task.completed and task.updated_at:
-                updated_date = task.updated_at.date()
-                if updated_date == current_date:
-                    completed_on_date += 1
-        
-        # 完了率
-        completion_rate = (completed_on_date / total_on_date * 100) if total_on_date > 0 else 0
-        
-        stats.append({
-            'date': current_date,
-            'total': total_on_date,
-            'completed': completed_on_date,
-            'completion_rate': round(completion_rate, 1)
-        })
-    
-    return stats
+    return get_report_series(user_id, start_date, end_date, today=end_date)
 
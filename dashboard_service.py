@@ -0,0 +1,192 @@
+"""
+ダッシュボード用の集計をまとめて取得するモジュール
+- 優先度別・分類別のタスク数は GROUP BY priority, category の1クエリ
+- 今日のパフォーマンスと過去N日間の推移は期間指定の1クエリ
+- ダッシュボード・モバイルホーム・プロフィール共通の集計はユーザー単位のスナップショットとして
+  キャッシュする（cache.snapshot_cache）
+"""
+from datetime import datetime, timedelta
+
+PRIORITIES = ('high', 'medium', 'low')
+CATEGORIES = ('today', 'tomorrow', 'other')
+
+
+class TaskSummary:
+    """スナップショットに保持するタスクの表示用データ（ORM から切り離した値のみ）"""
+
+    __slots__ = ('id', 'title', 'priority', 'due_date', 'end_date', 'completed', 'is_tracking', 'total_seconds', 'archived')
+
+    def __init__(self, task):
+        for name in self.__slots__:
+            setattr(self, name, getattr(task, name))
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def format_time(self):
+        """累計時間をフォーマット（HH:MM:SS）"""
+        hours = self.total_seconds // 3600
+        minutes = (self.total_seconds % 3600) // 60
+        seconds = self.total_seconds % 60
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def get_task_breakdown(user_id):
+    """
+    未アーカイブのタスク数を優先度別・分類別・完了状態別に集計（GROUP BY の1クエリ）
+    戻り値: {'priority_data', 'category_data', 'completed_count', 'in_progress_count', 'total_count'}
+    """
+    from models import Task, db
+
+    rows = db.session.query(
+        Task.priority,
+        Task.category,
+        Task.completed,
+        db.func.count(Task.id)
+    ).filter(
+        Task.user_id == user_id,
+        Task.archived == False
+    ).group_by(Task.priority, Task.category, Task.completed).all()
+
+    priority_data = {priority: 0 for priority in PRIORITIES}
+    category_data = {category: 0 for category in CATEGORIES}
+    completed_count = 0
+    total_count = 0
+    for priority, category, completed, count in rows:
+        if priority in priority_data:
+            priority_data[priority] += count
+        if category in category_data:
+            category_data[category] += count
+        if completed:
+            completed_count += count
+        total_count += count
+
+    return {
+        'priority_data': priority_data,
+        'category_data': category_data,
+        'completed_count': completed_count,
+        'in_progress_count': total_count - completed_count,
+        'total_count': total_count
+    }
+
+
+def get_today_tasks(user_id, today):
+    """本日のタスク（category='today'、昨日以前に完了したものは除外）を優先順位順に取得"""
+    from models import Task, db
+
+    today_start = datetime.combine(today, datetime.min.time())
+    return Task.query.filter(
+        Task.user_id == user_id,
+        Task.category == 'today',
+        Task.archived == False,
+        db.or_(
+            Task.completed == False,
+            Task.completed_at.is_(None),
+            Task.completed_at >= today_start
+        )
+    ).order_by(Task.order_index).all()
+
+
+def get_performance_window(user_id, end_date, days=7):
+    """
+    end_date までの過去N日間の UserPerformance を1クエリで取得
+    戻り値: (end_date のレコード or None, ラベル一覧, 日別完了数一覧)
+    """
+    from models import UserPerformance
+
+    start_date = end_date - timedelta(days=days - 1)
+    performances = UserPerformance.query.filter(
+        UserPerformance.user_id == user_id,
+        UserPerformance.date >= start_date,
+        UserPerformance.date <= end_date
+    ).order_by(UserPerformance.date).all()
+    by_date = {performance.date: performance for performance in performances}
+
+    labels = []
+    daily_completion_data = []
+    for i in range(days):
+        current_date = start_date + timedelta(days=i)
+        labels.append(current_date.strftime('%m/%d'))
+        performance = by_date.get(current_date)
+        daily_completion_data.append(performance.tasks_completed if performance else 0)
+
+    return by_date.get(end_date), labels, daily_completion_data
+
+
+def build_user_snapshot(user_id, today):
+    """ダッシュボード・モバイルホーム・プロフィールで使う集計値をまとめて作成"""
+    from daily_processor import get_daily_statistics
+
+    today_tasks = [TaskSummary(task) for task in get_today_tasks(user_id, today)]
+    completed_tasks = sum(1 for task in today_tasks if task.completed)
+    total_tasks = len(today_tasks)
+
+    # タスク別の作業時間データ（完了済みタスクのみ）
+    task_time_data = []
+    for task in today_tasks:
+        if task.completed and not task.archived and task.total_seconds > 0:
+            # タイトルが長すぎる場合は切り詰める（30文字まで）
+            title = task.title[:30] + '...' if len(task.title) > 30 else task.title
+            # 変な文字が含まれている可能性があるので、改行や特殊文字を除去
+            title = title.replace('\n', ' ').replace('\r', ' ').strip()
+            task_time_data.append({
+                'title': title,
+                'total_seconds': task.total_seconds,
+                'formatted_time': task.format_time()
+            })
+
+    breakdown = get_task_breakdown(user_id)
+    today_performance, labels, daily_completion_data = get_performance_window(user_id, today)
+
+    # 過去7日間の詳細統計
+    try:
+        daily_stats = get_daily_statistics(user_id, days=7)
+    except Exception as e:
+        print(f"get_daily_statistics error: {e}")
+        daily_stats = []
+
+    return {
+        'today_tasks': today_tasks,
+        'completed_tasks': completed_tasks,
+        'total_tasks': total_tasks,
+        'progress_percentage': (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0,
+        'today_total_seconds': sum(task.total_seconds for task in today_tasks if task.completed and not task.archived),
+        'task_time_data': task_time_data,
+        'priority_data': breakdown['priority_data'],
+        'category_data': breakdown['category_data'],
+        'completed_count': breakdown['completed_count'],
+        'in_progress_count': breakdown['in_progress_count'],
+        'total_count': breakdown['total_count'],
+        'labels': labels,
+        'daily_completion_data': daily_completion_data,
+        'today_stats': {
+            'streak_days': today_performance.streak_days,
+            'tasks_created': today_performance.tasks_created
+        } if today_performance else None,
+        'streak_days': today_performance.streak_days if today_performance else 0,
+        'daily_stats': daily_stats,
+        'today_daily_stats': daily_stats[-1] if daily_stats else {
+            'total': 0,
+            'completed': 0,
+            'completion_rate': 0
+        }
+    }
+
+
+def get_user_snapshot(user_id, today):
+    """
+    ユーザーの集計スナップショットを取得（キャッシュが無い場合のみ作成）
+    - 作成前にその日の UserPerformance を更新する（増分モードでは何もしない）
+    """
+    from cache import snapshot_cache
+    from models import UserPerformance
+
+    def build():
+        UserPerformance.sync_daily_performance(user_id, date=today)
+        return build_user_snapshot(user_id, today)
+
+    return snapshot_cache.get_or_build(user_id, today, build)
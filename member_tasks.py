@@ -0,0 +1,111 @@
+"""
+メンバー詳細ページの個人タスク一覧（分類ごとのページ送り）
+- 件数・完了数は分類別の件数も含めて1回の集計クエリで取得する
+- タスクは分類（チームタスク・本日・明日・その他）ごとに ID 順で PAGE_SIZE 件ずつ取得する
+  - 続きは「最後に表示したタスクの ID より後」を条件にするキーセット方式（OFFSET を使わない）
+  - (user_id, category, id) のインデックスで、必要な件数だけを読む
+  - チームタスクはチームタスクに紐づく個人タスク（team_task_id あり）で、
+    部分インデックス（ix_tasks_user_id_team_id）で必要な件数だけを読む
+- 他のメンバーのタスクを見られるのは、同じチームのメンバーの場合のみ（can_view_member_tasks）
+"""
+
+PAGE_SIZE = 20
+SECTIONS = ('team', 'today', 'tomorrow', 'other')
+TEAM_TASK_PREFIX = '【'
+
+
+def _section_filter(section):
+    from models import Task
+
+    if section == 'team':
+        return Task.team_task_id.isnot(None)
+    return Task.category == section
+
+
+def can_view_member_tasks(viewer_id, user_id, team_id=None):
+    """
+    viewer_id のユーザーが user_id のユーザーのタスクを見られるか（1クエリ）
+    - team_id の指定がある場合: 両方がそのチームのメンバーであること
+    - 指定が無い場合: 本人か、同じチームのメンバーであること
+    """
+    from models import TeamMember, db
+    from sqlalchemy.orm import aliased
+
+    if team_id is None and viewer_id == user_id:
+        return True
+
+    viewer = aliased(TeamMember)
+    target = aliased(TeamMember)
+    query = db.session.query(viewer.id).join(
+        target, target.team_id == viewer.team_id
+    ).filter(
+        viewer.user_id == viewer_id,
+        target.user_id == user_id
+    )
+    if team_id is not None:
+        query = query.filter(viewer.team_id == team_id)
+    return db.session.query(query.exists()).scalar()
+
+
+def get_member_task_summary(user_id):
+    """
+    未アーカイブの個人タスクの件数（1クエリ）
+    戻り値: {'total', 'completed', 'completion_rate', 'sections': {section: 件数}}
+    """
+    from models import Task, db
+
+    def count_if(condition):
+        return db.func.sum(db.case((condition, 1), else_=0))
+
+    row = db.session.query(
+        db.func.count(Task.id),
+        count_if(Task.completed == True),
+        *[count_if(_section_filter(section)) for section in SECTIONS]
+    ).filter(
+        Task.user_id == user_id,
+        Task.archived == False
+    ).one()
+
+    total = row[0] or 0
+    completed = int(row[1] or 0)
+    return {
+        'total': total,
+        'completed': completed,
+        'completion_rate': (completed / total * 100) if total > 0 else 0,
+        'sections': {section: int(value or 0) for section, value in zip(SECTIONS, row[2:])}
+    }
+
+
+def get_member_task_page(user_id, section, after_id=None, limit=PAGE_SIZE):
+    """
+    分類ごとのタスクを ID 順に limit 件取得
+    戻り値: (tasks, next_cursor)（続きが無い場合 next_cursor は None）
+    """
+    from models import Task
+
+    query = Task.query.filter(
+        Task.user_id == user_id,
+        Task.archived == False,
+        _section_filter(section)
+    )
+    if after_id is not None:
+        query = query.filter(Task.id > after_id)
+    # 1件多く取得して続きの有無を判定
+    tasks = query.order_by(Task.id).limit(limit + 1).all()
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        return tasks, tasks[-1].id
+    return tasks, None
+
+
+def serialize_member_task(task):
+    """一覧の JSON 用"""
+    return {
+        'id': task.id,
+        'title': task.title,
+        'description': task.description,
+        'completed': task.completed,
+        'priority': task.priority,
+        'end_date': task.end_date.strftime('%Y/%m/%d') if task.end_date else None,
+        'is_team_task': task.title.startswith(TEAM_TASK_PREFIX)
+    }
@@ -0,0 +1,26 @@
+"""add last_rollover_date to users
+
+Revision ID: a1c4e7d2b930
+Revises: 65f95bce32a9
+Create Date: 2026-10-18 09:12:05.418263
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1c4e7d2b930'
+down_revision = '65f95bce32a9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_rollover_date', sa.Date(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('last_rollover_date')
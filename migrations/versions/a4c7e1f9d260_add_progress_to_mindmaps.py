@@ -0,0 +1,41 @@
+"""add stored progress to mindmaps
+
+Revision ID: a4c7e1f9d260
+Revises: f2b6d8a1c375
+Create Date: 2026-10-18 14:05:37.219846
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c7e1f9d260'
+down_revision = 'f2b6d8a1c375'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('mindmaps', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('progress', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('leaf_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('leaf_progress_sum', sa.Integer(), server_default='0', nullable=False))
+
+    # 子ノードを持たないノードの件数・合計から達成度を集計
+    # （チームマップのノードの progress を計算し直す場合は flask atd repair-mindmap-progress を実行）
+    op.execute(
+        'UPDATE mindmaps SET '
+        'leaf_count = (SELECT COUNT(*) FROM mindmap_nodes n WHERE n.mindmap_id = mindmaps.id '
+        'AND NOT EXISTS (SELECT 1 FROM mindmap_nodes c WHERE c.parent_id = n.id)), '
+        'leaf_progress_sum = (SELECT COALESCE(SUM(COALESCE(n.progress, 0)), 0) FROM mindmap_nodes n '
+        'WHERE n.mindmap_id = mindmaps.id AND NOT EXISTS (SELECT 1 FROM mindmap_nodes c WHERE c.parent_id = n.id))'
+    )
+    op.execute('UPDATE mindmaps SET progress = CASE WHEN leaf_count > 0 THEN leaf_progress_sum / leaf_count ELSE 0 END')
+
+
+def downgrade():
+    with op.batch_alter_table('mindmaps', schema=None) as batch_op:
+        batch_op.drop_column('leaf_progress_sum')
+        batch_op.drop_column('leaf_count')
+        batch_op.drop_column('progress')
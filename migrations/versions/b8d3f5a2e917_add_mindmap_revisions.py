@@ -0,0 +1,51 @@
+"""add mindmap revisions and node tombstones
+
+Revision ID: b8d3f5a2e917
+Revises: a4c7e1f9d260
+Create Date: 2026-10-18 15:12:48.603521
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d3f5a2e917'
+down_revision = 'a4c7e1f9d260'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('mindmaps', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('revision', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('mindmap_nodes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('revision', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_mindmap_nodes_mindmap_id_revision', ['mindmap_id', 'revision'], unique=False)
+
+    op.create_table('mindmap_node_tombstones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('mindmap_id', sa.Integer(), nullable=False),
+    sa.Column('node_id', sa.Integer(), nullable=False),
+    sa.Column('revision', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['mindmap_id'], ['mindmaps.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('mindmap_node_tombstones', schema=None) as batch_op:
+        batch_op.create_index('ix_mindmap_node_tombstones_mindmap_id_revision', ['mindmap_id', 'revision'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('mindmap_node_tombstones', schema=None) as batch_op:
+        batch_op.drop_index('ix_mindmap_node_tombstones_mindmap_id_revision')
+
+    op.drop_table('mindmap_node_tombstones')
+
+    with op.batch_alter_table('mindmap_nodes', schema=None) as batch_op:
+        batch_op.drop_index('ix_mindmap_nodes_mindmap_id_revision')
+        batch_op.drop_column('revision')
+
+    with op.batch_alter_table('mindmaps', schema=None) as batch_op:
+        batch_op.drop_column('revision')
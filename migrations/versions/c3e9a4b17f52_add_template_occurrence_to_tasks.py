@@ -0,0 +1,34 @@
+"""add template_id and occurrence_date to tasks
+
+Revision ID: c3e9a4b17f52
+Revises: a1c4e7d2b930
+Create Date: 2026-10-18 10:03:41.227905
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e9a4b17f52'
+down_revision = 'a1c4e7d2b930'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('tasks', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('template_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('occurrence_date', sa.Date(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_tasks_template_id'), ['template_id'], unique=False)
+        batch_op.create_unique_constraint('uq_tasks_template_occurrence', ['template_id', 'occurrence_date'])
+        batch_op.create_foreign_key('fk_tasks_template_id_task_templates', 'task_templates', ['template_id'], ['id'], ondelete='SET NULL')
+
+
+def downgrade():
+    with op.batch_alter_table('tasks', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_tasks_template_id_task_templates', type_='foreignkey')
+        batch_op.drop_constraint('uq_tasks_template_occurrence', type_='unique')
+        batch_op.drop_index(batch_op.f('ix_tasks_template_id'))
+        batch_op.drop_column('occurrence_date')
+        batch_op.drop_column('template_id')
@@ -0,0 +1,39 @@
+"""add materialized path to mindmap nodes
+
+Revision ID: c6e2a9d4f713
+Revises: b8d3f5a2e917
+Create Date: 2026-10-18 16:02:11.480377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6e2a9d4f713'
+down_revision = 'b8d3f5a2e917'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('mindmap_nodes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('path', sa.String(length=1024), nullable=True))
+        batch_op.create_index('ix_mindmap_nodes_mindmap_id_path', ['mindmap_id', 'path'], unique=False)
+
+    # ルートから親子関係をたどって既存ノードのパスを設定
+    # （親が見つからないノードが残った場合は flask atd backfill-node-paths を実行）
+    op.execute(
+        'WITH RECURSIVE tree (id, path) AS ('
+        "SELECT id, '/' || CAST(id AS VARCHAR(20)) || '/' FROM mindmap_nodes WHERE parent_id IS NULL "
+        'UNION ALL '
+        "SELECT n.id, t.path || CAST(n.id AS VARCHAR(20)) || '/' FROM mindmap_nodes n JOIN tree t ON n.parent_id = t.id"
+        ') '
+        'UPDATE mindmap_nodes SET path = (SELECT tree.path FROM tree WHERE tree.id = mindmap_nodes.id)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('mindmap_nodes', schema=None) as batch_op:
+        batch_op.drop_index('ix_mindmap_nodes_mindmap_id_path')
+        batch_op.drop_column('path')
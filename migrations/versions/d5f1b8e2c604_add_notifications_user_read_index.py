@@ -0,0 +1,26 @@
+"""add (user_id, read) index to notifications
+
+Revision ID: d5f1b8e2c604
+Revises: c3e9a4b17f52
+Create Date: 2026-10-18 11:24:16.583021
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5f1b8e2c604'
+down_revision = 'c3e9a4b17f52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.create_index('ix_notifications_user_id_read', ['user_id', 'read'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.drop_index('ix_notifications_user_id_read')
@@ -0,0 +1,26 @@
+"""add user/category index to tasks for keyset pagination
+
+Revision ID: d9a4f6c2e158
+Revises: c6e2a9d4f713
+Create Date: 2026-10-18 16:48:35.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9a4f6c2e158'
+down_revision = 'c6e2a9d4f713'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('tasks', schema=None) as batch_op:
+        batch_op.create_index('ix_tasks_user_id_category_id', ['user_id', 'category', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('tasks', schema=None) as batch_op:
+        batch_op.drop_index('ix_tasks_user_id_category_id')
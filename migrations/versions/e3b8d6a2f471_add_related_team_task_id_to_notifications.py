@@ -0,0 +1,26 @@
+"""add related_team_task_id to notifications
+
+Revision ID: e3b8d6a2f471
+Revises: d9a4f6c2e158
+Create Date: 2026-10-18 21:12:08.514372
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b8d6a2f471'
+down_revision = 'd9a4f6c2e158'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('related_team_task_id', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.drop_column('related_team_task_id')
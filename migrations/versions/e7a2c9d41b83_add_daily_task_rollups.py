@@ -0,0 +1,47 @@
+"""add daily_task_rollups table
+
+Revision ID: e7a2c9d41b83
+Revises: d5f1b8e2c604
+Create Date: 2026-10-18 12:02:47.190334
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a2c9d41b83'
+down_revision = 'd5f1b8e2c604'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_task_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('tasks_created', sa.Integer(), nullable=False),
+    sa.Column('tasks_completed', sa.Integer(), nullable=False),
+    sa.Column('tasks_archived', sa.Integer(), nullable=False),
+    sa.Column('work_seconds', sa.Integer(), nullable=False),
+    sa.Column('completed_high', sa.Integer(), nullable=False),
+    sa.Column('completed_medium', sa.Integer(), nullable=False),
+    sa.Column('completed_low', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'date', name='uq_daily_task_rollups_user_date')
+    )
+    with op.batch_alter_table('daily_task_rollups', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_daily_task_rollups_date'), ['date'], unique=False)
+        batch_op.create_index(batch_op.f('ix_daily_task_rollups_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('daily_task_rollups', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_daily_task_rollups_user_id'))
+        batch_op.drop_index(batch_op.f('ix_daily_task_rollups_date'))
+
+    op.drop_table('daily_task_rollups')
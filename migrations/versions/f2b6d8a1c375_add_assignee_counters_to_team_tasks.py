@@ -0,0 +1,36 @@
+"""add assignee counters to team_tasks
+
+Revision ID: f2b6d8a1c375
+Revises: e7a2c9d41b83
+Create Date: 2026-10-18 13:20:11.482913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b6d8a1c375'
+down_revision = 'e7a2c9d41b83'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('team_tasks', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('assignee_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('completed_assignee_count', sa.Integer(), server_default='0', nullable=False))
+
+    # 既存の担当者から件数を集計
+    op.execute(
+        'UPDATE team_tasks SET '
+        'assignee_count = (SELECT COUNT(*) FROM task_assignees WHERE task_assignees.team_task_id = team_tasks.id), '
+        'completed_assignee_count = (SELECT COUNT(*) FROM task_assignees '
+        'WHERE task_assignees.team_task_id = team_tasks.id AND task_assignees.completed = true)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('team_tasks', schema=None) as batch_op:
+        batch_op.drop_column('completed_assignee_count')
+        batch_op.drop_column('assignee_count')
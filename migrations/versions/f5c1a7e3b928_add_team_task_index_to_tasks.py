@@ -0,0 +1,28 @@
+"""add partial user/archived/id index on team-linked tasks
+
+Revision ID: f5c1a7e3b928
+Revises: e3b8d6a2f471
+Create Date: 2026-10-18 21:40:17.338190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5c1a7e3b928'
+down_revision = 'e3b8d6a2f471'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('tasks', schema=None) as batch_op:
+        batch_op.create_index('ix_tasks_user_id_team_id', ['user_id', 'archived', 'id'], unique=False,
+                              sqlite_where=sa.text('team_task_id IS NOT NULL'),
+                              postgresql_where=sa.text('team_task_id IS NOT NULL'))
+
+
+def downgrade():
+    with op.batch_alter_table('tasks', schema=None) as batch_op:
+        batch_op.drop_index('ix_tasks_user_id_team_id')
@@ -0,0 +1,168 @@
+"""
+マインドマップノードの一括操作（作成・更新・移動・削除）
+- 1リクエストで受け取った操作を順番に適用する。権限の確認は呼び出し元で1回だけ行う
+- 操作対象のノードはマップ内のものに限る（マップの親子関係を1クエリ、対象ノードを1クエリで読み込む）
+- 作成したノードは `ref` で同じリクエスト内の後続の操作から参照できる（parent_ref / ref）
+- 途中の操作が不正な場合は BatchOperationError を送出する。呼び出し元でロールバックし、何も反映しない
+- 作成・更新・削除の内容はチーム/個人マップで異なるため、呼び出し元が関数を渡す
+  達成度・リビジョン・担当者数は既存のセッションのリスナーで反映される
+"""
+
+MAX_OPERATIONS = 200
+OPERATION_TYPES = ('create', 'update', 'move', 'delete')
+
+
+class BatchOperationError(Exception):
+    """一括操作の内容が不正（index は問題のあった操作の位置）"""
+
+    def __init__(self, message, index=None):
+        super().__init__(message)
+        self.message = message
+        self.index = index
+
+
+def _node_id_or_none(value):
+    if value is None or isinstance(value, bool) or not isinstance(value, int):
+        return None
+    return value
+
+
+def _referenced_ids(operations):
+    """操作で直接指定されている既存ノードID"""
+    ids = set()
+    for operation in operations:
+        for key in ('id', 'parent_id'):
+            node_id = _node_id_or_none(operation.get(key))
+            if node_id is not None:
+                ids.add(node_id)
+    return ids
+
+
+def validate_operations(data):
+    """リクエストの JSON から操作の一覧を取り出す"""
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        raise BatchOperationError('operations を指定してください')
+    if len(operations) > MAX_OPERATIONS:
+        raise BatchOperationError(f'一度に実行できる操作は{MAX_OPERATIONS}件までです')
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in OPERATION_TYPES:
+            raise BatchOperationError('不正な操作です', index)
+    return operations
+
+
+def apply_node_operations(mindmap_obj, operations, create_node, update_node, delete_node, move_node=None):
+    """
+    操作を順番に適用する（commit は呼び出し元で行う）
+    - create_node(data, parent_id) -> MindmapNode
+    - update_node(node, data)
+    - delete_node(node)（子ノードも削除される）
+    - move_node(node, old_parent_id)（親の変更後に呼ぶ。省略可）
+    戻り値: {'created': {ref: node_id}, 'updated': [node_id, ...], 'moved': [...], 'deleted': [...]}
+    """
+    from models import MindmapNode, db
+
+    nodes_table = MindmapNode.__table__
+    parents = {
+        node_id: parent_id for node_id, parent_id in db.session.execute(
+            db.select(nodes_table.c.id, nodes_table.c.parent_id).where(nodes_table.c.mindmap_id == mindmap_obj.id)
+        )
+    }
+
+    referenced_ids = _referenced_ids(operations)
+    unknown_ids = referenced_ids - set(parents)
+    if unknown_ids:
+        for index, operation in enumerate(operations):
+            if {_node_id_or_none(operation.get('id')), _node_id_or_none(operation.get('parent_id'))} & unknown_ids:
+                raise BatchOperationError('ノードが見つかりません', index)
+
+    loaded = {}
+    if referenced_ids:
+        for node in MindmapNode.query.filter(MindmapNode.id.in_(referenced_ids)).all():
+            loaded[node.id] = node
+
+    refs = {}
+    deleted = set()
+    result = {'created': {}, 'updated': [], 'moved': [], 'deleted': []}
+
+    def is_alive(node_id):
+        # 削除したノード（とその子孫）でないか
+        seen = set()
+        while node_id is not None and node_id not in seen:
+            if node_id in deleted or node_id not in parents:
+                return False
+            seen.add(node_id)
+            node_id = parents[node_id]
+        return True
+
+    def resolve(operation, id_key, ref_key, index):
+        if operation.get(ref_key) is not None:
+            node_id = refs.get(operation[ref_key])
+            if node_id is None:
+                raise BatchOperationError(f'{ref_key} が見つかりません', index)
+        else:
+            node_id = _node_id_or_none(operation.get(id_key))
+            if node_id is None:
+                return None
+        if not is_alive(node_id):
+            raise BatchOperationError('ノードは削除されています', index)
+        return node_id
+
+    def get_node(node_id):
+        node = loaded.get(node_id)
+        if node is None:
+            node = db.session.get(MindmapNode, node_id)
+            loaded[node_id] = node
+        return node
+
+    for index, operation in enumerate(operations):
+        op = operation['op']
+
+        if op == 'create':
+            parent_id = resolve(operation, 'parent_id', 'parent_ref', index)
+            node = create_node(operation, parent_id)
+            db.session.flush()  # IDを取得するため
+            loaded[node.id] = node
+            parents[node.id] = node.parent_id
+            ref = operation.get('ref')
+            result['created'][str(ref if ref is not None else index)] = node.id
+            if ref is not None:
+                refs[ref] = node.id
+            continue
+
+        node_id = resolve(operation, 'id', 'ref', index)
+        if node_id is None:
+            raise BatchOperationError('id を指定してください', index)
+        node = get_node(node_id)
+
+        if op == 'update':
+            update_node(node, operation)
+            result['updated'].append(node_id)
+
+        elif op == 'move':
+            if 'parent_id' not in operation and operation.get('parent_ref') is None:
+                raise BatchOperationError('parent_id を指定してください', index)
+            new_parent_id = resolve(operation, 'parent_id', 'parent_ref', index)
+            # 自分自身・子孫の下には移動できない
+            ancestor_id = new_parent_id
+            while ancestor_id is not None:
+                if ancestor_id == node_id:
+                    raise BatchOperationError('子孫ノードの下には移動できません', index)
+                ancestor_id = parents.get(ancestor_id)
+            old_parent_id = node.parent_id
+            node.parent_id = new_parent_id
+            if 'position_x' in operation:
+                node.position_x = operation['position_x']
+            if 'position_y' in operation:
+                node.position_y = operation['position_y']
+            parents[node_id] = new_parent_id
+            if move_node and old_parent_id != new_parent_id:
+                move_node(node, old_parent_id)
+            result['moved'].append(node_id)
+
+        elif op == 'delete':
+            delete_node(node)
+            deleted.add(node_id)
+            result['deleted'].append(node_id)
+
+    return result
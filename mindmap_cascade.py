@@ -0,0 +1,156 @@
+"""
+マインドマップノードの部分木・チームタスクの一括削除
+- 削除対象（ノード・チームタスク・担当者・個人タスク）を階層パスの範囲条件で1回ずつ求め、
+  DELETE ... WHERE id IN (...) で種類ごとに1文ずつ削除する（ORM の cascade で1件ずつ削除しない）
+  - ノードとチームタスクは互いに参照しているため、先にノード側の team_task_id を外してから削除する
+- ORM を経由しないため、セッションのリスナーで行っている処理をここで明示的に行う
+  - 親ノード・マップの達成度（mindmap_progress）、リビジョンと削除記録（mindmap_sync）
+  - 削除した個人タスクの UserPerformance（performance_tracker）、スナップショットキャッシュの破棄
+  - 増分モードでない場合の UserPerformance の再計算はコミットを伴うため、
+    呼び出し元のコミット後に sync_deleted_task_performance で行う
+"""
+
+
+def _empty_summary():
+    return {'nodes': 0, 'team_tasks': 0, 'assignees': 0, 'tasks': 0, 'unlinked_nodes': 0, 'user_ids': []}
+
+
+def delete_mindmap_subtrees(root_nodes, team_task_ids=()):
+    """
+    root_nodes の各ノードと子孫、および team_task_ids のチームタスクをまとめて削除（commit は呼び出し元で行う）
+    - 部分木のノードをサブタスクの親とするチームタスク、その担当者・個人タスク、
+      部分木のノードをタスクカードとする個人タスクも削除する
+    - 部分木の外で削除したタスクにリンクしているノードはリンクを外す
+    戻り値: 削除・変更した件数 {'nodes', 'team_tasks', 'assignees', 'tasks', 'unlinked_nodes', 'user_ids'}
+    """
+    from models import MindmapNode, TeamTask, TaskAssignee, Task, db
+    from mindmap_hierarchy import subtree_condition, ensure_path
+    from mindmap_progress import propagate_bulk_changes
+    from mindmap_sync import bump_revisions
+    from performance_tracker import apply_deleted_tasks
+    from cache import invalidate_users_on_commit
+    from sqlalchemy import inspect as sa_inspect
+
+    root_nodes = [node for node in root_nodes if node is not None]
+    team_task_ids = set(team_task_ids)
+    if not root_nodes and not team_task_ids:
+        return _empty_summary()
+
+    session = db.session
+    conditions = [
+        db.and_(MindmapNode.mindmap_id == node.mindmap_id, subtree_condition(MindmapNode.path, ensure_path(node)))
+        for node in root_nodes
+    ]
+    session.flush()
+    connection = session.connection()
+    nodes = MindmapNode.__table__
+    team_tasks = TeamTask.__table__
+    assignees = TaskAssignee.__table__
+    tasks = Task.__table__
+
+    # 削除対象のノード（部分木）
+    node_rows = connection.execute(
+        db.select(nodes.c.id, nodes.c.mindmap_id, nodes.c.parent_id).where(db.or_(*conditions))
+    ).all() if conditions else []
+    node_ids = {row.id for row in node_rows}
+
+    # 削除対象のチームタスク（部分木のノードのサブタスク＋指定分）
+    task_query = db.select(team_tasks.c.id, team_tasks.c.parent_node_id)
+    task_filters = []
+    if node_ids:
+        task_filters.append(team_tasks.c.parent_node_id.in_(node_ids))
+    if team_task_ids:
+        task_filters.append(team_tasks.c.id.in_(team_task_ids))
+    team_task_rows = connection.execute(task_query.where(db.or_(*task_filters))).all()
+    team_task_ids = {row.id for row in team_task_rows}
+
+    # 削除対象の個人タスク（チームタスクの担当者分・部分木のタスクカードのタスク）
+    personal_filters = []
+    if team_task_ids:
+        personal_filters.append(tasks.c.team_task_id.in_(team_task_ids))
+    if node_ids:
+        personal_filters.append(tasks.c.task_card_node_id.in_(node_ids))
+    personal_rows = connection.execute(
+        db.select(tasks.c.id, tasks.c.user_id, tasks.c.created_at, tasks.c.completed,
+                  tasks.c.completed_at, tasks.c.archived, tasks.c.total_seconds).where(db.or_(*personal_filters))
+    ).all() if personal_filters else []
+    personal_ids = {row.id for row in personal_rows}
+
+    summary = _empty_summary()
+    changed = {}
+
+    # 部分木の外で、削除するタスクにリンクしているノードのリンクを外す
+    unlink_filters = []
+    if team_task_ids:
+        unlink_filters.append(nodes.c.team_task_id.in_(team_task_ids))
+    if personal_ids:
+        unlink_filters.append(nodes.c.task_id.in_(personal_ids))
+    if unlink_filters:
+        outside = db.or_(*unlink_filters)
+        if node_ids:
+            outside = db.and_(outside, nodes.c.id.notin_(node_ids))
+        for node_id, mindmap_id in connection.execute(db.select(nodes.c.id, nodes.c.mindmap_id).where(outside)):
+            changed.setdefault(mindmap_id, set()).add(node_id)
+    if team_task_ids:
+        connection.execute(nodes.update().where(nodes.c.team_task_id.in_(team_task_ids)).values(team_task_id=None))
+    if personal_ids:
+        connection.execute(nodes.update().where(nodes.c.task_id.in_(personal_ids)).values(task_id=None))
+    summary['unlinked_nodes'] = sum(len(ids) for ids in changed.values())
+
+    if team_task_ids:
+        summary['assignees'] = connection.execute(
+            assignees.delete().where(assignees.c.team_task_id.in_(team_task_ids))
+        ).rowcount
+    if personal_ids:
+        summary['tasks'] = connection.execute(tasks.delete().where(tasks.c.id.in_(personal_ids))).rowcount
+    if team_task_ids:
+        summary['team_tasks'] = connection.execute(
+            team_tasks.delete().where(team_tasks.c.id.in_(team_task_ids))
+        ).rowcount
+    if node_ids:
+        summary['nodes'] = connection.execute(nodes.delete().where(nodes.c.id.in_(node_ids))).rowcount
+
+    # 残ったノードの達成度（削除した部分木の親・削除したサブタスクの親ノード・リンクを外したノード）
+    start_ids = {row.parent_id for row in node_rows} | {row.parent_node_id for row in team_task_rows}
+    for ids in changed.values():
+        start_ids.update(ids)
+    start_ids -= node_ids
+    mindmap_ids = {row.mindmap_id for row in node_rows}
+    progress_ids = propagate_bulk_changes(start_ids, mindmap_ids, connection=connection)
+    if progress_ids:
+        for node_id, mindmap_id in connection.execute(
+            db.select(nodes.c.id, nodes.c.mindmap_id).where(nodes.c.id.in_(progress_ids))
+        ):
+            changed.setdefault(mindmap_id, set()).add(node_id)
+    bump_revisions(connection, changed, [(row.mindmap_id, row.id) for row in node_rows])
+
+    # 削除した行をセッションから外し、DB 側で更新した値は次回アクセス時に読み直す
+    deleted_keys = {MindmapNode: node_ids, TeamTask: team_task_ids, Task: personal_ids}
+    for obj in list(session.identity_map.values()):
+        state = sa_inspect(obj)
+        if isinstance(obj, TaskAssignee):
+            deleted = state.dict.get('team_task_id') in team_task_ids
+        else:
+            deleted = state.identity[0] in deleted_keys.get(type(obj), ())
+        if deleted:
+            session.expunge(obj)
+    session.expire_all()
+
+    # UserPerformance とスナップショットキャッシュ
+    user_ids = sorted({row.user_id for row in personal_rows if row.user_id is not None})
+    apply_deleted_tasks([tuple(row)[1:] for row in personal_rows], connection=connection)
+    invalidate_users_on_commit(session, user_ids)
+    summary['user_ids'] = user_ids
+
+    return summary
+
+
+def sync_deleted_task_performance(user_ids):
+    """
+    削除した個人タスクのユーザーの UserPerformance を更新（呼び出し元のコミット後に呼ぶ）
+    - 増分モードでは delete_mindmap_subtrees で差分を反映済みのため何もしない
+    """
+    from models import UserPerformance
+
+    for user_id in user_ids:
+        UserPerformance.sync_daily_performance(user_id)
@@ -0,0 +1,255 @@
+"""
+マインドマップノードの階層パス（mindmap_nodes.path）
+- ルートから自ノードまでのIDを並べた文字列を保存する（例: ルート1 → 5 → 12 なら '/1/5/12/'）
+- 「あるノードの子孫すべて」はパスの前方一致を範囲条件（path >= '/1/5/' AND path < '/1/50'）にして、
+  (mindmap_id, path) のインデックスを使う1クエリで取得する
+- ノードの追加・親の変更（移動）をセッションの flush で検知し、同じトランザクション内でパスを設定する
+  - 移動したノードの子孫のパスは UPDATE 1文でまとめて付け替える
+- 既存データの設定やずれの補正には `flask atd backfill-node-paths` を使う
+"""
+from sqlalchemy import event
+
+PATH_SEPARATOR = '/'
+
+_PENDING_KEY = 'mindmap_hierarchy_pending'
+_EXPIRE_KEY = 'mindmap_hierarchy_expire'
+
+_registered = False
+
+
+def node_path(parent_path, node_id):
+    """親のパスと自ノードのIDからパスを作成（親が無い場合はルート）"""
+    return f'{parent_path or PATH_SEPARATOR}{node_id}{PATH_SEPARATOR}'
+
+
+def _prefix_upper_bound(path):
+    # 区切り文字の次の文字に置き換えた値が、前方一致する文字列の上限になる
+    return path[:-1] + chr(ord(PATH_SEPARATOR) + 1)
+
+
+def subtree_condition(path_column, path, include_self=True):
+    """path の子孫（include_self の場合は自身も含む）に一致する条件"""
+    from models import db
+
+    condition = db.and_(path_column >= path, path_column < _prefix_upper_bound(path))
+    if not include_self:
+        condition = db.and_(condition, path_column != path)
+    return condition
+
+
+def subtree_node_ids_query(node, include_self=True):
+    """node の子孫のノードIDを返す SELECT（IN (subquery) 用）"""
+    from models import MindmapNode, db
+
+    nodes = MindmapNode.__table__
+    return db.select(nodes.c.id).where(
+        nodes.c.mindmap_id == node.mindmap_id,
+        subtree_condition(nodes.c.path, ensure_path(node), include_self=include_self)
+    )
+
+
+def get_subtree_node_ids(node, include_self=True):
+    """node の子孫のノードID（1クエリ）"""
+    from models import db
+
+    return [row[0] for row in db.session.execute(subtree_node_ids_query(node, include_self=include_self))]
+
+
+def ensure_path(node):
+    """パスが未設定の場合は flush して設定する（未設定のままの場合はマップ単位で作り直す）"""
+    from models import db
+
+    if node.path is None:
+        db.session.flush()
+        if node.path is None:
+            rebuild_node_paths([node.mindmap_id])
+            db.session.refresh(node, ['path'])
+    return node.path
+
+
+def _collect_changes(session, flush_context, instances):
+    """flush 前に、パスの設定が必要なノード（追加・親の変更）を記録"""
+    from models import MindmapNode
+    from sqlalchemy import inspect as sa_inspect
+
+    session.info.pop(_PENDING_KEY, None)
+    pending = {'new': [], 'moved': []}
+
+    for obj in session.new:
+        if isinstance(obj, MindmapNode):
+            pending['new'].append(obj)
+
+    for obj in session.dirty:
+        if isinstance(obj, MindmapNode) and sa_inspect(obj).attrs.parent_id.history.has_changes():
+            pending['moved'].append(obj)
+
+    if pending['new'] or pending['moved']:
+        session.info[_PENDING_KEY] = pending
+
+
+def _assign_paths(session, flush_context):
+    """flush 後に、追加したノードのパスを設定し、移動したノードの部分木のパスを付け替える"""
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+
+    from models import MindmapNode, db
+
+    nodes = MindmapNode.__table__
+    connection = session.connection()
+    updated_ids = set()
+
+    # 追加したノード（親も同じ flush で追加した場合があるため ID 順に親から設定）
+    new_nodes = sorted((obj for obj in pending['new'] if obj.id is not None), key=lambda obj: obj.id)
+    if new_nodes:
+        new_ids = {obj.id for obj in new_nodes}
+        parent_ids = {obj.parent_id for obj in new_nodes if obj.parent_id is not None} - new_ids
+        paths = {}
+        if parent_ids:
+            paths.update(connection.execute(
+                db.select(nodes.c.id, nodes.c.path).where(nodes.c.id.in_(parent_ids))
+            ).all())
+        rows = []
+        for obj in new_nodes:
+            paths[obj.id] = node_path(paths.get(obj.parent_id), obj.id)
+            rows.append({'node_id': obj.id, 'new_path': paths[obj.id]})
+        connection.execute(
+            nodes.update().where(nodes.c.id == db.bindparam('node_id')).values(path=db.bindparam('new_path')),
+            rows
+        )
+        updated_ids.update(new_ids)
+
+    # 移動したノード（順番に処理し、毎回現在の親のパスを読むため、同じ flush での複数の移動にも対応）
+    for obj in pending['moved']:
+        updated_ids.update(move_subtree(connection, obj.id))
+
+    session.info.setdefault(_EXPIRE_KEY, set()).update(updated_ids)
+
+
+def move_subtree(connection, node_id):
+    """
+    node_id の現在の親に合わせて、自身と子孫のパスを UPDATE 1文で付け替える
+    戻り値: パスを変更したノードID
+    """
+    from models import MindmapNode, db
+
+    nodes = MindmapNode.__table__
+    parents = nodes.alias('parents')
+    row = connection.execute(
+        db.select(nodes.c.mindmap_id, nodes.c.path, parents.c.path)
+        .select_from(nodes.outerjoin(parents, parents.c.id == nodes.c.parent_id))
+        .where(nodes.c.id == node_id)
+    ).first()
+    if row is None:
+        return set()
+    mindmap_id, old_path, parent_path = row
+    new_path = node_path(parent_path, node_id)
+    if old_path == new_path:
+        return set()
+    if old_path is None:
+        # パスが未設定の場合はマップ単位で作り直す
+        rebuild_node_paths([mindmap_id], connection=connection)
+        return {
+            row[0] for row in connection.execute(db.select(nodes.c.id).where(nodes.c.mindmap_id == mindmap_id))
+        }
+
+    condition = db.and_(nodes.c.mindmap_id == mindmap_id, subtree_condition(nodes.c.path, old_path))
+    moved_ids = {row[0] for row in connection.execute(db.select(nodes.c.id).where(condition))}
+    connection.execute(
+        nodes.update().where(condition).values(
+            path=db.literal(new_path) + db.func.substr(nodes.c.path, len(old_path) + 1)
+        )
+    )
+    return moved_ids
+
+
+def _expire_paths(session, flush_context):
+    """DB 側で設定したパスを、読み込み済みのノードから破棄"""
+    node_ids = session.info.pop(_EXPIRE_KEY, None)
+    if not node_ids:
+        return
+
+    from models import MindmapNode
+
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, MindmapNode) and obj.id in node_ids:
+            session.expire(obj, ['path'])
+
+
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_EXPIRE_KEY, None)
+
+
+def rebuild_node_paths(mindmap_ids=None, connection=None):
+    """
+    parent_id からパスを計算し直して、値が異なるノードだけ更新
+    - mindmap_ids を省略した場合は全件
+    - 親が見つからない（別のマップ・循環している）ノードはルートとして扱う
+    戻り値: 更新した行数
+    """
+    from models import MindmapNode, db
+
+    nodes = MindmapNode.__table__
+    if connection is None:
+        connection = db.session.connection()
+
+    query = db.select(nodes.c.id, nodes.c.parent_id, nodes.c.mindmap_id, nodes.c.path)
+    if mindmap_ids is not None:
+        mindmap_ids = list(mindmap_ids)
+        if not mindmap_ids:
+            return 0
+        query = query.where(nodes.c.mindmap_id.in_(mindmap_ids))
+    rows = connection.execute(query.order_by(nodes.c.id)).all()
+
+    by_id = {row.id: row for row in rows}
+    children = {}
+    roots = []
+    for row in rows:
+        parent = by_id.get(row.parent_id)
+        if parent is None or parent.mindmap_id != row.mindmap_id:
+            roots.append(row.id)
+        else:
+            children.setdefault(row.parent_id, []).append(row.id)
+
+    paths = {}
+    stack = [(node_id, None) for node_id in reversed(roots)]
+    while stack:
+        node_id, parent_path = stack.pop()
+        paths[node_id] = node_path(parent_path, node_id)
+        for child_id in reversed(children.get(node_id, [])):
+            stack.append((child_id, paths[node_id]))
+    # 循環していて到達できないノードはルートとして扱う（子孫も含めて設定）
+    for row in rows:
+        if row.id not in paths:
+            stack = [(row.id, None)]
+            while stack:
+                node_id, parent_path = stack.pop()
+                if node_id in paths:
+                    continue
+                paths[node_id] = node_path(parent_path, node_id)
+                for child_id in children.get(node_id, []):
+                    stack.append((child_id, paths[node_id]))
+
+    updates = [
+        {'node_id': row.id, 'new_path': paths[row.id]}
+        for row in rows if row.path != paths[row.id]
+    ]
+    if updates:
+        connection.execute(
+            nodes.update().where(nodes.c.id == db.bindparam('node_id')).values(path=db.bindparam('new_path')),
+            updates
+        )
+    return len(updates)
+
+
+def register_mindmap_hierarchy_listeners(session):
+    """セッションに階層パス更新用のイベントリスナーを登録（1回のみ）"""
+    global _registered
+    if _registered:
+        return
+    event.listen(session, 'before_flush', _collect_changes)
+    event.listen(session, 'after_flush', _assign_paths)
+    event.listen(session, 'after_flush_postexec', _expire_paths)
+    event.listen(session, 'after_rollback', _discard_pending)
+    _registered = True
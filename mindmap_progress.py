@@ -0,0 +1,506 @@
+"""
+マインドマップの達成度計算
+- マップ全体のノードと、ノードに紐付くチームタスク（担当者数カウンター）をそれぞれ1クエリで読み込み、
+  メモリ上で子→親の順（後行順）に1回だけ走査して全ノードの達成度とマップ全体の達成度を求める
+- ノードの達成度の優先順位は MindmapNode.calculate_progress と同じ
+  1. サブタスク（parent_node_id が自ノードのチームタスク）がある場合はその完了率の平均
+  2. タスクノード（is_task かつ team_task_id あり）の場合はそのチームタスクの完了率
+  3. 子ノードがある場合は子ノードの達成度の平均
+  4. それ以外はノード自身の progress
+- マップ全体の達成度は子ノードを持たないノードの達成度の平均
+- 計算結果はノードの progress とマップの progress に保存する。タスクの完了・担当者の変更・ノードの
+  追加/削除/移動はセッションの flush で検知し、変更されたノードから親方向（祖先のみ）に再計算する
+  - 値が変わらなくなった時点で打ち切るため、更新する行数は木の深さ程度
+  - マップの達成度は子ノードを持たないノードの件数・合計（leaf_count / leaf_progress_sum）から求める
+  - 個人マップは親ノードをカードのタスクから計算するため、親方向の再計算は行わずマップの合計のみ更新する
+- 保存値のずれの補正には `flask atd repair-mindmap-progress` を使う
+"""
+from sqlalchemy import event
+
+_PENDING_KEY = 'mindmap_progress_pending'
+_EXPIRE_KEY = 'mindmap_progress_expire'
+
+_registered = False
+
+
+def _map_progress(leaf_count, leaf_progress_sum):
+    """子ノードを持たないノードの件数・合計からマップ全体の達成度を計算（DB 側の計算と同じ整数除算）"""
+    return leaf_progress_sum // leaf_count if leaf_count > 0 else 0
+
+
+def _completion_rate(assignee_count, completed_assignee_count):
+    """TeamTask.calculate_completion_rate と同じ計算"""
+    if not assignee_count:
+        return 0
+    return int((completed_assignee_count or 0) / assignee_count * 100)
+
+
+def load_mindmap_tree(mindmap_id):
+    """
+    マップのノードと関連するチームタスクを読み込む（2クエリ）
+    戻り値: (nodes, task_rates, subtask_rates)
+    - nodes: [(id, parent_id, is_task, team_task_id, progress), ...]（id 順）
+    - task_rates: {team_task_id: 完了率}
+    - subtask_rates: {node_id: [サブタスクの完了率, ...]}
+    """
+    from models import MindmapNode, TeamTask, db
+
+    nodes = db.session.query(
+        MindmapNode.id,
+        MindmapNode.parent_id,
+        MindmapNode.is_task,
+        MindmapNode.team_task_id,
+        MindmapNode.progress
+    ).filter(
+        MindmapNode.mindmap_id == mindmap_id
+    ).order_by(MindmapNode.id).all()
+
+    task_rates = {}
+    subtask_rates = {}
+    if not nodes:
+        return nodes, task_rates, subtask_rates
+
+    node_ids = db.select(MindmapNode.id).where(MindmapNode.mindmap_id == mindmap_id)
+    linked_task_ids = [node.team_task_id for node in nodes if node.is_task and node.team_task_id]
+    task_filter = TeamTask.parent_node_id.in_(node_ids)
+    if linked_task_ids:
+        task_filter = db.or_(task_filter, TeamTask.id.in_(linked_task_ids))
+
+    tasks = db.session.query(
+        TeamTask.id,
+        TeamTask.parent_node_id,
+        TeamTask.assignee_count,
+        TeamTask.completed_assignee_count
+    ).filter(task_filter).order_by(TeamTask.id).all()
+
+    for task_id, parent_node_id, assignee_count, completed_assignee_count in tasks:
+        rate = _completion_rate(assignee_count, completed_assignee_count)
+        task_rates[task_id] = rate
+        if parent_node_id is not None:
+            subtask_rates.setdefault(parent_node_id, []).append(rate)
+
+    return nodes, task_rates, subtask_rates
+
+
+def compute_tree_progress(nodes, task_rates, subtask_rates):
+    """
+    読み込んだノードから全ノードの達成度とマップ全体の達成度を計算（後行順の1回の走査）
+    戻り値: {'progress': マップ全体の達成度, 'nodes': {node_id: 達成度}}
+    """
+    by_id = {node.id: node for node in nodes}
+    children = {}
+    roots = []
+    for node in nodes:
+        if node.parent_id is not None and node.parent_id in by_id:
+            children.setdefault(node.parent_id, []).append(node.id)
+        else:
+            roots.append(node.id)
+
+    progress = {}
+    for root_id in roots:
+        # 再帰を使わずに後行順で走査（子ノードをすべて計算してから親ノードを計算）
+        stack = [(root_id, False)]
+        while stack:
+            node_id, expanded = stack.pop()
+            if node_id in progress:
+                continue
+            if not expanded:
+                stack.append((node_id, True))
+                stack.extend((child_id, False) for child_id in children.get(node_id, ()) if child_id not in progress)
+                continue
+
+            node = by_id[node_id]
+            rates = subtask_rates.get(node_id)
+            child_ids = children.get(node_id)
+            if rates:
+                value = int(sum(rates) / len(rates))
+            elif node.is_task and node.team_task_id:
+                value = task_rates.get(node.team_task_id, node.progress)
+            elif child_ids:
+                value = int(sum(progress.get(child_id) or 0 for child_id in child_ids) / len(child_ids))
+            else:
+                value = node.progress
+            progress[node_id] = value
+
+    # 親が循環していて根から辿れないノードは自身の progress を使う
+    for node in nodes:
+        progress.setdefault(node.id, node.progress)
+
+    # マップ全体：子ノードを持たないノードの平均
+    leaf_count = 0
+    leaf_progress_sum = 0
+    for node in nodes:
+        if node.id not in children:
+            leaf_count += 1
+            leaf_progress_sum += progress[node.id] or 0
+
+    return {
+        'progress': _map_progress(leaf_count, leaf_progress_sum),
+        'nodes': progress,
+        'leaf_count': leaf_count,
+        'leaf_progress_sum': leaf_progress_sum
+    }
+
+
+def calculate_mindmap_progress(mindmap_id):
+    """マップ全体と全ノードの達成度を計算"""
+    return compute_tree_progress(*load_mindmap_tree(mindmap_id))
+
+
+def _tables():
+    from models import Mindmap, MindmapNode, TeamTask
+    return Mindmap.__table__, MindmapNode.__table__, TeamTask.__table__
+
+
+def _recompute_node(connection, node_id):
+    """
+    保存済みの子ノード・チームタスクの値から1ノードの達成度を計算
+    戻り値: (ノードの行 or None, 計算した達成度, 子ノード数)
+    """
+    from models import db
+
+    mindmaps, nodes, team_tasks = _tables()
+    node = connection.execute(
+        db.select(nodes.c.id, nodes.c.parent_id, nodes.c.mindmap_id, nodes.c.is_task,
+                  nodes.c.team_task_id, nodes.c.progress).where(nodes.c.id == node_id)
+    ).first()
+    if node is None:
+        return None, None, 0
+
+    child_count, child_sum = connection.execute(
+        db.select(db.func.count(nodes.c.id), db.func.sum(db.func.coalesce(nodes.c.progress, 0)))
+        .where(nodes.c.parent_id == node_id)
+    ).first()
+    subtasks = connection.execute(
+        db.select(team_tasks.c.assignee_count, team_tasks.c.completed_assignee_count)
+        .where(team_tasks.c.parent_node_id == node_id)
+    ).all()
+
+    if subtasks:
+        rates = [_completion_rate(*row) for row in subtasks]
+        value = int(sum(rates) / len(rates))
+    elif node.is_task and node.team_task_id:
+        linked = connection.execute(
+            db.select(team_tasks.c.assignee_count, team_tasks.c.completed_assignee_count)
+            .where(team_tasks.c.id == node.team_task_id)
+        ).first()
+        value = _completion_rate(*linked) if linked else node.progress
+    elif child_count:
+        value = int((child_sum or 0) / child_count)
+    else:
+        value = node.progress
+    return node, value, child_count
+
+
+def _propagate_up(connection, start_ids, leaf_deltas, updated_ids):
+    """
+    start_ids の各ノードから親方向に達成度を再計算して保存（値が変わらなくなったら打ち切る）
+    - 子ノードを持たないノードの値が変わった場合は leaf_deltas にマップごとの差分を加算する
+    """
+    from models import db
+
+    mindmaps, nodes, team_tasks = _tables()
+    for start_id in start_ids:
+        node_id = start_id
+        visited = set()
+        while node_id is not None and node_id not in visited:
+            visited.add(node_id)
+            node, value, child_count = _recompute_node(connection, node_id)
+            if node is None:
+                break
+            if value != node.progress:
+                connection.execute(nodes.update().where(nodes.c.id == node_id).values(progress=value))
+                updated_ids.add(node_id)
+                if not child_count:
+                    leaf_deltas[node.mindmap_id] = leaf_deltas.get(node.mindmap_id, 0) + (value or 0) - (node.progress or 0)
+            elif node_id != start_id:
+                break
+            node_id = node.parent_id
+
+
+def refresh_mindmap_totals(mindmap_ids, connection=None):
+    """子ノードを持たないノードの件数・合計を数え直してマップの達成度を更新（マップごとに1回の集計）"""
+    from models import db
+
+    mindmaps, nodes, team_tasks = _tables()
+    if connection is None:
+        connection = db.session.connection()
+
+    children = nodes.alias('children')
+    for mindmap_id in mindmap_ids:
+        leaf_count, leaf_progress_sum = connection.execute(
+            db.select(db.func.count(nodes.c.id), db.func.coalesce(db.func.sum(db.func.coalesce(nodes.c.progress, 0)), 0))
+            .where(
+                nodes.c.mindmap_id == mindmap_id,
+                ~db.exists().where(children.c.parent_id == nodes.c.id)
+            )
+        ).first()
+        connection.execute(mindmaps.update().where(mindmaps.c.id == mindmap_id).values(
+            leaf_count=leaf_count,
+            leaf_progress_sum=int(leaf_progress_sum or 0),
+            progress=_map_progress(leaf_count, int(leaf_progress_sum or 0))
+        ))
+
+
+def _apply_leaf_deltas(connection, leaf_deltas):
+    """子ノードを持たないノードの値の差分をマップの合計に加算し、達成度を更新"""
+    from models import db
+
+    mindmaps, nodes, team_tasks = _tables()
+    for mindmap_id, delta in leaf_deltas.items():
+        if not delta:
+            continue
+        new_sum = mindmaps.c.leaf_progress_sum + delta
+        connection.execute(mindmaps.update().where(mindmaps.c.id == mindmap_id).values(
+            leaf_progress_sum=new_sum,
+            progress=db.case((mindmaps.c.leaf_count > 0, new_sum // mindmaps.c.leaf_count), else_=0)
+        ))
+
+
+def _team_node_ids(connection, node_ids):
+    """チームマップのノードだけを ID 順に返す（個人マップのノードは親方向に再計算しない）"""
+    from models import db
+
+    mindmaps, nodes, team_tasks = _tables()
+    if not node_ids:
+        return []
+    return [row[0] for row in connection.execute(
+        db.select(nodes.c.id).join(mindmaps, nodes.c.mindmap_id == mindmaps.c.id).where(
+            nodes.c.id.in_(list(node_ids)),
+            mindmaps.c.team_id.isnot(None)
+        ).order_by(nodes.c.id)
+    )]
+
+
+def propagate_bulk_changes(start_ids, mindmap_ids, connection=None):
+    """
+    ORM を経由せずにノード・チームタスクを変更した後に呼ぶ
+    - start_ids のノードから親方向に達成度を再計算し、mindmap_ids のマップの合計を数え直す
+    戻り値: 達成度を更新したノードID
+    """
+    from models import db
+
+    if connection is None:
+        connection = db.session.connection()
+    updated_ids = set()
+    leaf_deltas = {}
+    _propagate_up(connection, _team_node_ids(connection, set(start_ids) - {None}), leaf_deltas, updated_ids)
+    mindmap_ids = set(mindmap_ids) - {None}
+    if mindmap_ids:
+        refresh_mindmap_totals(sorted(mindmap_ids), connection=connection)
+    _apply_leaf_deltas(connection, {key: value for key, value in leaf_deltas.items() if key not in mindmap_ids})
+    return updated_ids
+
+
+
+def update_task_card_progress(node_id):
+    """カードに紐づくタスクの完了率を再計算"""
+    from models import MindmapNode, Task, db
+
+    node = db.session.get(MindmapNode, node_id)
+    if not node:
+        return
+    card_tasks = Task.query.filter_by(task_card_node_id=node.id, archived=False).all()
+    if card_tasks:
+        progress = int(sum(1 for task in card_tasks if task.completed) / len(card_tasks) * 100)
+    else:
+        progress = 0
+    if node.progress != progress:
+        node.progress = progress
+        db.session.add(node)
+
+def _collect_changes(session, flush_context, instances):
+    """flush 前に、達成度の再計算が必要なノード・マップを記録"""
+    from models import MindmapNode, TeamTask, TaskAssignee
+    from sqlalchemy import inspect as sa_inspect
+
+    session.info.pop(_PENDING_KEY, None)
+    pending = {
+        'new_nodes': [],
+        'start_ids': set(),
+        'progress_changes': [],
+        'structural': set(),
+        'team_task_ids': set()
+    }
+
+    for obj in session.new:
+        if isinstance(obj, MindmapNode):
+            pending['new_nodes'].append(obj)
+        elif isinstance(obj, TeamTask):
+            pending['start_ids'].add(obj.parent_node_id)
+        elif isinstance(obj, TaskAssignee):
+            pending['team_task_ids'].add(obj.team_task_id)
+
+    for obj in session.dirty:
+        state = sa_inspect(obj)
+        if isinstance(obj, MindmapNode):
+            parent_history = state.attrs.parent_id.history
+            if parent_history.has_changes():
+                pending['structural'].add(obj.mindmap_id)
+                pending['start_ids'].update(parent_history.deleted)
+                pending['start_ids'].update((obj.parent_id, obj.id))
+            progress_history = state.attrs.progress.history
+            if progress_history.has_changes():
+                old = progress_history.deleted[0] if progress_history.deleted else None
+                pending['progress_changes'].append((obj.id, obj.mindmap_id, obj.parent_id, old, obj.progress))
+            if state.attrs.is_task.history.has_changes() or state.attrs.team_task_id.history.has_changes():
+                pending['start_ids'].add(obj.id)
+        elif isinstance(obj, TeamTask):
+            history = state.attrs.parent_node_id.history
+            if history.has_changes():
+                pending['start_ids'].update(history.deleted)
+                pending['start_ids'].add(obj.parent_node_id)
+        elif isinstance(obj, TaskAssignee):
+            if state.attrs.completed.history.has_changes() or state.attrs.team_task_id.history.has_changes():
+                pending['team_task_ids'].update(state.attrs.team_task_id.history.deleted)
+                pending['team_task_ids'].add(obj.team_task_id)
+
+    for obj in session.deleted:
+        values = sa_inspect(obj).dict
+        if isinstance(obj, MindmapNode):
+            pending['structural'].add(values.get('mindmap_id'))
+            pending['start_ids'].add(values.get('parent_id'))
+        elif isinstance(obj, TeamTask):
+            pending['start_ids'].add(values.get('parent_node_id'))
+        elif isinstance(obj, TaskAssignee):
+            pending['team_task_ids'].add(values.get('team_task_id'))
+
+    pending['start_ids'].discard(None)
+    pending['structural'].discard(None)
+    pending['team_task_ids'].discard(None)
+    if any(pending.values()):
+        session.info[_PENDING_KEY] = pending
+
+
+def _propagate_changes(session, flush_context):
+    """flush 後に、同じトランザクション内で変更されたノードから親方向に達成度を更新"""
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+
+    from models import db
+
+    mindmaps, nodes, team_tasks = _tables()
+    connection = session.connection()
+    start_ids = set(pending['start_ids'])
+    structural = set(pending['structural'])
+    leaf_deltas = {}
+
+    for obj in pending['new_nodes']:
+        structural.add(obj.mindmap_id)
+        start_ids.add(obj.id)
+
+    # 担当者が変わったチームタスクのノード（サブタスクの親ノードとリンクしているタスクノード）
+    team_task_ids = list(pending['team_task_ids'])
+    if team_task_ids:
+        start_ids.update(row[0] for row in connection.execute(
+            db.select(team_tasks.c.parent_node_id).where(
+                team_tasks.c.id.in_(team_task_ids),
+                team_tasks.c.parent_node_id.isnot(None)
+            )
+        ))
+        start_ids.update(row[0] for row in connection.execute(
+            db.select(nodes.c.id).where(nodes.c.team_task_id.in_(team_task_ids))
+        ))
+
+    # ノードの progress が直接変更された場合：子ノードを持たなければマップの合計に差分を反映し、親から再計算
+    for node_id, mindmap_id, parent_id, old, new in pending['progress_changes']:
+        if mindmap_id not in structural:
+            has_children = connection.execute(
+                db.select(nodes.c.id).where(nodes.c.parent_id == node_id).limit(1)
+            ).first() is not None
+            if not has_children:
+                leaf_deltas[mindmap_id] = leaf_deltas.get(mindmap_id, 0) + (new or 0) - (old or 0)
+        if parent_id is not None:
+            start_ids.add(parent_id)
+
+    updated_ids = set()
+    _propagate_up(connection, _team_node_ids(connection, start_ids), leaf_deltas, updated_ids)
+
+    if structural:
+        refresh_mindmap_totals(sorted(structural), connection=connection)
+    _apply_leaf_deltas(connection, {key: value for key, value in leaf_deltas.items() if key not in structural})
+
+    expire = session.info.setdefault(_EXPIRE_KEY, {'nodes': set(), 'mindmaps': set()})
+    expire['nodes'].update(updated_ids)
+    expire['mindmaps'].update(structural)
+    expire['mindmaps'].update(leaf_deltas)
+
+
+def _expire_progress(session, flush_context):
+    """DB 側で更新した達成度を、読み込み済みのノード・マップから破棄（次回アクセス時に再取得）"""
+    expire = session.info.pop(_EXPIRE_KEY, None)
+    if not expire:
+        return
+
+    from models import Mindmap, MindmapNode
+
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, MindmapNode) and obj.id in expire['nodes']:
+            session.expire(obj, ['progress'])
+        elif isinstance(obj, Mindmap) and obj.id in expire['mindmaps']:
+            session.expire(obj, ['progress', 'leaf_count', 'leaf_progress_sum'])
+
+
+def progress_updated_node_ids(session):
+    """この flush で達成度を更新したノードID（after_flush の中で、このモジュールのリスナーより後に呼ぶ）"""
+    expire = session.info.get(_EXPIRE_KEY)
+    return set(expire['nodes']) if expire else set()
+
+
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_EXPIRE_KEY, None)
+
+
+def repair_mindmap_progress(mindmap_ids=None):
+    """
+    保存済みの達成度を全件再計算して補正
+    - チームマップはノードの progress も計算し直す（個人マップはマップの合計のみ）
+    戻り値: 補正したノード数
+    """
+    from models import Mindmap, db
+
+    mindmaps, nodes, team_tasks = _tables()
+    query = db.session.query(Mindmap.id, Mindmap.team_id).order_by(Mindmap.id)
+    if mindmap_ids is not None:
+        query = query.filter(Mindmap.id.in_(list(mindmap_ids)))
+
+    connection = db.session.connection()
+    repaired = 0
+    for mindmap_id, team_id in query.all():
+        if team_id is not None:
+            tree = load_mindmap_tree(mindmap_id)
+            result = compute_tree_progress(*tree)
+            stored = {node.id: node.progress for node in tree[0]}
+            rows = [
+                {'node_id': node_id, 'value': value}
+                for node_id, value in result['nodes'].items() if stored.get(node_id) != value
+            ]
+            if rows:
+                connection.execute(
+                    nodes.update().where(nodes.c.id == db.bindparam('node_id')).values(progress=db.bindparam('value')),
+                    rows
+                )
+                repaired += len(rows)
+                from mindmap_sync import bump_revisions
+                bump_revisions(connection, {mindmap_id: [row['node_id'] for row in rows]})
+        refresh_mindmap_totals([mindmap_id], connection=connection)
+
+    db.session.expire_all()
+    return repaired
+
+
+def register_mindmap_progress_listeners(session):
+    """
+    セッションに達成度の伝播用イベントリスナーを登録（1回のみ）
+    - 担当者数カウンター（team_task_counters）の更新後に実行されるよう、そちらより後に登録する
+    """
+    global _registered
+    if _registered:
+        return
+    event.listen(session, 'before_flush', _collect_changes)
+    event.listen(session, 'after_flush', _propagate_changes)
+    event.listen(session, 'after_flush_postexec', _expire_progress)
+    event.listen(session, 'after_rollback', _discard_pending)
+    _registered = True
@@ -0,0 +1,259 @@
+"""
+マインドマップの差分同期（リビジョン・削除記録・ETag）
+- ノードが変更されるたびにマップの revision を1増やし、変更されたノードにその値を記録する
+  - ノードの追加・更新・削除、達成度の伝播（mindmap_progress）、タスクカードのタスクの変更、
+    リンクしている個人タスクの完了状態の変更をセッションの flush で検知する
+  - 削除されたノードは mindmap_node_tombstones に記録する
+- 一覧 API は `?since=<revision>` で、そのリビジョンより後に変更・削除されたノードだけを返す
+- ETag はマップのリビジョンから作るため、変更が無い場合はノードを読まずに 304 を返せる
+- ORM を経由せずにノードを更新する処理では bump_revisions / touch_nodes を明示的に呼ぶ
+"""
+from datetime import datetime
+
+from sqlalchemy import event
+
+_PENDING_KEY = 'mindmap_sync_pending'
+_EXPIRE_KEY = 'mindmap_sync_expire'
+
+_registered = False
+
+
+def bump_revisions(connection, changed, deleted=()):
+    """
+    マップのリビジョンを進め、変更されたノードと削除記録に新しいリビジョンを設定
+    - changed: {mindmap_id: [node_id, ...]}
+    - deleted: [(mindmap_id, node_id), ...]
+    戻り値: {mindmap_id: 新しいリビジョン}（マップが削除済みの場合は含まない）
+    """
+    from models import Mindmap, MindmapNode, MindmapNodeTombstone, db
+
+    mindmaps = Mindmap.__table__
+    nodes = MindmapNode.__table__
+    tombstones = MindmapNodeTombstone.__table__
+
+    deleted_by_map = {}
+    for mindmap_id, node_id in deleted:
+        deleted_by_map.setdefault(mindmap_id, []).append(node_id)
+
+    revisions = {}
+    now = datetime.utcnow()
+    for mindmap_id in sorted(set(changed) | set(deleted_by_map)):
+        if mindmap_id is None:
+            continue
+        connection.execute(
+            mindmaps.update().where(mindmaps.c.id == mindmap_id).values(revision=mindmaps.c.revision + 1)
+        )
+        revision = connection.execute(
+            db.select(mindmaps.c.revision).where(mindmaps.c.id == mindmap_id)
+        ).scalar()
+        if revision is None:
+            continue
+        revisions[mindmap_id] = revision
+
+        node_ids = [node_id for node_id in changed.get(mindmap_id, ()) if node_id is not None]
+        if node_ids:
+            connection.execute(
+                nodes.update().where(nodes.c.id.in_(node_ids)).values(revision=revision)
+            )
+        deleted_ids = deleted_by_map.get(mindmap_id)
+        if deleted_ids:
+            connection.execute(tombstones.insert(), [
+                {'mindmap_id': mindmap_id, 'node_id': node_id, 'revision': revision, 'deleted_at': now}
+                for node_id in deleted_ids
+            ])
+    return revisions
+
+
+def touch_nodes(node_ids, connection=None):
+    """指定ノードを変更扱いにしてリビジョンを進める（ORM を経由しない更新の後に呼ぶ）"""
+    from models import MindmapNode, db
+
+    node_ids = [node_id for node_id in set(node_ids) if node_id is not None]
+    if not node_ids:
+        return {}
+    if connection is None:
+        connection = db.session.connection()
+
+    nodes = MindmapNode.__table__
+    changed = {}
+    for node_id, mindmap_id in connection.execute(
+        db.select(nodes.c.id, nodes.c.mindmap_id).where(nodes.c.id.in_(node_ids))
+    ):
+        changed.setdefault(mindmap_id, []).append(node_id)
+    return bump_revisions(connection, changed)
+
+
+def _collect_changes(session, flush_context, instances):
+    """flush 前に、リビジョンを進める必要のあるノード・削除されたノードを記録"""
+    from models import MindmapNode, Task
+    from sqlalchemy import inspect as sa_inspect
+
+    session.info.pop(_PENDING_KEY, None)
+    pending = {
+        'nodes': [],
+        'deleted': [],
+        'card_node_ids': set(),
+        'linked_task_ids': set()
+    }
+
+    for obj in session.new:
+        if isinstance(obj, MindmapNode):
+            pending['nodes'].append(obj)
+        elif isinstance(obj, Task):
+            pending['card_node_ids'].add(obj.task_card_node_id)
+
+    for obj in session.dirty:
+        if isinstance(obj, MindmapNode):
+            if session.is_modified(obj, include_collections=False):
+                pending['nodes'].append(obj)
+        elif isinstance(obj, Task):
+            state = sa_inspect(obj)
+            card_history = state.attrs.task_card_node_id.history
+            if (card_history.has_changes() or state.attrs.completed.history.has_changes()
+                    or state.attrs.archived.history.has_changes()):
+                pending['card_node_ids'].update(card_history.deleted)
+                pending['card_node_ids'].add(obj.task_card_node_id)
+            if state.attrs.completed.history.has_changes():
+                pending['linked_task_ids'].add(obj.id)
+
+    for obj in session.deleted:
+        values = sa_inspect(obj).dict
+        if isinstance(obj, MindmapNode):
+            pending['deleted'].append((values.get('mindmap_id'), obj.id))
+        elif isinstance(obj, Task):
+            pending['card_node_ids'].add(values.get('task_card_node_id'))
+            pending['linked_task_ids'].add(obj.id)
+
+    pending['card_node_ids'].discard(None)
+    pending['linked_task_ids'].discard(None)
+    if any(pending.values()):
+        session.info[_PENDING_KEY] = pending
+
+
+def _bump_changes(session, flush_context):
+    """flush 後に、同じトランザクション内でマップ・ノードのリビジョンを進める"""
+    from mindmap_progress import progress_updated_node_ids
+
+    pending = session.info.pop(_PENDING_KEY, None)
+    progress_node_ids = progress_updated_node_ids(session)
+    if not pending and not progress_node_ids:
+        return
+    pending = pending or {'nodes': [], 'deleted': [], 'card_node_ids': set(), 'linked_task_ids': set()}
+
+    from models import MindmapNode, db
+
+    nodes = MindmapNode.__table__
+    connection = session.connection()
+    deleted_ids = {node_id for _, node_id in pending['deleted']}
+
+    changed = {}
+    for obj in pending['nodes']:
+        if obj.id not in deleted_ids:
+            changed.setdefault(obj.mindmap_id, set()).add(obj.id)
+
+    lookup_ids = (set(pending['card_node_ids']) | progress_node_ids) - deleted_ids
+    if lookup_ids:
+        for node_id, mindmap_id in connection.execute(
+            db.select(nodes.c.id, nodes.c.mindmap_id).where(nodes.c.id.in_(list(lookup_ids)))
+        ):
+            changed.setdefault(mindmap_id, set()).add(node_id)
+    if pending['linked_task_ids']:
+        for node_id, mindmap_id in connection.execute(
+            db.select(nodes.c.id, nodes.c.mindmap_id).where(nodes.c.task_id.in_(list(pending['linked_task_ids'])))
+        ):
+            if node_id not in deleted_ids:
+                changed.setdefault(mindmap_id, set()).add(node_id)
+
+    revisions = bump_revisions(connection, changed, pending['deleted'])
+
+    expire = session.info.setdefault(_EXPIRE_KEY, {'nodes': set(), 'mindmaps': set()})
+    expire['mindmaps'].update(revisions)
+    for node_ids in changed.values():
+        expire['nodes'].update(node_ids)
+
+
+def _expire_revisions(session, flush_context):
+    """DB 側で更新したリビジョンを、読み込み済みのノード・マップから破棄"""
+    expire = session.info.pop(_EXPIRE_KEY, None)
+    if not expire:
+        return
+
+    from models import Mindmap, MindmapNode
+
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, MindmapNode) and obj.id in expire['nodes']:
+            session.expire(obj, ['revision'])
+        elif isinstance(obj, Mindmap) and obj.id in expire['mindmaps']:
+            session.expire(obj, ['revision'])
+
+
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_EXPIRE_KEY, None)
+
+
+def parse_since(value, revision):
+    """?since= の値を解釈（未指定・不正・現在より新しい値の場合は None＝全件）"""
+    if value is None or value == '':
+        return None
+    try:
+        since = int(value)
+    except (TypeError, ValueError):
+        return None
+    if since < 0 or since > revision:
+        return None
+    return since
+
+
+def get_deleted_node_ids(mindmap_id, since):
+    """since より後に削除されたノードID"""
+    from models import MindmapNodeTombstone, db
+
+    return [
+        row[0] for row in db.session.query(MindmapNodeTombstone.node_id).filter(
+            MindmapNodeTombstone.mindmap_id == mindmap_id,
+            MindmapNodeTombstone.revision > since
+        ).order_by(MindmapNodeTombstone.revision, MindmapNodeTombstone.id).all()
+    ]
+
+
+def mindmap_etag(mindmap):
+    """マップのリビジョンから ETag を作成"""
+    return f'mindmap-{mindmap.id}-{mindmap.revision}'
+
+
+def not_modified_response(etag):
+    """If-None-Match が一致する場合の 304 レスポンス（一致しない場合は None）"""
+    from flask import current_app, request
+
+    if not request.if_none_match.contains(etag):
+        return None
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def sync_response(payload, etag):
+    """一覧のレスポンスに ETag を付ける（ブラウザには毎回再検証させる）"""
+    from flask import jsonify
+
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def register_mindmap_sync_listeners(session):
+    """
+    セッションに差分同期用のイベントリスナーを登録（1回のみ）
+    - 達成度の伝播（mindmap_progress）で更新されたノードも対象にするため、そちらより後に登録する
+    """
+    global _registered
+    if _registered:
+        return
+    event.listen(session, 'before_flush', _collect_changes)
+    event.listen(session, 'after_flush', _bump_changes)
+    event.listen(session, 'after_flush_postexec', _expire_revisions)
+    event.listen(session, 'after_rollback', _discard_pending)
+    _registered = True
@@ -17,6 +17,7 @@ class User(UserMixin, db.Model):
     is_admin = db.Column(db.Boolean, default=False, nullable=False)  # 管理者フラグ
     display_name = db.Column(db.String(80), nullable=True)  # 表示名
     bio = db.Column(db.Text, nullable=True)  # 自己紹介
+    last_rollover_date = db.Column(db.Date, nullable=True)  # 日次処理を最後に実行した日付（日本時間）
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # リレーションシップ
@@ -65,6 +66,20 @@ class Task(db.Model):
     team_task_id = db.Column(db.Integer, db.ForeignKey('team_tasks.id'), nullable=True)  # チームタスクとの紐付け
     task_card_node_id = db.Column(db.Integer, db.ForeignKey('mindmap_nodes.id'), nullable=True, index=True)  # 個人タスクカードとの紐付け
     
+    # テンプレートからの自動生成関連（同じテンプレート・同じ日付のタスクは1件のみ）
+    template_id = db.Column(db.Integer, db.ForeignKey('task_templates.id', ondelete='SET NULL'), nullable=True, index=True)  # 生成元テンプレート
+    occurrence_date = db.Column(db.Date, nullable=True)  # 生成対象日
+    
+    __table_args__ = (
+        db.UniqueConstraint('template_id', 'occurrence_date', name='uq_tasks_template_occurrence'),
+        # 分類ごとの一覧をキーセット方式でページ送りするための複合インデックス
+        db.Index('ix_tasks_user_id_category_id', 'user_id', 'category', 'id'),
+        # チームタスクの一覧用（チームタスクに紐づく個人タスクのみの部分インデックス）
+        db.Index('ix_tasks_user_id_team_id', 'user_id', 'archived', 'id',
+                 sqlite_where=db.text('team_task_id IS NOT NULL'),
+                 postgresql_where=db.text('team_task_id IS NOT NULL')),
+    )
+    
     def __repr__(self):
         return f'<Task {self.title}>'
     
@@ -113,11 +128,16 @@ class UserPerformance(db.Model):
         return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
     
     @staticmethod
-    def update_daily_performance(user_id, date=None):
-        """日次パフォーマンスデータを更新"""
+    def update_daily_performance(user_id, date=None, rebuild_streak=False):
+        """日次パフォーマンスデータを更新（その日のタスクから全件再計算）"""
+        from datetime import timedelta
         if date is None:
             date = datetime.now(ZoneInfo('Asia/Tokyo')).date()
         
+        # 日付の比較は範囲条件で行う（func.date() ではインデックスが使えないため）
+        day_start = datetime.combine(date, datetime.min.time())
+        day_end = day_start + timedelta(days=1)
+        
         # 既存のレコードを取得または作成
         performance = UserPerformance.query.filter_by(
             user_id=user_id, 
@@ -132,29 +152,34 @@ class UserPerformance(db.Model):
         completed_today = Task.query.filter(
             Task.user_id == user_id,
             Task.completed == True,
-            Task.completed_at.isnot(None),
-            db.func.date(Task.completed_at) == date
+            Task.completed_at >= day_start,
+            Task.completed_at < day_end
         ).count()
         
         # その日のタスク作成数
         created_today = Task.query.filter(
             Task.user_id == user_id,
-            db.func.date(Task.created_at) == date
+            Task.created_at >= day_start,
+            Task.created_at < day_end
         ).count()
         
         # 完了率の計算
         completion_rate = (completed_today / created_today * 100) if created_today > 0 else 0
         
-        # 連続日数の計算
-        streak_days = UserPerformance.calculate_streak(user_id)
+        # 連続日数の計算（前日の streak_days を引き継ぐ。rebuild_streak の場合は履歴から再構築）
+        if rebuild_streak:
+            performance.tasks_completed = completed_today
+            streak_days = UserPerformance.rebuild_streak(user_id, date)
+        else:
+            streak_days = UserPerformance.calculate_streak(user_id, date, completed_count=completed_today)
         
         # その日の総作業時間を計算（完了済みタスクのみ）
         total_work_seconds = db.session.query(db.func.sum(Task.total_seconds)).filter(
             Task.user_id == user_id,
             Task.completed == True,
             Task.archived == False,
-            Task.completed_at.isnot(None),
-            db.func.date(Task.completed_at) == date
+            Task.completed_at >= day_start,
+            Task.completed_at < day_end
         ).scalar() or 0
         
         # データを更新
@@ -168,27 +193,190 @@ class UserPerformance(db.Model):
         return performance
     
     @staticmethod
-    def calculate_streak(user_id):
-        """連続完了日数を計算"""
+    def sync_daily_performance(user_id, date=None):
+        """
+        タスク変更後のパフォーマンス更新
+        - 増分モード（PERFORMANCE_INCREMENTAL）では flush 時に差分が反映済みのため何もしない
+        - それ以外は従来通り全件再計算する
+        """
+        from performance_tracker import is_incremental_enabled
+        if is_incremental_enabled():
+            return None
+        return UserPerformance.update_daily_performance(user_id, date=date)
+    
+    @staticmethod
+    def apply_delta(user_id, date, tasks_created=0, tasks_completed=0, total_work_seconds=0, connection=None):
+        """
+        指定日の UserPerformance に差分を加算（1回の UPSERT で実行）
+        - 行が無い場合は差分を初期値として作成する
+        - completion_rate は加算後の値から SQL 側で再計算する
+        """
+        table = UserPerformance.__table__
+        if connection is None:
+            connection = db.session.connection()
+        now = datetime.utcnow()
+        
+        new_created = table.c.tasks_created + tasks_created
+        new_completed = table.c.tasks_completed + tasks_completed
+        new_rate = db.case(
+            (new_created > 0, db.cast(new_completed, db.Float) * 100 / new_created),
+            else_=0.0
+        )
+        # 連続日数は前日の streak_days + 1（その日の完了が0件なら0）
         from datetime import timedelta
+        previous = table.alias('previous')
+        previous_streak = db.func.coalesce(
+            db.select(previous.c.streak_days).where(
+                previous.c.user_id == user_id,
+                previous.c.date == date - timedelta(days=1)
+            ).scalar_subquery(),
+            0
+        )
+        updates = {
+            'tasks_created': new_created,
+            'tasks_completed': new_completed,
+            'total_work_seconds': table.c.total_work_seconds + total_work_seconds,
+            'completion_rate': new_rate,
+            'streak_days': db.case((new_completed > 0, previous_streak + 1), else_=0),
+            'updated_at': now
+        }
+        initial = {
+            'user_id': user_id,
+            'date': date,
+            'tasks_created': tasks_created,
+            'tasks_completed': tasks_completed,
+            'total_work_seconds': total_work_seconds,
+            'completion_rate': (tasks_completed / tasks_created * 100) if tasks_created > 0 else 0.0,
+            'streak_days': previous_streak + 1 if tasks_completed > 0 else 0,
+            'created_at': now,
+            'updated_at': now
+        }
         
-        streak = 0
-        current_date = datetime.now().date()
+        dialect = connection.dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            if dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            stmt = dialect_insert(table).values(**initial).on_conflict_do_update(
+                index_elements=['user_id', 'date'],
+                set_=updates
+            )
+            connection.execute(stmt)
+        else:
+            result = connection.execute(
+                table.update()
+                .where(table.c.user_id == user_id, table.c.date == date)
+                .values(**updates)
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(**initial))
+    
+    @staticmethod
+    def calculate_streak(user_id, date=None, completed_count=None):
+        """
+        連続完了日数を計算（前日の streak_days を引き継ぐため1クエリで済む）
+        - その日の完了が0件なら0、それ以外は前日の連続日数 + 1
+        - completed_count を省略した場合はその日のレコードの tasks_completed を使う
+        """
+        from datetime import timedelta
+        if date is None:
+            date = datetime.now(ZoneInfo('Asia/Tokyo')).date()
         
-        while True:
-            # その日に完了したタスクがあるかチェック
-            has_completed = UserPerformance.query.filter_by(
+        if completed_count is None:
+            completed_count = db.session.query(UserPerformance.tasks_completed).filter_by(
                 user_id=user_id,
-                date=current_date
-            ).filter(UserPerformance.tasks_completed > 0).first()
-            
-            if has_completed:
-                streak += 1
-                current_date -= timedelta(days=1)
-            else:
-                break
+                date=date
+            ).scalar() or 0
+        if completed_count <= 0:
+            return 0
         
-        return streak
+        previous_streak = db.session.query(UserPerformance.streak_days).filter_by(
+            user_id=user_id,
+            date=date - timedelta(days=1)
+        ).scalar() or 0
+        return previous_streak + 1
+    
+    @staticmethod
+    def rebuild_streak(user_id, date=None):
+        """
+        連続完了日数を履歴から再構築（gaps-and-islands の1クエリ）
+        - 完了のある日について「日番号 - 行番号」が同じ値になる連続区間を求め、
+          指定日を含む区間の日数を返す
+        - 保存済みの streak_days が壊れている場合の補正用
+        """
+        if date is None:
+            date = datetime.now(ZoneInfo('Asia/Tokyo')).date()
+        
+        if db.session.get_bind().dialect.name == 'sqlite':
+            day_number = db.func.julianday(UserPerformance.date)
+        else:
+            from datetime import date as date_class
+            day_number = UserPerformance.date - db.literal(date_class(1970, 1, 1), db.Date)
+        
+        active_days = db.select(
+            UserPerformance.date.label('date'),
+            (day_number - db.func.row_number().over(order_by=UserPerformance.date)).label('island')
+        ).where(
+            UserPerformance.user_id == user_id,
+            UserPerformance.tasks_completed > 0,
+            UserPerformance.date <= date
+        ).cte('active_days')
+        
+        current_island = db.select(active_days.c.island).where(
+            active_days.c.date == date
+        ).scalar_subquery()
+        
+        return db.session.execute(
+            db.select(db.func.count()).select_from(active_days).where(
+                active_days.c.island == current_island
+            )
+        ).scalar() or 0
+    
+    @staticmethod
+    def close_day(user_id, date):
+        """
+        日付が変わったときに前日の連続日数を確定（1回の UPDATE）
+        - 日中に前々日の完了状態が変わった場合などのずれを前々日の値から補正する
+        """
+        from datetime import timedelta
+        table = UserPerformance.__table__
+        previous = table.alias('previous')
+        previous_streak = db.func.coalesce(
+            db.select(previous.c.streak_days).where(
+                previous.c.user_id == user_id,
+                previous.c.date == date - timedelta(days=1)
+            ).scalar_subquery(),
+            0
+        )
+        db.session.execute(
+            table.update()
+            .where(table.c.user_id == user_id, table.c.date == date)
+            .values(streak_days=db.case((table.c.tasks_completed > 0, previous_streak + 1), else_=0))
+        )
+
+
+class DailyTaskRollup(db.Model):
+    """日別タスク集計モデル（日次処理で確定した日の集計値、期間レポート用）"""
+    __tablename__ = 'daily_task_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    date = db.Column(db.Date, nullable=False, index=True)
+    tasks_created = db.Column(db.Integer, default=0, nullable=False)  # その日に作成されたタスク数
+    tasks_completed = db.Column(db.Integer, default=0, nullable=False)  # その日に完了したタスク数
+    tasks_archived = db.Column(db.Integer, default=0, nullable=False)  # archived_at がその日のタスク数
+    work_seconds = db.Column(db.Integer, default=0, nullable=False)  # その日に完了したタスクの作業時間（秒）
+    completed_high = db.Column(db.Integer, default=0, nullable=False)  # 優先度別の完了数
+    completed_medium = db.Column(db.Integer, default=0, nullable=False)
+    completed_low = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('user_id', 'date', name='uq_daily_task_rollups_user_date'),)
+    
+    def __repr__(self):
+        return f'<DailyTaskRollup {self.user_id} {self.date}>'
 
 
 class Team(db.Model):
@@ -222,6 +410,9 @@ class TeamMember(db.Model):
     # 複合インデックス（チームIDとユーザーIDの組み合わせでユニーク）
     __table_args__ = (db.UniqueConstraint('team_id', 'user_id', name='unique_team_user'),)
     
+    # リレーション（一覧表示で joinedload するため）
+    user = db.relationship('User', foreign_keys=[user_id])
+    
     def __repr__(self):
         return f'<TeamMember {self.team_id} {self.user_id}>'
 
@@ -247,6 +438,10 @@ class TeamTask(db.Model):
     # マインドマップノードとの関連（カードごとのタスク用）
     parent_node_id = db.Column(db.Integer, db.ForeignKey('mindmap_nodes.id'), nullable=True)
     
+    # 担当者数・完了済み担当者数（TaskAssignee の変更時に team_task_counters で同期）
+    assignee_count = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    completed_assignee_count = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    
     # リレーション
     assigned_user = db.relationship('User', foreign_keys=[assigned_to], backref='assigned_tasks')
     creator = db.relationship('User', foreign_keys=[created_by], backref='created_tasks')
@@ -255,13 +450,14 @@ class TeamTask(db.Model):
         return f'<TeamTask {self.title}>'
     
     def calculate_completion_rate(self):
-        """完了率を計算"""
-        from models import TaskAssignee
-        assignees = TaskAssignee.query.filter_by(team_task_id=self.id).all()
-        if not assignees:
+        """完了率を計算（担当者数・完了済み担当者数のカウンターから算出）"""
+        from team_task_counters import has_pending_assignee_changes
+        # 未反映の担当者の変更があれば、先に flush してカウンターに反映する
+        if has_pending_assignee_changes(db.session):
+            db.session.flush()
+        if not self.assignee_count:
             return 0
-        completed_count = sum(1 for a in assignees if a.completed)
-        return int(completed_count / len(assignees) * 100)
+        return int(self.completed_assignee_count / self.assignee_count * 100)
 
 
 class TaskAssignee(db.Model):
@@ -297,6 +493,14 @@ class Mindmap(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # 達成度（子ノードを持たないノードの件数・合計から mindmap_progress で更新）
+    progress = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    leaf_count = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    leaf_progress_sum = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    
+    # ノードの変更ごとに増えるリビジョン（差分取得・ETag 用、mindmap_sync で更新）
+    revision = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    
     # リレーション
     nodes = db.relationship('MindmapNode', backref='mindmap', lazy=True, cascade='all, delete-orphan')
     
@@ -304,22 +508,9 @@ class Mindmap(db.Model):
         return f'<Mindmap {self.name}>'
     
     def calculate_progress(self):
-        """マインドマップ全体の達成度を計算"""
-        all_nodes = self.nodes
-        if not all_nodes:
-            return 0
-        
-        total_weight = 0
-        completed_weight = 0
-        
-        for node in all_nodes:
-            # リーフノード（子ノードがない）のみカウント
-            if not node.children:
-                node_progress = node.calculate_progress()
-                total_weight += 1
-                completed_weight += node_progress / 100
-        
-        return int((completed_weight / total_weight * 100)) if total_weight > 0 else 0
+        """マインドマップ全体の達成度を再計算（子ノードを持たないノードの平均、保存値は progress）"""
+        from mindmap_progress import calculate_mindmap_progress
+        return calculate_mindmap_progress(self.id)['progress']
 
 
 class MindmapNode(db.Model):
@@ -351,6 +542,17 @@ class MindmapNode(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # 最後に変更されたときのマップのリビジョン（差分取得用、mindmap_sync で更新）
+    revision = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    
+    # ルートから自ノードまでのIDを並べた階層パス（例: '/1/5/12/'、子孫の検索用、mindmap_hierarchy で更新）
+    path = db.Column(db.String(1024), nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_mindmap_nodes_mindmap_id_revision', 'mindmap_id', 'revision'),
+        db.Index('ix_mindmap_nodes_mindmap_id_path', 'mindmap_id', 'path'),
+    )
+    
     # リレーション
     children = db.relationship('MindmapNode', backref=db.backref('parent', remote_side=[id]), lazy=True, cascade='all, delete-orphan')
     subtasks = db.relationship('TeamTask', primaryjoin='TeamTask.parent_node_id==MindmapNode.id', backref=db.backref('parent_node'), lazy=True, cascade='all, delete-orphan')
@@ -361,31 +563,30 @@ class MindmapNode(db.Model):
         return f'<MindmapNode {self.title}>'
     
     def calculate_progress(self):
-        """ノードの達成度を計算（再帰的）"""
-        # サブタスクがある場合は、サブタスクの完了率を計算
-        if self.subtasks:
-            total_progress = 0
-            for task in self.subtasks:
-                # 各タスクの完了率を計算（TaskAssigneeベース）
-                task_completion_rate = task.calculate_completion_rate()
-                total_progress += task_completion_rate
-            return int(total_progress / len(self.subtasks)) if self.subtasks else 0
-        
-        # タスクノードの場合
-        if self.is_task and hasattr(self, 'team_task_id') and self.team_task_id:
-            # チームタスクの完了率を計算
-            from models import TeamTask
-            team_task = TeamTask.query.get(self.team_task_id)
-            if team_task:
-                return team_task.calculate_completion_rate()
+        """
+        ノードの達成度を再計算（保存値は progress）
+        - マップ全体を mindmap_progress でまとめて計算し、このノードの値を返す
+        """
+        from mindmap_progress import calculate_mindmap_progress
+        if self.id is None or self.mindmap_id is None:
             return self.progress
-        
-        # 親ノードの場合、子ノードの平均を計算
-        if self.children:
-            total_progress = sum(child.calculate_progress() for child in self.children)
-            return int(total_progress / len(self.children)) if self.children else 0
-        
-        return self.progress
+        return calculate_mindmap_progress(self.mindmap_id)['nodes'].get(self.id, self.progress)
+
+
+class MindmapNodeTombstone(db.Model):
+    """削除されたマインドマップノードの記録（差分取得で削除を伝えるため）"""
+    __tablename__ = 'mindmap_node_tombstones'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    mindmap_id = db.Column(db.Integer, db.ForeignKey('mindmaps.id', ondelete='CASCADE'), nullable=False)
+    node_id = db.Column(db.Integer, nullable=False)
+    revision = db.Column(db.Integer, nullable=False)  # 削除されたときのマップのリビジョン
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.Index('ix_mindmap_node_tombstones_mindmap_id_revision', 'mindmap_id', 'revision'),)
+    
+    def __repr__(self):
+        return f'<MindmapNodeTombstone {self.mindmap_id} {self.node_id}>'
 
 
 class TaskTemplate(db.Model):
@@ -439,6 +640,10 @@ class Notification(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     related_team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=True)  # 関連チーム
     related_task_id = db.Column(db.Integer, nullable=True)  # 関連タスクID
+    related_team_task_id = db.Column(db.Integer, nullable=True)  # 関連チームタスクID（割り当て通知の重複判定用）
+    
+    # 未読数の COUNT 用複合インデックス
+    __table_args__ = (db.Index('ix_notifications_user_id_read', 'user_id', 'read'),)
     
     def __repr__(self):
         return f'<Notification {self.title}>'
@@ -0,0 +1,167 @@
+"""
+通知の一括作成（ファンアウト）
+- 複数の宛先への同じ内容の通知を、executemany の INSERT 1文でまとめて作成する
+- 同じ宛先・内容・関連チーム/タスクの通知が NOTIFICATION_COALESCE_SECONDS 秒以内に作成済みの場合は
+  作成しない（二重送信・連続した編集による重複を抑止する）
+  - 関連チームタスクの指定がある場合（担当者への割り当て通知）は、関連タスク（宛先ごとに新しく作成される
+    個人タスク）ではなくチームタスクで同じ通知かを判定する
+- NOTIFICATION_ASYNC が有効な場合は、リクエストのコミット後にバックグラウンドのワーカーで作成する
+  - ロールバックされたリクエストの通知は作成しない
+  - 作成はリクエストとは別のトランザクションになるため、通知の反映はコミットより少し遅れる
+- ORM を経由しないため、未読数キャッシュ（cache.unread_counter）にはコミット時に件数を明示的に加算する
+"""
+import queue
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+_PENDING_KEY = 'notification_fanout_pending'
+
+
+class NotificationFanout:
+    """通知の一括作成（同期／バックグラウンドのワーカー）"""
+
+    def __init__(self, coalesce_seconds=60, async_enabled=False):
+        self.coalesce_seconds = coalesce_seconds
+        self.async_enabled = async_enabled
+        self.app = None
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._listeners_registered = False
+
+    def init_app(self, app):
+        """アプリの設定を読み込み、コミット後にワーカーへ渡すためのリスナーを登録"""
+        from models import db
+
+        self.app = app
+        self.coalesce_seconds = app.config.get('NOTIFICATION_COALESCE_SECONDS', self.coalesce_seconds)
+        self.async_enabled = app.config.get('NOTIFICATION_ASYNC', self.async_enabled)
+
+        if not self._listeners_registered:
+            event.listen(db.session, 'after_commit', self._enqueue_committed)
+            event.listen(db.session, 'after_rollback', _discard_pending)
+            self._listeners_registered = True
+
+        app.extensions['notification_fanout'] = self
+
+    def notify(self, recipients, title, message, notification_type='info', related_team_id=None,
+               related_team_task_id=None):
+        """
+        recipients の各宛先に通知を作成
+        - recipients: [(user_id, related_task_id), ...]（関連タスクが無い場合は None）
+        - related_team_task_id: 関連チームタスク（指定した場合は重複の判定に related_task_id の代わりに使う）
+        - 同期の場合は現在のトランザクションで作成する（commit は呼び出し元で行う）
+        - 非同期の場合は現在のトランザクションのコミット後にワーカーで作成する
+        戻り値: 作成した（非同期の場合は作成を予約した）件数
+        """
+        from models import db
+
+        seen = set()
+        rows = []
+        for user_id, related_task_id in recipients:
+            if user_id is None or (user_id, related_task_id) in seen:
+                continue
+            seen.add((user_id, related_task_id))
+            rows.append({
+                'user_id': user_id,
+                'title': title,
+                'message': message,
+                'notification_type': notification_type,
+                'related_team_id': related_team_id,
+                'related_task_id': related_task_id,
+                'related_team_task_id': related_team_task_id
+            })
+        if not rows:
+            return 0
+
+        if self.async_enabled and self.app is not None:
+            db.session.info.setdefault(_PENDING_KEY, []).append(rows)
+            return len(rows)
+        return self._deliver(db.session, rows)
+
+    def _deliver(self, session, rows):
+        """重複を除いた通知を INSERT 1文で作成し、未読数の差分をコミット時に反映するよう登録"""
+        from models import Notification, db
+        from cache import adjust_unread_on_commit
+
+        notifications = Notification.__table__
+        connection = session.connection()
+        now = datetime.utcnow()
+
+        # 期間内に作成済みの同じ通知（宛先の絞り込みは user_id のインデックスを使う）
+        # 1回の notify の行は関連チームタスクが共通のため、先頭の行で判定に使う列を決める
+        if self.coalesce_seconds:
+            first = rows[0]
+            key_name = 'related_team_task_id' if first['related_team_task_id'] is not None else 'related_task_id'
+            existing = {
+                tuple(row)
+                for row in connection.execute(
+                    db.select(notifications.c.user_id, notifications.c.related_team_id,
+                              notifications.c[key_name]).where(
+                        notifications.c.user_id.in_({row['user_id'] for row in rows}),
+                        notifications.c.title == first['title'],
+                        notifications.c.message == first['message'],
+                        notifications.c.created_at >= now - timedelta(seconds=self.coalesce_seconds)
+                    )
+                )
+            }
+            rows = [
+                row for row in rows
+                if (row['user_id'], row['related_team_id'], row[key_name]) not in existing
+            ]
+            if not rows:
+                return 0
+
+        connection.execute(notifications.insert(), [dict(row, read=False, created_at=now) for row in rows])
+
+        counts = {}
+        for row in rows:
+            counts[row['user_id']] = counts.get(row['user_id'], 0) + 1
+        adjust_unread_on_commit(session, counts)
+        return len(rows)
+
+    def _enqueue_committed(self, session):
+        batches = session.info.pop(_PENDING_KEY, None)
+        if not batches:
+            return
+        for rows in batches:
+            self._queue.put(rows)
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._run, name='atd-notification-fanout', daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        from models import db
+
+        while True:
+            rows = self._queue.get()
+            try:
+                with self.app.app_context():
+                    try:
+                        count = self._deliver(db.session, rows)
+                        db.session.commit()
+                        if count != len(rows):
+                            print(f"[DEBUG] Notification fan-out coalesced: {count}/{len(rows)} rows delivered")
+                    except Exception as e:
+                        db.session.rollback()
+                        print(f"[ERROR] Notification fan-out error: {e}")
+            finally:
+                self._queue.task_done()
+
+    def wait(self):
+        """ワーカーに渡した通知がすべて作成されるまで待つ（CLI・動作確認用）"""
+        self._queue.join()
+
+
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+notification_fanout = NotificationFanout()
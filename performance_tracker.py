@@ -0,0 +1,167 @@
+"""
+UserPerformance の増分更新（イベント駆動）
+- タスクの作成・完了・未完了・削除・計測停止をセッションの flush で検知し、
+  該当日の UserPerformance に差分だけを加算する
+- 設定 PERFORMANCE_INCREMENTAL が有効な場合のみ動作する
+- 集計のずれは `flask atd reconcile-performance` で全件再計算して補正する
+"""
+from datetime import datetime
+
+from sqlalchemy import event, select
+
+# db.session.info にこのキーが True で入っている間は差分を記録しない（データインポートなど）
+PAUSE_KEY = 'performance_tracking_paused'
+_PENDING_KEY = 'performance_pending_deltas'
+
+_registered = False
+
+
+def is_incremental_enabled():
+    """増分モードが有効か（アプリケーションコンテキスト外では無効扱い）"""
+    from flask import current_app, has_app_context
+    return has_app_context() and bool(current_app.config.get('PERFORMANCE_INCREMENTAL'))
+
+
+def _contribution(user_id, created_at, completed, completed_at, archived, total_seconds):
+    """
+    1件のタスクが UserPerformance に与える寄与を返す
+    {(user_id, date): [tasks_created, tasks_completed, total_work_seconds]}
+    集計条件は UserPerformance.update_daily_performance と同じ
+    """
+    result = {}
+    if user_id is None:
+        return result
+
+    created_date = (created_at or datetime.utcnow()).date()
+    result.setdefault((user_id, created_date), [0, 0, 0])[0] += 1
+
+    if completed and completed_at:
+        entry = result.setdefault((user_id, completed_at.date()), [0, 0, 0])
+        entry[1] += 1
+        if not archived:
+            entry[2] += total_seconds or 0
+
+    return result
+
+
+def _merge(deltas, contribution, sign):
+    for key, values in contribution.items():
+        entry = deltas.setdefault(key, [0, 0, 0])
+        for i, value in enumerate(values):
+            entry[i] += sign * value
+
+
+def _collect_deltas(session, flush_context, instances):
+    """flush 前の状態と flush 後の状態の差分を計算して session.info に保持"""
+    from models import Task
+    from sqlalchemy import inspect as sa_inspect
+
+    session.info.pop(_PENDING_KEY, None)
+    if session.info.get(PAUSE_KEY) or not is_incremental_enabled():
+        return
+
+    tracked = ('user_id', 'created_at', 'completed', 'completed_at', 'archived', 'total_seconds')
+    deltas = {}
+
+    # 新規タスク
+    for obj in session.new:
+        if isinstance(obj, Task):
+            _merge(deltas, _contribution(*(getattr(obj, name) for name in tracked)), 1)
+
+    # 変更・削除されたタスク（変更前の値はDBから1回のクエリでまとめて取得）
+    changed = {}
+    for obj in session.dirty:
+        if isinstance(obj, Task) and obj.id is not None:
+            state = sa_inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in tracked):
+                changed[obj.id] = obj
+    deleted = {obj.id: obj for obj in session.deleted if isinstance(obj, Task) and obj.id is not None}
+
+    ids = list(changed) + list(deleted)
+    if ids:
+        columns = [getattr(Task, name) for name in tracked]
+        rows = session.execute(select(Task.id, *columns).where(Task.id.in_(ids))).all()
+        for row in rows:
+            _merge(deltas, _contribution(*row[1:]), -1)
+            if row[0] in changed:
+                obj = changed[row[0]]
+                _merge(deltas, _contribution(*(getattr(obj, name) for name in tracked)), 1)
+
+    deltas = {key: values for key, values in deltas.items() if any(values)}
+    if deltas:
+        session.info[_PENDING_KEY] = deltas
+
+
+def _apply_deltas(session, flush_context):
+    """flush 後に、同じトランザクション内で差分を UserPerformance に反映"""
+    deltas = session.info.pop(_PENDING_KEY, None)
+    if not deltas:
+        return
+
+    from models import UserPerformance
+    connection = session.connection()
+    for (user_id, day), (created, completed, work_seconds) in deltas.items():
+        UserPerformance.apply_delta(
+            user_id, day,
+            tasks_created=created,
+            tasks_completed=completed,
+            total_work_seconds=work_seconds,
+            connection=connection
+        )
+
+
+def _apply_task_rows(before_rows, after_rows, connection):
+    from models import UserPerformance, db
+
+    if not is_incremental_enabled() or db.session.info.get(PAUSE_KEY):
+        return
+    deltas = {}
+    for row in before_rows:
+        _merge(deltas, _contribution(*row), -1)
+    for row in after_rows:
+        _merge(deltas, _contribution(*row), 1)
+    if connection is None:
+        connection = db.session.connection()
+    for (user_id, day), (created, completed, work_seconds) in deltas.items():
+        if any((created, completed, work_seconds)):
+            UserPerformance.apply_delta(
+                user_id, day,
+                tasks_created=created,
+                tasks_completed=completed,
+                total_work_seconds=work_seconds,
+                connection=connection
+            )
+
+
+def apply_deleted_tasks(rows, connection=None):
+    """
+    ORM を経由せずに削除したタスクの寄与を UserPerformance から差し引く（増分モードのみ）
+    - rows: [(user_id, created_at, completed, completed_at, archived, total_seconds), ...]（削除前の値）
+    """
+    _apply_task_rows(rows, (), connection)
+
+
+def apply_created_tasks(rows, connection=None):
+    """
+    ORM を経由せずに作成したタスクの寄与を UserPerformance に加算（増分モードのみ）
+    - rows: apply_deleted_tasks と同じ形式（作成時の値）
+    """
+    _apply_task_rows((), rows, connection)
+
+
+def apply_archived_tasks(rows, connection=None):
+    """
+    ORM を経由せずにアーカイブしたタスクの作業時間を UserPerformance から差し引く（増分モードのみ）
+    - rows: apply_deleted_tasks と同じ形式（アーカイブ前の値）
+    """
+    _apply_task_rows(rows, [tuple(row[:4]) + (True,) + tuple(row[5:]) for row in rows], connection)
+
+
+def register_performance_listeners(session):
+    """セッションに増分更新用のイベントリスナーを登録（1回のみ）"""
+    global _registered
+    if _registered:
+        return
+    event.listen(session, 'before_flush', _collect_deltas)
+    event.listen(session, 'after_flush', _apply_deltas)
+    _registered = True
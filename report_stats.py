@@ -0,0 +1,309 @@
+"""
+日別のタスク統計（作成数・完了数・作業時間）を期間指定で集計するモジュール
+- 作成日・完了日それぞれで GROUP BY した結果を UNION ALL でまとめ、1クエリで取得する
+- 期間内でタスクが無い日も 0 で埋めた系列を返す
+- 確定済みの日（昨日以前）は daily_task_rollups の集計値を使い、tasks を走査しない
+  （集計行が無い日だけ tasks から集計する）
+"""
+from datetime import date, datetime, timedelta
+
+
+def _to_date(value):
+    """func.date() の結果を date に変換（SQLite では文字列で返るため）"""
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def get_daily_series(user_id, start_date, end_date, include_archived=True):
+    """
+    start_date〜end_date の日別統計を返す
+    戻り値: [{'date', 'total', 'completed', 'completion_rate', 'work_seconds'}, ...]（日付順・0埋め）
+    - total: その日に作成されたタスク数
+    - completed: その日に完了したタスク数（completed_at、無い場合は updated_at の日付）
+    - work_seconds: その日に完了したタスクの累計作業時間
+    """
+    from models import Task, db
+
+    range_start = datetime.combine(start_date, datetime.min.time())
+    range_end = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+
+    base_filters = [Task.user_id == user_id]
+    if not include_archived:
+        base_filters.append(Task.archived == False)
+
+    completed_on = db.func.coalesce(Task.completed_at, Task.updated_at)
+
+    created = db.select(
+        db.func.date(Task.created_at).label('day'),
+        db.func.count(Task.id).label('created'),
+        db.literal(0).label('completed'),
+        db.literal(0).label('work_seconds')
+    ).where(
+        *base_filters,
+        Task.created_at >= range_start,
+        Task.created_at < range_end
+    ).group_by(db.func.date(Task.created_at))
+
+    completed = db.select(
+        db.func.date(completed_on).label('day'),
+        db.literal(0).label('created'),
+        db.func.count(Task.id).label('completed'),
+        db.func.coalesce(db.func.sum(Task.total_seconds), 0).label('work_seconds')
+    ).where(
+        *base_filters,
+        Task.completed == True,
+        completed_on >= range_start,
+        completed_on < range_end
+    ).group_by(db.func.date(completed_on))
+
+    rows = db.session.execute(db.union_all(created, completed)).all()
+
+    by_date = {}
+    for day, created_count, completed_count, work_seconds in rows:
+        entry = by_date.setdefault(_to_date(day), [0, 0, 0])
+        entry[0] += created_count or 0
+        entry[1] += completed_count or 0
+        entry[2] += int(work_seconds or 0)
+
+    series = []
+    current_date = start_date
+    while current_date <= end_date:
+        created_count, completed_count, work_seconds = by_date.get(current_date, (0, 0, 0))
+        completion_rate = (completed_count / created_count * 100) if created_count > 0 else 0
+        series.append({
+            'date': current_date,
+            'total': created_count,
+            'completed': completed_count,
+            'completion_rate': round(completion_rate, 1),
+            'work_seconds': work_seconds
+        })
+        current_date += timedelta(days=1)
+
+    return series
+
+
+def average_completion_rate(series):
+    """日別完了率の平均"""
+    return sum(stat['completion_rate'] for stat in series) / len(series) if series else 0
+
+
+def _empty_stat(current_date):
+    return {
+        'date': current_date,
+        'total': 0,
+        'completed': 0,
+        'completion_rate': 0,
+        'work_seconds': 0
+    }
+
+
+def refresh_daily_rollups(start_date, end_date, user_ids=None):
+    """
+    start_date〜end_date の日別集計を tasks から再計算して daily_task_rollups に保存
+    - 作成・完了（優先度別）・アーカイブを UNION ALL の1クエリで集計する
+    - 対象期間の既存行は削除してから一括 INSERT する（0件になった日の行を残さないため）
+    - 活動の無い日も 0 の行を保存する（行の無い日を「未集計」として扱えるようにするため）
+    戻り値: 保存した行数
+    """
+    from models import Task, DailyTaskRollup, User, db
+
+    range_start = datetime.combine(start_date, datetime.min.time())
+    range_end = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+    user_filters = [Task.user_id.in_(user_ids)] if user_ids is not None else []
+    completed_on = db.func.coalesce(Task.completed_at, Task.updated_at)
+    zero = db.literal(0)
+
+    def priority_count(priority):
+        return db.func.sum(db.case((Task.priority == priority, 1), else_=0))
+
+    created = db.select(
+        Task.user_id, db.func.date(Task.created_at).label('day'),
+        db.func.count(Task.id).label('created'), zero.label('completed'), zero.label('archived'),
+        zero.label('work_seconds'), zero.label('high'), zero.label('medium'), zero.label('low')
+    ).where(
+        *user_filters,
+        Task.created_at >= range_start,
+        Task.created_at < range_end
+    ).group_by(Task.user_id, db.func.date(Task.created_at))
+
+    completed = db.select(
+        Task.user_id, db.func.date(completed_on).label('day'),
+        zero.label('created'), db.func.count(Task.id).label('completed'), zero.label('archived'),
+        db.func.coalesce(db.func.sum(Task.total_seconds), 0).label('work_seconds'),
+        priority_count('high').label('high'), priority_count('medium').label('medium'), priority_count('low').label('low')
+    ).where(
+        *user_filters,
+        Task.completed == True,
+        completed_on >= range_start,
+        completed_on < range_end
+    ).group_by(Task.user_id, db.func.date(completed_on))
+
+    archived = db.select(
+        Task.user_id, Task.archived_at.label('day'),
+        zero.label('created'), zero.label('completed'), db.func.count(Task.id).label('archived'),
+        zero.label('work_seconds'), zero.label('high'), zero.label('medium'), zero.label('low')
+    ).where(
+        *user_filters,
+        Task.archived == True,
+        Task.archived_at >= start_date,
+        Task.archived_at <= end_date
+    ).group_by(Task.user_id, Task.archived_at)
+
+    totals = {}
+    for row in db.session.execute(db.union_all(created, completed, archived)).all():
+        user_id, day = row[0], _to_date(row[1])
+        entry = totals.setdefault((user_id, day), [0] * 7)
+        for i, value in enumerate(row[2:]):
+            entry[i] += int(value or 0)
+
+    delete_query = DailyTaskRollup.query.filter(
+        DailyTaskRollup.date >= start_date,
+        DailyTaskRollup.date <= end_date
+    )
+    if user_ids is not None:
+        delete_query = delete_query.filter(DailyTaskRollup.user_id.in_(user_ids))
+    delete_query.delete(synchronize_session=False)
+
+    if user_ids is None:
+        user_ids = [row[0] for row in db.session.query(User.id).all()]
+
+    now = datetime.utcnow()
+    days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+    rows = []
+    for user_id in user_ids:
+        for day in days:
+            values = totals.get((user_id, day)) or [0] * 7
+            rows.append({
+                'user_id': user_id,
+                'date': day,
+                'tasks_created': values[0],
+                'tasks_completed': values[1],
+                'tasks_archived': values[2],
+                'work_seconds': values[3],
+                'completed_high': values[4],
+                'completed_medium': values[5],
+                'completed_low': values[6],
+                'created_at': now,
+                'updated_at': now
+            })
+    if rows:
+        db.session.execute(db.insert(DailyTaskRollup), rows)
+
+    return len(rows)
+
+
+def earliest_task_date(user_ids=None):
+    """タスクの最初の作成日（タスクが無い場合は None）"""
+    from models import Task, db
+
+    query = db.session.query(db.func.min(Task.created_at))
+    if user_ids is not None:
+        query = query.filter(Task.user_id.in_(user_ids))
+    first_created = query.scalar()
+    return first_created.date() if first_created is not None else None
+
+
+def rebuild_user_rollups(user_ids, today=None):
+    """
+    指定ユーザーの日別集計を、最初のタスクの作成日から昨日まで作り直す（commit は呼び出し元で行う）
+    - データのインポートなど、過去のタスクをまとめて入れ替えた後に呼ぶ
+    戻り値: 保存した行数
+    """
+    from zoneinfo import ZoneInfo
+
+    user_ids = list(user_ids)
+    if not user_ids:
+        return 0
+    if today is None:
+        today = datetime.now(ZoneInfo('Asia/Tokyo')).date()
+    start_date = earliest_task_date(user_ids)
+    if start_date is None or start_date >= today:
+        return 0
+    return refresh_daily_rollups(start_date, today - timedelta(days=1), user_ids=user_ids)
+
+
+def _rollup_stat(rollup):
+    stat = _empty_stat(rollup.date)
+    stat['total'] = rollup.tasks_created
+    stat['completed'] = rollup.tasks_completed
+    stat['work_seconds'] = rollup.work_seconds
+    if rollup.tasks_created > 0:
+        stat['completion_rate'] = round(rollup.tasks_completed / rollup.tasks_created * 100, 1)
+    return stat
+
+
+def _load_rollup_stats(user_id, start_date, end_date):
+    """daily_task_rollups の日別統計 {date: stat}（1クエリ、行がある日のみ）"""
+    from models import DailyTaskRollup
+
+    rollups = DailyTaskRollup.query.filter(
+        DailyTaskRollup.user_id == user_id,
+        DailyTaskRollup.date >= start_date,
+        DailyTaskRollup.date <= end_date
+    ).all()
+    return {rollup.date: _rollup_stat(rollup) for rollup in rollups}
+
+
+def get_rollup_series(user_id, start_date, end_date):
+    """daily_task_rollups から日別統計を取得（1クエリ、行が無い日は0）"""
+    by_date = _load_rollup_stats(user_id, start_date, end_date)
+
+    series = []
+    current_date = start_date
+    while current_date <= end_date:
+        series.append(by_date.get(current_date) or _empty_stat(current_date))
+        current_date += timedelta(days=1)
+
+    return series
+
+
+def get_report_series(user_id, start_date, end_date, today=None):
+    """
+    レポート用の日別統計（最大2クエリ）
+    - 昨日以前（日次処理で確定済み）は daily_task_rollups から取得
+    - 今日以降はまだ確定していないため tasks から集計する
+    - 昨日以前でも集計行が無い日（集計の作成前・日次処理の停止中の日など）は tasks から集計する
+      （活動の無い日も集計時に 0 の行を保存するため、行が無いのは未集計の日だけ）
+      行の無い最初の日から最後の日まで（今日以降を含む場合は終了日まで）を1クエリで集計する
+    """
+    from zoneinfo import ZoneInfo
+
+    if today is None:
+        today = datetime.now(ZoneInfo('Asia/Tokyo')).date()
+
+    closed_end = min(end_date, today - timedelta(days=1))
+    rollups = _load_rollup_stats(user_id, start_date, closed_end) if start_date <= closed_end else {}
+
+    missing_dates = [
+        start_date + timedelta(days=offset)
+        for offset in range((closed_end - start_date).days + 1)
+        if start_date + timedelta(days=offset) not in rollups
+    ]
+    live = {}
+    if missing_dates or end_date >= today:
+        live_start = missing_dates[0] if missing_dates else max(start_date, today)
+        live_end = end_date if end_date >= today else missing_dates[-1]
+        live = {stat['date']: stat for stat in get_daily_series(user_id, live_start, live_end)}
+
+    series = []
+    current_date = start_date
+    while current_date <= end_date:
+        stat = rollups.get(current_date) if current_date < today else None
+        series.append(stat or live.get(current_date) or _empty_stat(current_date))
+        current_date += timedelta(days=1)
+    return series
+
+
+def summarize_series(series):
+    """日別統計の合計（期間全体の作成数・完了数・完了率・作業時間）"""
+    total = sum(stat['total'] for stat in series)
+    completed = sum(stat['completed'] for stat in series)
+    completion_rate = (completed / total * 100) if total > 0 else 0
+    return {
+        'date': series[0]['date'] if series else None,
+        'total': total,
+        'completed': completed,
+        'completion_rate': round(completion_rate, 1),
+        'work_seconds': sum(stat['work_seconds'] for stat in series)
+    }
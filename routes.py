@@ -1,22 +1,10 @@
-def _update_task_card_progress(node_id):
-    """カードに紐づくタスクの完了率を再計算"""
-    from models import MindmapNode, Task
-    node = MindmapNode.query.get(node_id)
-    if not node:
-        return
-    card_tasks = Task.query.filter_by(task_card_node_id=node.id, archived=False).all()
-    if card_tasks:
-        progress = int(sum(1 for task in card_tasks if task.completed) / len(card_tasks) * 100)
-    else:
-        progress = 0
-    if node.progress != progress:
-        node.progress = progress
-        db.session.add(node)
 from flask import Blueprint, render_template, redirect, url_for, flash, jsonify, request
 from flask_login import current_user, login_required
 from datetime import datetime, timedelta, date
 from zoneinfo import ZoneInfo
 from models import db
+from mindmap_progress import update_task_card_progress
+from sqlalchemy.orm import contains_eager, joinedload, selectinload
 
 # ブループリントを作成
 main = Blueprint('main', __name__)
@@ -28,6 +16,19 @@ def _is_mobile_user_agent():
     return any(keyword in ua for keyword in mobile_keywords)
 
 
+@main.before_app_request
+def run_pending_daily_rollover():
+    """その日の最初のリクエストで、未実行の日次処理（日付切り替え・タスク繰り越し）を実行"""
+    if request.endpoint == 'static' or not current_user.is_authenticated:
+        return
+    try:
+        from daily_processor import ensure_daily_rollover
+        ensure_daily_rollover(current_user)
+    except Exception as e:
+        db.session.rollback()
+        print(f"[ERROR] Daily rollover error: {e}")
+
+
 @main.before_app_request
 def redirect_mobile_users():
     if request.method != 'GET':
@@ -82,7 +83,7 @@ def index():
 @login_required
 def dashboard():
     """ダッシュボード"""
-    from models import Task, db, UserPerformance
+    from models import Task, db
     from datetime import datetime, timedelta
     
     # 日付を取得（現在時刻から取得）
@@ -93,123 +94,15 @@ def dashboard():
     # デバッグ: 現在の日時を出力
     print(f"[DEBUG] Dashboard accessed at: {current_time}, Date: {today}")
     
-    # 日次の自動処理（日付切り替え・タスク繰り越し）- 日付が変わった時のみ実行
-    # 昨日のUserPerformanceレコードが存在し、今日のレコードが存在しない場合 = 日付が変わった
-    get_daily_statistics = None
-    try:
-        from daily_processor import process_daily_rollover, get_daily_statistics
-        # 日次処理はprocess_daily_rollover内で日付変更をチェックして実行
-        result = process_daily_rollover(current_user.id)
-        print(f"[DEBUG] Daily rollover result: {result}")
-    except Exception as e:
-        # 日次処理エラーはログに記録
-        print(f"[ERROR] Daily rollover error: {e}")
-        import traceback
-        traceback.print_exc()
-        # get_daily_statisticsがNoneの場合は、後でエラーが発生しないようにする
-        if 'get_daily_statistics' not in locals():
-            get_daily_statistics = None
-    
-    # パフォーマンスデータを更新（日次処理の後）
-    UserPerformance.update_daily_performance(current_user.id, date=today)
-    
-    # 本日のタスクを取得（優先順位順）
-    # category='today'のタスクをすべて取得（昨日の未完了タスクも含む）
-    today_tasks_all = Task.query.filter_by(
-        user_id=current_user.id,
-        category='today',
-        archived=False
-    ).order_by(Task.order_index).all()
-    today_tasks = []
-    for task in today_tasks_all:
-        if task.completed and task.completed_at and task.completed_at.date() < today:
-            continue
-        today_tasks.append(task)
-
-    # 完了済みタスク数（当日分のみ）
-    completed_tasks = sum(1 for task in today_tasks if task.completed)
-
-    # 総タスク数（当日表示対象）
-    total_tasks = len(today_tasks)
-    
-    # 進捗率（パーセンテージ）
-    progress_percentage = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
-    
-    # 今日のパフォーマンスデータを取得（今日の日付を使用）
-    today_performance = UserPerformance.query.filter_by(
-        user_id=current_user.id,
-        date=today
-    ).first()
+    # 日次の自動処理（日付切り替え・タスク繰り越し）は run_daily_rollover_batch が
+    # 0時に全ユーザー分まとめて実行する（flask atd rollover / スケジューラー）
+    # バッチが動いていない場合は、その日の最初のリクエストで run_pending_daily_rollover が実行する
+    # ダッシュボードでは処理済みの状態を読み込むだけ
+    from dashboard_service import get_user_snapshot
     
-    # 過去7日間のパフォーマンスデータ
-    end_date = today
-    start_date = end_date - timedelta(days=6)
-    
-    performance_data = UserPerformance.query.filter(
-        UserPerformance.user_id == current_user.id,
-        UserPerformance.date >= start_date,
-        UserPerformance.date <= end_date
-    ).order_by(UserPerformance.date).all()
-    
-    # 過去7日間のデータを準備
-    daily_completion_data = []
-    labels = []
-    
-    for i in range(7):
-        date = start_date + timedelta(days=i)
-        labels.append(date.strftime('%m/%d'))
-        
-        # パフォーマンスデータから完了数を取得
-        perf_data = next((p for p in performance_data if p.date == date), None)
-        daily_completion_data.append(perf_data.tasks_completed if perf_data else 0)
-    
-    # 優先度別タスク数
-    priority_data = {
-        'high': Task.query.filter_by(user_id=current_user.id, priority='high', archived=False).count(),
-        'medium': Task.query.filter_by(user_id=current_user.id, priority='medium', archived=False).count(),
-        'low': Task.query.filter_by(user_id=current_user.id, priority='low', archived=False).count()
-    }
-    
-    # 分類別タスク数
-    category_data = {
-        'today': Task.query.filter_by(user_id=current_user.id, category='today', archived=False).count(),
-        'tomorrow': Task.query.filter_by(user_id=current_user.id, category='tomorrow', archived=False).count(),
-        'other': Task.query.filter_by(user_id=current_user.id, category='other', archived=False).count()
-    }
-    
-    # 過去7日間の詳細統計
-    try:
-        if get_daily_statistics and callable(get_daily_statistics):
-            daily_stats = get_daily_statistics(current_user.id, days=7)
-        else:
-            daily_stats = []
-    except Exception as e:
-        print(f"get_daily_statistics error: {e}")
-        daily_stats = []
-    
-    # 今日の統計
-    today_stats = daily_stats[-1] if daily_stats else {
-        'total': 0,
-        'completed': 0,
-        'completion_rate': 0
-    }
-    
-    # 今日の総作業時間を計算（完了済みタスクのみ）
-    today_total_seconds = sum(task.total_seconds for task in today_tasks if task.completed and not task.archived)
-    
-    # タスク別の作業時間データ（時間帯別ではなく完了タスク別）
-    task_time_data = []
-    for task in today_tasks:
-        if task.completed and not task.archived and task.total_seconds > 0:
-            # タイトルが長すぎる場合は切り詰める（30文字まで）
-            title = task.title[:30] + '...' if len(task.title) > 30 else task.title
-            # 変な文字が含まれている可能性があるので、改行や特殊文字を除去
-            title = title.replace('\n', ' ').replace('\r', ' ').strip()
-            task_time_data.append({
-                'title': title,
-                'total_seconds': task.total_seconds,
-                'formatted_time': task.format_time()
-            })
+    # 本日のタスク・進捗率・優先度別/分類別タスク数・過去7日間の推移などの集計
+    # （ユーザー単位のスナップショットキャッシュから取得、タスク更新時に破棄される）
+    snapshot = get_user_snapshot(current_user.id, today)
     
     # 過去のタスクを取得（URLパラメータから日付を取得）
     selected_date_str = request.args.get('past_date')
@@ -229,20 +122,20 @@ def dashboard():
             pass
     
     return render_template('dashboard.html', 
-                         today_tasks=today_tasks,
-                         completed_tasks=completed_tasks,
-                         total_tasks=total_tasks,
-                         progress_percentage=progress_percentage,
-                         today_total_seconds=today_total_seconds,
-                         task_time_data=task_time_data,
-                         daily_completion_data=daily_completion_data,
-                         labels=labels,
-                         priority_data=priority_data,
-                         category_data=category_data,
-                         today_performance=today_performance,
-                         streak_days=today_performance.streak_days if today_performance else 0,
-                         daily_stats=daily_stats,
-                         today_stats=today_stats,
+                         today_tasks=snapshot['today_tasks'],
+                         completed_tasks=snapshot['completed_tasks'],
+                         total_tasks=snapshot['total_tasks'],
+                         progress_percentage=snapshot['progress_percentage'],
+                         today_total_seconds=snapshot['today_total_seconds'],
+                         task_time_data=snapshot['task_time_data'],
+                         daily_completion_data=snapshot['daily_completion_data'],
+                         labels=snapshot['labels'],
+                         priority_data=snapshot['priority_data'],
+                         category_data=snapshot['category_data'],
+                         today_performance=snapshot['today_stats'],
+                         streak_days=snapshot['streak_days'],
+                         daily_stats=snapshot['daily_stats'],
+                         today_stats=snapshot['today_daily_stats'],
                          past_tasks=past_tasks,
                          selected_date=selected_date)
 
@@ -256,32 +149,14 @@ def mobile_index():
 @main.route('/mobile/home')
 @login_required
 def mobile_home():
-    from models import Task, UserPerformance, TeamMember, TeamTask
+    from models import TeamMember, TeamTask
+    from dashboard_service import get_user_snapshot
 
     now = datetime.now(ZoneInfo('Asia/Tokyo'))
     today = now.date()
 
-    UserPerformance.update_daily_performance(current_user.id, date=today)
-
-    today_tasks_all = Task.query.filter_by(
-        user_id=current_user.id,
-        category='today',
-        archived=False
-    ).order_by(Task.order_index).all()
-    today_tasks = []
-    for task in today_tasks_all:
-        if task.completed and task.completed_at and task.completed_at.date() < today:
-            continue
-        today_tasks.append(task)
-
-    completed_tasks = sum(1 for task in today_tasks if task.completed)
-    total_tasks = len(today_tasks)
-    progress_percentage = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
-
-    today_stats = UserPerformance.query.filter_by(
-        user_id=current_user.id,
-        date=today
-    ).first()
+    # 本日のタスク・進捗率・今日のパフォーマンス（ユーザー単位のスナップショットキャッシュ）
+    snapshot = get_user_snapshot(current_user.id, today)
 
     memberships = TeamMember.query.filter_by(user_id=current_user.id).all()
     team_ids = [membership.team_id for membership in memberships if membership.team_id]
@@ -299,11 +174,11 @@ def mobile_home():
         team_progress = 0
 
     return render_template('mobile/home.html',
-                           today_tasks=today_tasks,
-                           progress_percentage=progress_percentage,
-                           completed_tasks=completed_tasks,
-                           total_tasks=total_tasks,
-                           today_stats=today_stats,
+                           today_tasks=snapshot['today_tasks'],
+                           progress_percentage=snapshot['progress_percentage'],
+                           completed_tasks=snapshot['completed_tasks'],
+                           total_tasks=snapshot['total_tasks'],
+                           today_stats=snapshot['today_stats'],
                            team_progress=team_progress,
                            team_member_count=team_member_count)
 
@@ -344,7 +219,7 @@ def mobile_tasks():
 @main.route('/mobile/team')
 @login_required
 def mobile_team():
-    from models import Team, TeamMember, TeamTask, TaskAssignee, User
+    from models import Team, TeamMember, TeamTask, TaskAssignee
 
     memberships = TeamMember.query.filter_by(user_id=current_user.id).all()
     team_ids = [membership.team_id for membership in memberships if membership.team_id]
@@ -353,26 +228,30 @@ def mobile_team():
     active_team_tasks = []
 
     if team_ids:
+        # チームごとのタスク数・メンバー数はチーム数に関係なく一括集計
+        from team_stats import get_team_stats
         teams = Team.query.filter(Team.id.in_(team_ids)).all()
+        team_stats = get_team_stats([team.id for team in teams], current_user.id)
         for team in teams:
-            members = TeamMember.query.filter_by(team_id=team.id).count()
-            total_tasks = TeamTask.query.filter_by(team_id=team.id).count()
-            completed_tasks = TeamTask.query.filter_by(team_id=team.id, completed=True).count()
-            progress = int(completed_tasks / total_tasks * 100) if total_tasks else 0
+            stats = team_stats[team.id]
             team_overview.append({
                 'name': team.name,
-                'members': members,
-                'total_tasks': total_tasks,
-                'completed_tasks': completed_tasks,
-                'progress': progress
+                'members': stats['member_count'],
+                'total_tasks': stats['total'],
+                'completed_tasks': stats['completed'],
+                'progress': int(stats['completion_rate'])
             })
 
-        team_tasks = TeamTask.query.filter(TeamTask.team_id.in_(team_ids)).order_by(TeamTask.due_date.asc(), TeamTask.created_at.desc()).all()
+        # 担当者・ユーザーはまとめて読み込む（タスク数に関係なくクエリ数は一定）
+        team_tasks = TeamTask.query.options(
+            selectinload(TeamTask.assignees_rel).joinedload(TaskAssignee.user)
+        ).filter(
+            TeamTask.team_id.in_(team_ids)
+        ).order_by(TeamTask.due_date.asc(), TeamTask.created_at.desc()).all()
         for task in team_tasks:
-            assignees = TaskAssignee.query.filter_by(team_task_id=task.id).all()
             assignee_names = []
-            for assignee in assignees:
-                user = User.query.get(assignee.user_id)
+            for assignee in sorted(task.assignees_rel, key=lambda a: a.id):
+                user = assignee.user
                 if user:
                     assignee_names.append(user.display_name or user.username)
             active_team_tasks.append({
@@ -413,7 +292,7 @@ def mobile_team_mindmap():
                     node_summaries.append({
                         'id': node.id,
                         'title': node.title,
-                        'progress': node.calculate_progress(),
+                        'progress': node.progress,
                         'children_count': len(node.children),
                         'is_task': node.is_task,
                         'due_date': node.due_date
@@ -472,11 +351,9 @@ def notifications():
     from models import Notification
     from datetime import datetime
     
-    # 未読通知数を取得
-    unread_count = Notification.query.filter_by(
-        user_id=current_user.id,
-        read=False
-    ).count()
+    # 未読通知数を取得（キャッシュ）
+    from cache import unread_counter
+    unread_count = unread_counter.get(current_user.id)
     
     # 通知一覧を取得（新しい順）
     all_notifications = Notification.query.filter_by(
@@ -505,6 +382,24 @@ def mark_notification_read(notification_id):
     
     return jsonify({'success': True})
 
+@main.route('/notifications/read-all', methods=['POST'])
+@login_required
+def mark_all_notifications_read():
+    """未読の通知をすべて既読にする"""
+    from models import Notification
+    from cache import unread_counter
+    
+    updated = Notification.query.filter_by(
+        user_id=current_user.id,
+        read=False
+    ).update({Notification.read: True}, synchronize_session=False)
+    db.session.commit()
+    
+    # 一括 UPDATE は ORM のイベントを通らないため未読数を直接0にする
+    unread_counter.reset(current_user.id, 0)
+    
+    return jsonify({'success': True, 'updated': updated})
+
 @main.route('/task-templates')
 @login_required
 def task_templates():
@@ -590,7 +485,7 @@ def generate_task_from_template(template_id):
     
     # パフォーマンスデータを更新
     from models import UserPerformance
-    UserPerformance.update_daily_performance(current_user.id)
+    UserPerformance.sync_daily_performance(current_user.id)
     
     flash(f'テンプレートからタスクを作成しました', 'success')
     return redirect(url_for('tasks.list_tasks'))
@@ -729,7 +624,7 @@ def daily_report():
     """日報レポート"""
     from models import Task, UserPerformance
     from datetime import datetime, timedelta
-    from daily_processor import get_daily_statistics
+    from report_stats import get_report_series, summarize_series, average_completion_rate
     
     # 今日の日付
     today = datetime.now(ZoneInfo('Asia/Tokyo')).date()
@@ -768,188 +663,63 @@ def daily_report():
         period_days = 1
     
     # 報告日（または期間）のタスク統計を取得
+    # 日別の作成数・完了数は確定済みの日は daily_task_rollups、今日は tasks の GROUP BY から取得（0埋め済み）
     if report_mode == 'single':
-        # 単一日付の場合、その日の統計を取得
-        # SQLite互換性のため、Python側でフィルタリング
-        all_tasks = Task.query.filter(
+        # 単一日付の場合、報告日から過去30日間の日別統計を取得（週間は直近7日分）
+        monthly_stats = get_report_series(
+            current_user.id, report_date - timedelta(days=29), report_date, today=today
+        )
+        weekly_stats = monthly_stats[-7:]
+        today_stats = monthly_stats[-1]
+        
+        # その日に作成されたタスク一覧を取得
+        day_start = datetime.combine(report_date, datetime.min.time())
+        today_tasks_list = Task.query.filter(
             Task.user_id == current_user.id,
-            Task.archived == False
+            Task.archived == False,
+            Task.created_at >= day_start,
+            Task.created_at < day_start + timedelta(days=1)
         ).all()
         
-        # その日に作成されたタスク数
-        total_on_date = 0
-        completed_on_date = 0
-        
-        for task in all_tasks:
-            if task.created_at:
-                created_date = task.created_at.date()
-                if created_date == report_date:
-                    total_on_date += 1
-                    
-                if task.completed and task.updated_at:
-                    updated_date = task.updated_at.date()
-                    if updated_date == report_date:
-                        completed_on_date += 1
-        
-        completion_rate = (completed_on_date / total_on_date * 100) if total_on_date > 0 else 0
-        
-        today_stats = {
-            'date': report_date,
-            'total': total_on_date,
-            'completed': completed_on_date,
-            'completion_rate': round(completion_rate, 1)
-        }
-        
-        # その日のタスク一覧を取得
-        today_tasks_list = []
-        for task in all_tasks:
-            if task.created_at:
-                created_date = task.created_at.date()
-                if created_date == report_date:
-                    today_tasks_list.append(task)
-        
         # その日の総作業時間を計算
         today_total_seconds = sum(
             task.total_seconds for task in today_tasks_list 
             if task.completed and not task.archived
         )
         
-        # 週間統計は過去7日間（報告日から）
-        weekly_stats = []
-        for i in range(7):
-            check_date = report_date - timedelta(days=6-i)
-            total_count = 0
-            completed_count = 0
-            
-            for task in all_tasks:
-                if task.created_at:
-                    created_date = task.created_at.date()
-                    if created_date == check_date:
-                        total_count += 1
-                    if task.completed and task.updated_at:
-                        updated_date = task.updated_at.date()
-                        if updated_date == check_date:
-                            completed_count += 1
-            
-            rate = (completed_count / total_count * 100) if total_count > 0 else 0
-            weekly_stats.append({
-                'date': check_date,
-                'total': total_count,
-                'completed': completed_count,
-                'completion_rate': round(rate, 1)
-            })
-        
-        avg_completion = sum(s['completion_rate'] for s in weekly_stats) / len(weekly_stats) if weekly_stats else 0
-        
-        # 月間統計は過去30日間（報告日から）
-        monthly_stats = []
-        for i in range(30):
-            check_date = report_date - timedelta(days=29-i)
-            total_count = 0
-            completed_count = 0
-            
-            for task in all_tasks:
-                if task.created_at:
-                    created_date = task.created_at.date()
-                    if created_date == check_date:
-                        total_count += 1
-                    if task.completed and task.updated_at:
-                        updated_date = task.updated_at.date()
-                        if updated_date == check_date:
-                            completed_count += 1
-            
-            rate = (completed_count / total_count * 100) if total_count > 0 else 0
-            monthly_stats.append({
-                'date': check_date,
-                'total': total_count,
-                'completed': completed_count,
-                'completion_rate': round(rate, 1)
-            })
-        
-        monthly_avg_completion = sum(s['completion_rate'] for s in monthly_stats) / len(monthly_stats) if monthly_stats else 0
+        avg_completion = average_completion_rate(weekly_stats)
+        monthly_avg_completion = average_completion_rate(monthly_stats)
         
     elif report_mode == 'period':
-        # 期間モードの場合、期間内の統計を集計
-        all_tasks = Task.query.filter(
-            Task.user_id == current_user.id,
-            Task.archived == False
-        ).all()
-        
-        # 期間内のタスクを集計
-        period_tasks = []
-        period_total = 0
-        period_completed = 0
-        period_total_seconds = 0
-        
-        for task in all_tasks:
-            if task.created_at:
-                created_date = task.created_at.date()
-                if start_date <= created_date <= end_date:
-                    period_tasks.append(task)
-                    period_total += 1
-                    if task.completed and task.updated_at:
-                        updated_date = task.updated_at.date()
-                        if start_date <= updated_date <= end_date:
-                            period_completed += 1
-                            period_total_seconds += task.total_seconds
-        
-        period_completion_rate = (period_completed / period_total * 100) if period_total > 0 else 0
+        # 期間内の日次統計を生成（日別集計の合計で期間全体を集計するため、期間の長さに関係なくタスクを走査しない）
+        weekly_stats = get_report_series(current_user.id, start_date, end_date, today=today)
+        period_summary = summarize_series(weekly_stats)
         
         today_stats = {
             'date': start_date,
-            'total': period_total,
-            'completed': period_completed,
-            'completion_rate': round(period_completion_rate, 1)
+            'total': period_summary['total'],
+            'completed': period_summary['completed'],
+            'completion_rate': period_summary['completion_rate']
         }
+        today_total_seconds = period_summary['work_seconds']
         
-        today_tasks_list = period_tasks
-        today_total_seconds = period_total_seconds
-        
-        # 期間内の日次統計を生成
-        weekly_stats = []
-        for i in range(period_days):
-            check_date = start_date + timedelta(days=i)
-            if check_date > end_date:
-                break
-                
-            total_count = 0
-            completed_count = 0
-            
-            for task in all_tasks:
-                if task.created_at:
-                    created_date = task.created_at.date()
-                    if created_date == check_date:
-                        total_count += 1
-                    if task.completed and task.updated_at:
-                        updated_date = task.updated_at.date()
-                        if updated_date == check_date:
-                            completed_count += 1
-            
-            rate = (completed_count / total_count * 100) if total_count > 0 else 0
-            weekly_stats.append({
-                'date': check_date,
-                'total': total_count,
-                'completed': completed_count,
-                'completion_rate': round(rate, 1)
-            })
+        # 期間内に作成されたタスク一覧（表示用）
+        today_tasks_list = Task.query.filter(
+            Task.user_id == current_user.id,
+            Task.archived == False,
+            Task.created_at >= datetime.combine(start_date, datetime.min.time()),
+            Task.created_at < datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+        ).all()
         
-        avg_completion = sum(s['completion_rate'] for s in weekly_stats) / len(weekly_stats) if weekly_stats else 0
+        avg_completion = average_completion_rate(weekly_stats)
         monthly_stats = weekly_stats  # 期間内の統計をそのまま使用
         monthly_avg_completion = avg_completion
         
     else:
-        # デフォルト（今日）の場合
-        today_stats = get_daily_statistics(current_user.id, days=1)[0] if get_daily_statistics(current_user.id, days=1) else {
-            'total': 0,
-            'completed': 0,
-            'completion_rate': 0
-        }
-        
-        # 過去7日間の統計
-        weekly_stats = get_daily_statistics(current_user.id, days=7)
-        
-        # 過去30日間の統計（月間平均用）
-        monthly_stats = get_daily_statistics(current_user.id, days=30)
+        # デフォルト（今日）の場合、過去30日間の日別統計を取得（週間は直近7日分）
+        monthly_stats = get_report_series(current_user.id, today - timedelta(days=29), today, today=today)
+        weekly_stats = monthly_stats[-7:]
+        today_stats = monthly_stats[-1]
         
         # 今日のタスク一覧
         today_tasks_list = Task.query.filter(
@@ -959,10 +729,10 @@ def daily_report():
         ).order_by(Task.priority.desc(), Task.order_index).all()
         
         # 完了率の平均
-        avg_completion = sum(s['completion_rate'] for s in weekly_stats) / len(weekly_stats) if weekly_stats else 0
+        avg_completion = average_completion_rate(weekly_stats)
         
         # 月間平均完了率
-        monthly_avg_completion = sum(s['completion_rate'] for s in monthly_stats) / len(monthly_stats) if monthly_stats else 0
+        monthly_avg_completion = average_completion_rate(monthly_stats)
         
         # 今日の総作業時間を計算（完了済みタスクのみ）
         today_total_seconds = sum(task.total_seconds for task in today_tasks_list if task.completed and not task.archived)
@@ -1002,7 +772,7 @@ def daily_report():
 @login_required
 def team_management():
     """チーム管理"""
-    from models import Team, TeamMember, TeamTask, Task, User
+    from models import Team, TeamMember
     from datetime import datetime, date
     
     # 期間パラメータの取得（デフォルトは今日）
@@ -1033,73 +803,27 @@ def team_management():
         TeamMember.user_id == current_user.id
     ).all()
     
-    # チームのタスク数とメンバー数を取得（期間フィルタなし）
-    team_stats = {}
-    for team in user_teams:
-        # 全チームタスクを取得（期間フィルタなし）
-        all_team_tasks = TeamTask.query.filter(
-            TeamTask.team_id == team.id
-        ).all()
-        
-        total_tasks = len(all_team_tasks)
-        completed_tasks = sum(1 for task in all_team_tasks if task.completed)
-        
-        # メンバー数と管理者権限をチェック
-        member_count = TeamMember.query.filter_by(team_id=team.id).count()
-        user_membership = TeamMember.query.filter_by(
-            team_id=team.id, 
-            user_id=current_user.id
-        ).first()
-        
-        # チーム管理者かシステム管理者かをチェック
-        is_team_admin = user_membership and user_membership.role == 'admin'
-        is_system_admin = current_user.is_admin
-        
-        team_stats[team.id] = {
-            'total': total_tasks,
-            'completed': completed_tasks,
-            'completion_rate': (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0,
-            'member_count': member_count,
-            'is_admin': is_team_admin or is_system_admin
-        }
+    # チームのタスク数・メンバー数・権限をチーム数に関係なく一括で取得（期間フィルタなし）
+    from team_stats import get_team_stats, summarize_team_stats, get_member_task_breakdown
+    team_stats = get_team_stats(
+        [team.id for team in user_teams],
+        current_user.id,
+        is_system_admin=current_user.is_admin
+    )
     
     # チーム全体の統計（期間フィルタなし）
-    # チームタスク（TeamTask）を集計：チームから割り当てられたタスク＋割り当てられていないが存在するタスク
-    all_team_ids = [team.id for team in user_teams]
-    
-    # 全チームタスクを取得（期間フィルタなし）
-    all_team_tasks = TeamTask.query.filter(
-        TeamTask.team_id.in_(all_team_ids)
-    ).all() if all_team_ids else []
-    
-    # 統計を計算（期間フィルタなし）
-    overall_total_tasks = len(all_team_tasks)
-    overall_completed_tasks = sum(1 for task in all_team_tasks if task.completed)
-    overall_progress = (overall_completed_tasks / overall_total_tasks * 100) if overall_total_tasks > 0 else 0
+    overall = summarize_team_stats(team_stats)
+    overall_total_tasks = overall['total']
+    overall_completed_tasks = overall['completed']
+    overall_progress = overall['completion_rate']
     total_teams = len(user_teams)
     
-    # チームメンバー全体：選択したチームのメンバーの個人タスクの統計を計算（期間フィルタなし）
-    # 選択したチームのメンバーの個人タスク（Task）を集計
+    # チームメンバー全体：選択したチームのメンバーの個人タスク（archived=Falseのみ）の統計
     if selected_team_id:
-        # 選択したチームのメンバーを取得
-        team_members = TeamMember.query.filter_by(team_id=selected_team_id).all()
-        member_ids = [member.user_id for member in team_members]
-        
-        if member_ids:
-            # 選択したチームのメンバーの個人タスクを取得（archived=Falseのみ、期間フィルタなし）
-            all_personal_tasks = Task.query.filter(
-                Task.user_id.in_(member_ids),
-                Task.archived == False
-            ).all()
-            
-            # 統計を計算
-            personal_total_tasks = len(all_personal_tasks)
-            personal_completed_tasks = sum(1 for task in all_personal_tasks if task.completed)
-            personal_progress_percentage = (personal_completed_tasks / personal_total_tasks * 100) if personal_total_tasks > 0 else 0
-        else:
-            personal_total_tasks = 0
-            personal_completed_tasks = 0
-            personal_progress_percentage = 0
+        breakdown = get_member_task_breakdown(selected_team_id)
+        personal_total_tasks = breakdown['total']
+        personal_completed_tasks = breakdown['completed']
+        personal_progress_percentage = breakdown['completion_rate']
     else:
         # チームが選択されていない場合は0
         personal_total_tasks = 0
@@ -1288,7 +1012,7 @@ def remove_team_member(team_id, user_id):
 @login_required
 def get_team_members(team_id):
     """チームメンバー一覧を取得（API）"""
-    from models import Team, TeamMember, User, Task
+    from models import Team, TeamMember
     
     # チームの存在確認とアクセス権限チェック
     team = Team.query.get_or_404(team_id)
@@ -1300,26 +1024,25 @@ def get_team_members(team_id):
     if not membership:
         return jsonify({'success': False, 'message': 'このチームにアクセスする権限がありません'}), 403
     
-    # メンバー一覧を取得
-    members = TeamMember.query.filter_by(team_id=team_id).all()
+    # メンバー一覧（ユーザーも同時に取得）と、メンバー別の個人タスク数（1クエリで集計）
+    from team_stats import get_member_rollup
+    members = TeamMember.query.options(joinedload(TeamMember.user)).filter_by(team_id=team_id).all()
+    rollup = get_member_rollup(team_id)
     member_data = []
     
     for member in members:
-        user = User.query.get(member.user_id)
+        user = member.user
         if user:
             # 個人タスクの統計
-            personal_tasks = Task.query.filter_by(user_id=user.id, archived=False).all()
-            total_personal = len(personal_tasks)
-            completed_personal = sum(1 for t in personal_tasks if t.completed)
-            completion_rate = (completed_personal / total_personal * 100) if total_personal > 0 else 0
+            stats = rollup.get(user.id, {'personal_total': 0, 'personal_rate': 0})
             
             member_data.append({
                 'user_id': user.id,
                 'username': user.username,
                 'display_name': user.display_name if hasattr(user, 'display_name') else None,
                 'role': member.role,
-                'total_tasks': total_personal,
-                'completion_rate': round(completion_rate, 1)
+                'total_tasks': stats['personal_total'],
+                'completion_rate': round(stats['personal_rate'], 1)
             })
     
     return jsonify({'success': True, 'members': member_data})
@@ -1328,8 +1051,8 @@ def get_team_members(team_id):
 @login_required
 def member_detail(user_id):
     """メンバー詳細ページ"""
-    from models import User, Task, TeamMember, Team, TeamTask, MindmapNode
-    from datetime import datetime
+    from models import User, Team
+    from member_tasks import PAGE_SIZE, can_view_member_tasks, get_member_task_page, get_member_task_summary
     
     # 対象ユーザーを取得
     target_user = User.query.get_or_404(user_id)
@@ -1337,58 +1060,79 @@ def member_detail(user_id):
     # チームIDを取得（クエリパラメータから）
     team_id = request.args.get('team_id', type=int)
     
-    # チームメンバーかどうかチェック（team_idがある場合）
+    # チームメンバーかどうかチェック（team_idがある場合は対象ユーザーもそのチームのメンバーであること）
     if team_id:
         team = Team.query.get_or_404(team_id)
-        membership = TeamMember.query.filter_by(
-            team_id=team_id, 
-            user_id=current_user.id
-        ).first()
-        
-        if not membership:
+        if not can_view_member_tasks(current_user.id, user_id, team_id):
             flash('このチームにアクセスする権限がありません', 'error')
             return redirect(url_for('main.team_management'))
         
         team_name = team.name
     else:
+        # 指定が無い場合は本人か、同じチームのメンバーのみ
+        if not can_view_member_tasks(current_user.id, user_id):
+            flash('このメンバーのタスクを表示する権限がありません', 'error')
+            return redirect(url_for('main.team_management'))
         team_name = None
     
-    # 個人タスクを取得
-    all_tasks = Task.query.filter_by(user_id=user_id, archived=False).all()
-    
-    # 分類別にタスクを整理
-    today_tasks = [t for t in all_tasks if t.category == 'today']
-    tomorrow_tasks = [t for t in all_tasks if t.category == 'tomorrow']
-    other_tasks = [t for t in all_tasks if t.category == 'other']
+    # 件数・完了率（分類別の件数も含めて1クエリで集計）
+    summary = get_member_task_summary(user_id)
     
-    # 完了率の計算
-    total_tasks = len(all_tasks)
-    completed_tasks = sum(1 for t in all_tasks if t.completed)
-    completion_rate = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
-    
-    # チームタスクを取得（該当チームから割り当てられたタスク）
-    team_tasks = []
+    # 分類ごとに最初の PAGE_SIZE 件だけ取得（続きは member_tasks_page で取得）
+    sections = {}
+    section_names = ['today', 'tomorrow', 'other']
+    # チームタスク（該当チームから割り当てられたタスク）はチーム指定時のみ表示
     if team_id:
-        team_task_ids = []
-        for task in all_tasks:
-            if task.title.startswith('【'):
-                team_task_ids.append(task.id)
-        
-        team_tasks = [t for t in all_tasks if t.id in team_task_ids]
-    
-    # マインドマップノードを取得
-    # TODO: マインドマップの実装に応じて追加
+        section_names.insert(0, 'team')
+    for section in section_names:
+        tasks, next_cursor = get_member_task_page(user_id, section)
+        sections[section] = {
+            'tasks': tasks,
+            'count': summary['sections'][section],
+            'next_cursor': next_cursor
+        }
     
     return render_template('member_detail.html',
                          target_user=target_user,
+                         team_id=team_id,
                          team_name=team_name,
-                         today_tasks=today_tasks,
-                         tomorrow_tasks=tomorrow_tasks,
-                         other_tasks=other_tasks,
-                         team_tasks=team_tasks,
-                         total_tasks=total_tasks,
-                         completed_tasks=completed_tasks,
-                         completion_rate=completion_rate)
+                         sections=sections,
+                         page_size=PAGE_SIZE,
+                         total_tasks=summary['total'],
+                         completed_tasks=summary['completed'],
+                         completion_rate=summary['completion_rate'])
+
+@main.route('/member/<int:user_id>/tasks')
+@login_required
+def member_tasks_page(user_id):
+    """メンバー詳細のタスク一覧の続きを取得（API）"""
+    from models import User, Team
+    from member_tasks import SECTIONS, can_view_member_tasks, get_member_task_page, serialize_member_task
+    
+    User.query.get_or_404(user_id)
+    
+    # チーム指定時は自分と対象ユーザーの両方がそのチームのメンバー、指定が無い場合は本人か同じチームのメンバーのみ
+    team_id = request.args.get('team_id', type=int)
+    if team_id:
+        Team.query.get_or_404(team_id)
+        if not can_view_member_tasks(current_user.id, user_id, team_id):
+            return jsonify({'success': False, 'message': 'このチームにアクセスする権限がありません'}), 403
+    elif not can_view_member_tasks(current_user.id, user_id):
+        return jsonify({'success': False, 'message': 'このメンバーのタスクを表示する権限がありません'}), 403
+    
+    section = request.args.get('section')
+    if section not in SECTIONS:
+        return jsonify({'success': False, 'message': '分類の指定が正しくありません'}), 400
+    
+    after_id = request.args.get('after', type=int)
+    tasks, next_cursor = get_member_task_page(user_id, section, after_id=after_id)
+    
+    return jsonify({
+        'success': True,
+        'section': section,
+        'tasks': [serialize_member_task(task) for task in tasks],
+        'next_cursor': next_cursor
+    })
 
 @main.route('/team/<int:team_id>/add-member', methods=['GET', 'POST'])
 @login_required
@@ -1539,32 +1283,44 @@ def team_tasks():
                 flash('指定されたユーザーはこのチームのメンバーではありません', 'error')
                 return redirect(url_for('main.team_tasks', team_id=team_id))
             
-            # TaskAssigneeからそのユーザーに割り当てられたチームタスクを取得
-            task_assignees = TaskAssignee.query.filter_by(user_id=user_id).all()
+            # そのユーザーに割り当てられた、このチームのチームタスクをノードと一緒に取得
+            task_assignees = TaskAssignee.query.join(
+                TeamTask, TaskAssignee.team_task_id == TeamTask.id
+            ).options(
+                contains_eager(TaskAssignee.team_task).joinedload(TeamTask.parent_node)
+            ).filter(
+                TaskAssignee.user_id == user_id,
+                TeamTask.team_id == team_id
+            ).order_by(TaskAssignee.id).all()
+            
+            # 対応する個人タスクは1クエリでまとめて取得
+            team_task_ids = [task_assignee.team_task_id for task_assignee in task_assignees]
+            personal_tasks = {}
+            if team_task_ids:
+                for personal_task in Task.query.filter(
+                    Task.team_task_id.in_(team_task_ids),
+                    Task.user_id == user_id
+                ).order_by(Task.id).all():
+                    personal_tasks.setdefault(personal_task.team_task_id, personal_task)
             
-            # チームタスクから対応する個人タスクを取得
             for task_assignee in task_assignees:
-                team_task = TeamTask.query.get(task_assignee.team_task_id)
-                if team_task and team_task.team_id == team_id:
-                    personal_task = Task.query.filter_by(
-                        team_task_id=team_task.id,
-                        user_id=user_id
-                    ).first()
-                    assigned_tasks.append({
-                        'team_task': team_task,
-                        'personal_task': personal_task,
-                        'node': team_task.parent_node  # マップカード（ノード）情報
-                    })
+                team_task = task_assignee.team_task
+                assigned_tasks.append({
+                    'team_task': team_task,
+                    'personal_task': personal_tasks.get(team_task.id),
+                    'node': team_task.parent_node  # マップカード（ノード）情報
+                })
     
-    # チームの全メンバーを取得
+    # チームの全メンバーを取得（ユーザーも同じクエリで読み込む）
     team_members = []
     if selected_team:
-        members = TeamMember.query.filter_by(team_id=selected_team.id).all()
+        members = TeamMember.query.options(
+            joinedload(TeamMember.user)
+        ).filter_by(team_id=selected_team.id).all()
         for member in members:
-            user = User.query.get(member.user_id)
-            if user:
+            if member.user:
                 team_members.append({
-                    'user': user,
+                    'user': member.user,
                     'role': member.role
                 })
     
@@ -1593,13 +1349,14 @@ def profile():
         flash('プロフィールを更新しました', 'success')
         return redirect(url_for('main.profile'))
     
-    # タスク統計を取得
-    from models import Task
-    completed_count = Task.query.filter_by(user_id=current_user.id, completed=True, archived=False).count()
-    in_progress_count = Task.query.filter_by(user_id=current_user.id, completed=False, archived=False).count()
+    # タスク統計を取得（ユーザー単位のスナップショットキャッシュ）
+    from dashboard_service import get_user_snapshot
+    snapshot = get_user_snapshot(current_user.id, datetime.now(ZoneInfo('Asia/Tokyo')).date())
+    completed_count = snapshot['completed_count']
+    in_progress_count = snapshot['in_progress_count']
     
     # 完了率を計算
-    total_tasks = Task.query.filter_by(user_id=current_user.id, archived=False).count()
+    total_tasks = snapshot['total_count']
     completion_rate = (completed_count / total_tasks * 100) if total_tasks > 0 else 0
     
     return render_template('profile.html',
@@ -1661,11 +1418,22 @@ def admin():
                          total_teams=total_teams,
                          active_users=active_users)
 
+@main.route('/admin/cache-stats')
+@login_required
+def admin_cache_stats():
+    """集計スナップショットキャッシュのヒット・ミス数（管理者のみ）"""
+    from cache import snapshot_cache
+    
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': '管理者権限が必要です'}), 403
+    
+    return jsonify({'success': True, 'snapshot_cache': snapshot_cache.stats()})
+
 @main.route('/team-dashboard/<int:team_id>')
 @login_required
 def team_dashboard(team_id):
     """チームダッシュボード"""
-    from models import Team, TeamMember, TeamTask, User, Task
+    from models import Team, TeamMember, TeamTask, User
     from datetime import datetime, date, timedelta
     
     # チームの存在確認とアクセス権限チェック
@@ -1711,11 +1479,7 @@ def team_dashboard(team_id):
     ).order_by(TeamTask.order_index).all()
     
     # 期間内のチームタスクの完了済みタスク数
-    completed_tasks = team_tasks_query.filter(
-        db.func.date(TeamTask.created_at) >= start_date,
-        db.func.date(TeamTask.created_at) <= end_date,
-        TeamTask.completed == True
-    ).count()
+    completed_tasks = sum(1 for task in team_tasks if task.completed)
     
     # 総タスク数
     total_tasks = len(team_tasks)
@@ -1728,43 +1492,22 @@ def team_dashboard(team_id):
         TeamMember.team_id == team_id
     ).all()
     
-    # メンバー別タスク数（チームタスク）
+    # メンバー別タスク数（チームタスク）と個人タスク（Task）の件数を1クエリで集計
+    from team_stats import get_member_rollup
+    rollup = get_member_rollup(team_id, start_date=start_date, end_date=end_date)
+    
     member_stats = {}
     for member in team_members:
-        assigned_tasks = TeamTask.query.filter(
-            TeamTask.team_id == team_id,
-            TeamTask.assigned_to == member.id,
-            db.func.date(TeamTask.created_at) >= start_date,
-            db.func.date(TeamTask.created_at) <= end_date
-        ).count()
-        completed_assigned = TeamTask.query.filter(
-            TeamTask.team_id == team_id,
-            TeamTask.assigned_to == member.id,
-            TeamTask.completed == True,
-            db.func.date(TeamTask.created_at) >= start_date,
-            db.func.date(TeamTask.created_at) <= end_date
-        ).count()
-        
+        stats = rollup.get(member.id)
         member_stats[member.id] = {
-            'assigned': assigned_tasks,
-            'completed': completed_assigned,
-            'completion_rate': (completed_assigned / assigned_tasks * 100) if assigned_tasks > 0 else 0
+            'assigned': stats['assigned'] if stats else 0,
+            'completed': stats['assigned_completed'] if stats else 0,
+            'completion_rate': stats['assigned_rate'] if stats else 0
         }
     
-    # チームメンバー全員の個人タスク（Task）の統計を取得
-    member_user_ids = [member.id for member in team_members]
-    
-    # 期間内の個人タスクを取得
-    personal_tasks = Task.query.filter(
-        Task.user_id.in_(member_user_ids),
-        Task.archived == False,
-        db.func.date(Task.created_at) >= start_date,
-        db.func.date(Task.created_at) <= end_date
-    ).all()
-    
     # 個人タスクの合計値
-    personal_total_tasks = len(personal_tasks)
-    personal_completed_tasks = sum(1 for task in personal_tasks if task.completed)
+    personal_total_tasks = sum(stats['personal_total'] for stats in rollup.values())
+    personal_completed_tasks = sum(stats['personal_completed'] for stats in rollup.values())
     personal_progress_percentage = (personal_completed_tasks / personal_total_tasks * 100) if personal_total_tasks > 0 else 0
     
     return render_template('team_dashboard.html',
@@ -1879,47 +1622,32 @@ def add_team_task_to_node(team_id, node_id):
     db.session.add(team_task)
     db.session.flush()  # IDを取得するため
     
-    # 選択された全ての担当者に対してTaskAssignee、個人タスクと通知を作成
+    # 選択された全ての担当者に対してTaskAssignee、個人タスクと通知を作成（まとめて作成）
     if assigned_to_values:
-        from models import Task, Notification, TaskAssignee
+        from team_task_assignees import apply_assignee_changes
+        from notification_fanout import notification_fanout
+        assignee_ids = set()
         for assignee_id_str in assigned_to_values:
             try:
-                assignee_id = int(assignee_id_str)
-                
-                # TaskAssigneeを作成
-                task_assignee = TaskAssignee(
-                    team_task_id=team_task.id,
-                    user_id=assignee_id,
-                    completed=False
-                )
-                db.session.add(task_assignee)
-                
-                # 個人タスクを作成
-                personal_task = Task(
-                    user_id=assignee_id,
-                    title=f'【{team.name}】{title}',
-                    description=description if description else None,
-                    start_date=due_date_obj,
-                    end_date=due_date_obj,
-                    priority=priority,
-                    category='other',
-                    team_task_id=team_task.id
-                )
-                db.session.add(personal_task)
-                db.session.flush()
-                
-                # 通知を作成
-                notification = Notification(
-                    user_id=assignee_id,
-                    title='チームタスクが割り当てられました',
-                    message=f'チーム「{team.name}」からタスク「{title}」が割り当てられました。',
-                    notification_type='info',
-                    related_team_id=team_id,
-                    related_task_id=personal_task.id
-                )
-                db.session.add(notification)
+                assignee_ids.add(int(assignee_id_str))
             except ValueError:
                 pass
+        
+        changes = apply_assignee_changes(team_task, assignee_ids, {
+            'title': f'【{team.name}】{title}',
+            'description': description if description else None,
+            'start_date': due_date_obj,
+            'end_date': due_date_obj,
+            'priority': priority
+        })
+        notification_fanout.notify(
+            changes['added'],
+            title='チームタスクが割り当てられました',
+            message=f'チーム「{team.name}」からタスク「{title}」が割り当てられました。',
+            notification_type='info',
+            related_team_id=team_id,
+            related_team_task_id=team_task.id
+        )
     
     db.session.commit()
     
@@ -1930,7 +1658,7 @@ def add_team_task_to_node(team_id, node_id):
 @login_required
 def delete_team_task_from_node(team_id, node_id, task_id):
     """ノードからタスクを削除"""
-    from models import Team, TeamMember, TeamTask, MindmapNode, Task, Mindmap, TaskAssignee
+    from models import Team, TeamMember, TeamTask, MindmapNode, Mindmap
     
     # チームの存在確認とアクセス権限チェック
     team = Team.query.get_or_404(team_id)
@@ -1949,31 +1677,20 @@ def delete_team_task_from_node(team_id, node_id, task_id):
     if task.parent_node_id != node_id:
         return jsonify({'success': False, 'message': 'タスクがこのノードに紐づいていません'}), 400
     
-    # TaskAssigneeを削除
-    task_assignees = TaskAssignee.query.filter_by(team_task_id=task.id).all()
-    for assignee in task_assignees:
-        db.session.delete(assignee)
-    
-    # 関連する個人タスクを削除
-    personal_tasks = Task.query.filter_by(team_task_id=task.id).all()
-    for personal_task in personal_tasks:
-        db.session.delete(personal_task)
-    
-    # 関連する子ノードを削除
+    # タスクとその担当者・個人タスク、タスクに紐づく子ノード（の部分木）をまとめて削除
+    from mindmap_cascade import delete_mindmap_subtrees, sync_deleted_task_performance
+    child_nodes = []
     mindmap_obj = Mindmap.query.filter_by(team_id=team_id).first()
     if mindmap_obj:
         child_nodes = MindmapNode.query.filter_by(
             mindmap_id=mindmap_obj.id,
             team_task_id=task.id
         ).all()
-        for child_node in child_nodes:
-            db.session.delete(child_node)
-    
-    # チームタスクを削除
-    db.session.delete(task)
+    summary = delete_mindmap_subtrees(child_nodes, team_task_ids=[task.id])
     db.session.commit()
+    sync_deleted_task_performance(summary['user_ids'])
     
-    return jsonify({'success': True, 'message': 'タスクを削除しました'})
+    return jsonify({'success': True, 'message': 'タスクを削除しました', 'deleted': summary})
 
 @main.route('/team-task-detail/<int:team_id>/node/<int:node_id>/task-info/<int:task_id>')
 @login_required
@@ -2032,7 +1749,9 @@ def get_task_info(team_id, node_id, task_id):
 @login_required
 def edit_team_task(team_id, node_id, task_id):
     """タスク編集API"""
-    from models import Team, TeamMember, TeamTask, TaskAssignee, Task, Notification
+    from models import Team, TeamMember, TeamTask
+    from team_task_assignees import apply_assignee_changes
+    from notification_fanout import notification_fanout
     from datetime import datetime
     
     # チームの存在確認とアクセス権限チェック
@@ -2074,10 +1793,6 @@ def edit_team_task(team_id, node_id, task_id):
     task.priority = priority
     task.updated_at = datetime.utcnow()
     
-    # 既存のTaskAssigneeを取得
-    existing_assignees = TaskAssignee.query.filter_by(team_task_id=task.id).all()
-    existing_user_ids = {a.user_id for a in existing_assignees}
-    
     # 新しい担当者リスト
     new_user_ids = set()
     for user_id_str in assigned_to_values:
@@ -2086,71 +1801,24 @@ def edit_team_task(team_id, node_id, task_id):
         except ValueError:
             pass
     
-    # 削除する担当者（既存だが新リストにない）
-    to_remove = existing_user_ids - new_user_ids
-    for user_id in to_remove:
-        task_assignee = TaskAssignee.query.filter_by(
-            team_task_id=task.id,
-            user_id=user_id
-        ).first()
-        if task_assignee:
-            # 対応する個人タスクも削除
-            personal_task = Task.query.filter_by(
-                team_task_id=task.id,
-                user_id=user_id
-            ).first()
-            if personal_task:
-                db.session.delete(personal_task)
-            db.session.delete(task_assignee)
-    
-    # 追加する担当者（新リストにはあるが既存にない）
-    to_add = new_user_ids - existing_user_ids
-    for user_id in to_add:
-        # TaskAssigneeを作成
-        task_assignee = TaskAssignee(
-            team_task_id=task.id,
-            user_id=user_id,
-            completed=False
-        )
-        db.session.add(task_assignee)
-        
-        # 個人タスクを作成
-        personal_task = Task(
-            user_id=user_id,
-            title=f'【{team.name}】{title}',
-            description=description if description else None,
-            start_date=due_date_obj,
-            end_date=due_date_obj,
-            priority=priority,
-            category='other',
-            team_task_id=task.id
-        )
-        db.session.add(personal_task)
-        db.session.flush()
-        
-        # 通知を作成
-        notification = Notification(
-            user_id=user_id,
-            title='チームタスクが割り当てられました',
-            message=f'チーム「{team.name}」からタスク「{title}」が割り当てられました。',
-            notification_type='info',
-            related_team_id=team_id,
-            related_task_id=personal_task.id
-        )
-        db.session.add(notification)
+    # 担当者の追加・削除と個人タスクの更新（差分を種類ごとに1文でまとめて反映）
+    changes = apply_assignee_changes(task, new_user_ids, {
+        'title': f'【{team.name}】{title}',
+        'description': description if description else None,
+        'start_date': due_date_obj,
+        'end_date': due_date_obj,
+        'priority': priority
+    })
     
-    # 既存の担当者の個人タスクも更新
-    for user_id in existing_user_ids & new_user_ids:
-        personal_task = Task.query.filter_by(
-            team_task_id=task.id,
-            user_id=user_id
-        ).first()
-        if personal_task:
-            personal_task.title = f'【{team.name}】{title}'
-            personal_task.description = description if description else None
-            personal_task.start_date = due_date_obj
-            personal_task.end_date = due_date_obj
-            personal_task.priority = priority
+    # 追加した担当者への通知（まとめて作成）
+    notification_fanout.notify(
+        changes['added'],
+        title='チームタスクが割り当てられました',
+        message=f'チーム「{team.name}」からタスク「{title}」が割り当てられました。',
+        notification_type='info',
+        related_team_id=team_id,
+        related_team_task_id=task.id
+    )
     
     db.session.commit()
     
@@ -2160,7 +1828,7 @@ def edit_team_task(team_id, node_id, task_id):
 @login_required
 def toggle_team_task():
     """チームタスクの完了報告"""
-    from models import TeamTask, TeamMember, Task, TaskAssignee, MindmapNode
+    from models import TeamTask, TeamMember, Task, TaskAssignee
     
     task_id = request.form.get('task_id')
     if not task_id:
@@ -2212,15 +1880,9 @@ def toggle_team_task():
     team_task.completed = (completion_rate == 100)
     team_task.updated_at = datetime.utcnow()
     
-    # 親ノードの進捗率を更新
-    if team_task.parent_node_id:
-        parent_node = MindmapNode.query.get(team_task.parent_node_id)
-        if parent_node:
-            parent_node.progress = parent_node.calculate_progress()
-    
     # UserPerformanceを更新
     from models import UserPerformance
-    UserPerformance.update_daily_performance(current_user.id)
+    UserPerformance.sync_daily_performance(current_user.id)
     
     db.session.commit()
     
@@ -2290,8 +1952,19 @@ def mindmap_nodes(team_id):
         return jsonify({'nodes': []})
     
     if request.method == 'GET':
-        # ノード一覧を取得
-        nodes = MindmapNode.query.filter_by(mindmap_id=mindmap_obj.id).all()
+        # 変更が無ければノードを読まずに 304（ETag はマップのリビジョン）
+        from mindmap_sync import mindmap_etag, not_modified_response, parse_since, get_deleted_node_ids, sync_response
+        etag = mindmap_etag(mindmap_obj)
+        not_modified = not_modified_response(etag)
+        if not_modified:
+            return not_modified
+        
+        # ?since=<revision> の場合はそれより後に変更されたノードだけを取得
+        since = parse_since(request.args.get('since'), mindmap_obj.revision)
+        query = MindmapNode.query.filter_by(mindmap_id=mindmap_obj.id)
+        if since is not None:
+            query = query.filter(MindmapNode.revision > since)
+        nodes = query.order_by(MindmapNode.id).all()
         nodes_data = []
         
         for node in nodes:
@@ -2309,55 +1982,20 @@ def mindmap_nodes(team_id):
                 'due_date': node.due_date.isoformat() if node.due_date else None
             })
         
-        return jsonify({
+        payload = {
             'nodes': nodes_data,
-            'mindmap_id': mindmap_obj.id
-        })
+            'mindmap_id': mindmap_obj.id,
+            'revision': mindmap_obj.revision,
+            'full': since is None
+        }
+        if since is not None:
+            payload['deleted'] = get_deleted_node_ids(mindmap_obj.id, since)
+        return sync_response(payload, etag)
     
     elif request.method == 'POST':
         # ノード作成
-        from models import TeamTask
         data = request.get_json()
-        
-        # 完了予定日の処理
-        due_date_obj = None
-        if data.get('due_date'):
-            try:
-                due_date_obj = datetime.strptime(data.get('due_date'), '%Y-%m-%d').date()
-            except ValueError:
-                pass
-        
-        new_node = MindmapNode(
-            mindmap_id=mindmap_obj.id,
-            parent_id=data.get('parent_id'),
-            title=data.get('title', '新規ノード'),
-            description=data.get('description', ''),
-            position_x=data.get('position_x', 0),
-            position_y=data.get('position_y', 0),
-            is_task=data.get('is_task', False),
-            due_date=due_date_obj
-        )
-        
-        db.session.add(new_node)
-        db.session.flush()  # IDを取得するため
-        
-        # 子ノード（親が存在する）の場合、自動でチームタスクを作成
-        if data.get('parent_id'):
-            team_task = TeamTask(
-                team_id=team_id,
-                title=data.get('title', '新規ノード'),
-                description=data.get('description', ''),
-                created_by=current_user.id,
-                due_date=due_date_obj,
-                parent_node_id=new_node.parent_id
-            )
-            db.session.add(team_task)
-            db.session.flush()  # IDを取得するため
-            
-            # ノードとタスクを紐付け
-            new_node.is_task = True
-            new_node.team_task_id = team_task.id
-        
+        new_node = _create_team_mindmap_node(mindmap_obj, team_id, data, data.get('parent_id'))
         db.session.commit()
         
         return jsonify({
@@ -2386,62 +2024,161 @@ def update_mindmap_node(team_id, node_id):
     if request.method == 'PUT':
         # ノード更新
         data = request.get_json()
-        
-        if 'title' in data:
-            node.title = data['title']
-        if 'description' in data:
-            node.description = data['description']
-        if 'position_x' in data:
-            node.position_x = data['position_x']
-        if 'position_y' in data:
-            node.position_y = data['position_y']
-        if 'progress' in data:
-            node.progress = data['progress']
-        if 'completed' in data:
-            node.completed = data['completed']
-        if 'due_date' in data:
-            if data['due_date']:
-                try:
-                    node.due_date = datetime.strptime(data['due_date'], '%Y-%m-%d').date()
-                except ValueError:
-                    pass
-            else:
-                node.due_date = None
-        
-        node.updated_at = datetime.utcnow()
+        _update_team_mindmap_node(node, data)
         db.session.commit()
         
         return jsonify({'success': True})
     
     elif request.method == 'DELETE':
-        # ノード削除
-        from models import TeamTask, Task, TaskAssignee
-        
-        # このノードに紐づいている全てのチームタスクを取得（サブタスクとして）
-        related_team_tasks = TeamTask.query.filter_by(parent_node_id=node_id).all()
-        
-        # 関連するチームタスクを削除
-        for team_task in related_team_tasks:
-            # TaskAssigneeを削除
-            task_assignees = TaskAssignee.query.filter_by(team_task_id=team_task.id).all()
-            for assignee in task_assignees:
-                # 対応する個人タスクも削除
-                personal_task = Task.query.filter_by(
-                    team_task_id=team_task.id,
-                    user_id=assignee.user_id
-                ).first()
-                if personal_task:
-                    db.session.delete(personal_task)
-                db.session.delete(assignee)
-            
-            # チームタスクを削除
-            db.session.delete(team_task)
-        
-        # ノードを削除（子ノードはcascadeで自動削除される）
-        db.session.delete(node)
+        # ノード削除（子孫ノード・サブタスクとその担当者・個人タスクもまとめて削除）
+        from mindmap_cascade import delete_mindmap_subtrees, sync_deleted_task_performance
+        summary = delete_mindmap_subtrees([node])
         db.session.commit()
+        sync_deleted_task_performance(summary['user_ids'])
         
-        return jsonify({'success': True})
+        return jsonify({'success': True, 'deleted': summary})
+
+def _create_team_mindmap_node(mindmap_obj, team_id, data, parent_id):
+    """チームマップのノードを作成（子ノードの場合はチームタスクも作成）"""
+    from models import MindmapNode, TeamTask
+    
+    # 完了予定日の処理
+    due_date_obj = None
+    if data.get('due_date'):
+        try:
+            due_date_obj = datetime.strptime(data.get('due_date'), '%Y-%m-%d').date()
+        except ValueError:
+            pass
+    
+    new_node = MindmapNode(
+        mindmap_id=mindmap_obj.id,
+        parent_id=parent_id,
+        title=data.get('title', '新規ノード'),
+        description=data.get('description', ''),
+        position_x=data.get('position_x', 0),
+        position_y=data.get('position_y', 0),
+        is_task=data.get('is_task', False),
+        due_date=due_date_obj
+    )
+    
+    db.session.add(new_node)
+    db.session.flush()  # IDを取得するため
+    
+    # 子ノード（親が存在する）の場合、自動でチームタスクを作成
+    if parent_id:
+        team_task = TeamTask(
+            team_id=team_id,
+            title=data.get('title', '新規ノード'),
+            description=data.get('description', ''),
+            created_by=current_user.id,
+            due_date=due_date_obj,
+            parent_node_id=new_node.parent_id
+        )
+        db.session.add(team_task)
+        db.session.flush()  # IDを取得するため
+        
+        # ノードとタスクを紐付け
+        new_node.is_task = True
+        new_node.team_task_id = team_task.id
+    
+    return new_node
+
+def _update_team_mindmap_node(node, data):
+    """チームマップのノードの項目を更新"""
+    if 'title' in data:
+        node.title = data['title']
+    if 'description' in data:
+        node.description = data['description']
+    if 'position_x' in data:
+        node.position_x = data['position_x']
+    if 'position_y' in data:
+        node.position_y = data['position_y']
+    if 'progress' in data:
+        node.progress = data['progress']
+    if 'completed' in data:
+        node.completed = data['completed']
+    if 'due_date' in data:
+        if data['due_date']:
+            try:
+                node.due_date = datetime.strptime(data['due_date'], '%Y-%m-%d').date()
+            except ValueError:
+                pass
+        else:
+            node.due_date = None
+    
+    node.updated_at = datetime.utcnow()
+
+def _move_team_mindmap_node(node, old_parent_id):
+    """移動したノードのチームタスクを新しい親ノードのサブタスクにする"""
+    from models import TeamTask
+    
+    if node.team_task_id:
+        team_task = TeamTask.query.get(node.team_task_id)
+        if team_task and team_task.parent_node_id == old_parent_id:
+            team_task.parent_node_id = node.parent_id
+    node.updated_at = datetime.utcnow()
+
+def _batch_error_response(error):
+    """一括操作のエラーをロールバックして返す"""
+    db.session.rollback()
+    response = {'success': False, 'message': error.message}
+    if error.index is not None:
+        response['index'] = error.index
+    return jsonify(response), 400
+
+@main.route('/mindmap/<int:team_id>/nodes/batch', methods=['POST'])
+@login_required
+def batch_mindmap_nodes(team_id):
+    """
+    チームマップのノードを一括で作成・更新・移動・削除
+    - 権限の確認は1回だけ行い、全ての操作を1トランザクションで反映する
+    - 戻り値: 作成したノードのID（ref ごと）と反映後のマップのリビジョン
+    """
+    from models import Team, TeamMember, Mindmap
+    from mindmap_batch import BatchOperationError, apply_node_operations, validate_operations
+    from mindmap_cascade import delete_mindmap_subtrees, sync_deleted_task_performance
+    
+    # チームに所属しているか確認
+    team = Team.query.get_or_404(team_id)
+    membership = TeamMember.query.filter_by(
+        team_id=team_id,
+        user_id=current_user.id
+    ).first()
+    
+    if not membership:
+        return jsonify({'error': '権限がありません'}), 403
+    
+    mindmap_obj = Mindmap.query.filter_by(team_id=team_id).first()
+    if not mindmap_obj:
+        return jsonify({'success': False, 'message': 'マインドマップが見つかりません'}), 404
+    
+    deleted_task_user_ids = set()
+    
+    def delete_node(node):
+        deleted_task_user_ids.update(delete_mindmap_subtrees([node])['user_ids'])
+    
+    try:
+        operations = validate_operations(request.get_json(silent=True))
+        result = apply_node_operations(
+            mindmap_obj,
+            operations,
+            create_node=lambda data, parent_id: _create_team_mindmap_node(mindmap_obj, team_id, data, parent_id),
+            update_node=_update_team_mindmap_node,
+            delete_node=delete_node,
+            move_node=_move_team_mindmap_node
+        )
+    except BatchOperationError as error:
+        return _batch_error_response(error)
+    
+    db.session.commit()
+    sync_deleted_task_performance(sorted(deleted_task_user_ids))
+    
+    return jsonify({
+        'success': True,
+        'mindmap_id': mindmap_obj.id,
+        'revision': mindmap_obj.revision,
+        **result
+    })
 
 @main.route('/mindmap/<int:team_id>/nodes/<int:node_id>/task', methods=['POST'])
 @login_required
@@ -2548,10 +2285,10 @@ def add_personal_task_card_task(node_id):
     if not mindmap_node.task_id:
         mindmap_node.task_id = new_task.id
  
-    _update_task_card_progress(node_id)
+    update_task_card_progress(node_id)
     db.session.commit()
  
-    UserPerformance.update_daily_performance(current_user.id)
+    UserPerformance.sync_daily_performance(current_user.id)
  
     flash('タスクを追加しました', 'success')
     return redirect(url_for('main.personal_task_card_detail', node_id=node_id))
@@ -2574,11 +2311,18 @@ def get_mindmap_progress(team_id):
     
     mindmap_obj = Mindmap.query.filter_by(team_id=team_id).first()
     if not mindmap_obj:
-        return jsonify({'progress': 0})
+        return jsonify({'progress': 0, 'nodes': {}})
     
-    progress = mindmap_obj.calculate_progress()
+    # 保存済みの達成度を返す（タスク・ノードの変更時に mindmap_progress で更新済み）
+    from models import MindmapNode
+    node_progress = db.session.query(MindmapNode.id, MindmapNode.progress).filter(
+        MindmapNode.mindmap_id == mindmap_obj.id
+    ).all()
     
-    return jsonify({'progress': progress})
+    return jsonify({
+        'progress': mindmap_obj.progress,
+        'nodes': {node_id: progress for node_id, progress in node_progress}
+    })
 
 # ===== 個人マインドマップAPI =====
 
@@ -2643,23 +2387,47 @@ def personal_mindmap_nodes():
         return jsonify({'nodes': []})
     
     if request.method == 'GET':
-        # ノード一覧を取得
-        nodes = MindmapNode.query.filter_by(mindmap_id=mindmap_obj.id).all()
-        nodes_data = []
+        # 変更が無ければノードを読まずに 304（ETag はマップのリビジョン）
+        from mindmap_sync import mindmap_etag, not_modified_response, parse_since, get_deleted_node_ids, sync_response
+        etag = mindmap_etag(mindmap_obj)
+        not_modified = not_modified_response(etag)
+        if not_modified:
+            return not_modified
         
-        for node in nodes:
-            card_tasks = Task.query.filter_by(
-                user_id=current_user.id,
-                task_card_node_id=node.id,
-                archived=False
-            ).all()
-            total_card_tasks = len(card_tasks)
-            completed_card_tasks = sum(1 for t in card_tasks if t.completed)
+        # ?since=<revision> の場合はそれより後に変更されたノードだけを対象にする
+        since = parse_since(request.args.get('since'), mindmap_obj.revision)
+        node_filters = [MindmapNode.mindmap_id == mindmap_obj.id]
+        if since is not None:
+            node_filters.append(MindmapNode.revision > since)
+        
+        # ノード一覧とリンクしている個人タスクの完了状態を1クエリで取得
+        nodes = db.session.query(MindmapNode, Task.completed).outerjoin(
+            Task, MindmapNode.task_id == Task.id
+        ).filter(
+            *node_filters
+        ).order_by(MindmapNode.id).all()
+        
+        # カードごとのタスク数・完了数を GROUP BY の1クエリで集計
+        card_counts = {
+            node_id: (total, int(completed or 0))
+            for node_id, total, completed in db.session.query(
+                Task.task_card_node_id,
+                db.func.count(Task.id),
+                db.func.sum(db.case((Task.completed == True, 1), else_=0))
+            ).filter(
+                Task.user_id == current_user.id,
+                Task.archived == False,
+                Task.task_card_node_id.in_(
+                    db.select(MindmapNode.id).where(*node_filters)
+                )
+            ).group_by(Task.task_card_node_id).all()
+        }
+        
+        # 読み取り専用（progress は書き込み時に update_task_card_progress で保存済み。ここでは集計値から返すだけ）
+        nodes_data = []
+        for node, linked_task_completed in nodes:
+            total_card_tasks, completed_card_tasks = card_counts.get(node.id, (0, 0))
             calculated_progress = int(completed_card_tasks / total_card_tasks * 100) if total_card_tasks > 0 else 0
-            if node.progress != calculated_progress:
-                node.progress = calculated_progress
-                db.session.add(node)
-
             nodes_data.append({
                 'id': node.id,
                 'parent_id': node.parent_id,
@@ -2672,37 +2440,25 @@ def personal_mindmap_nodes():
                 'is_task': node.is_task,
                 'due_date': node.due_date.isoformat() if node.due_date else None,
                 'task_id': node.task_id,
-                'task_completed': node.linked_task.completed if node.linked_task else False,
+                'task_completed': bool(linked_task_completed) if node.task_id else False,
                 'task_count': total_card_tasks,
                 'completed_task_count': completed_card_tasks
             })
         
-        db.session.commit()
-        return jsonify({'nodes': nodes_data, 'mindmap_id': mindmap_obj.id})
+        payload = {
+            'nodes': nodes_data,
+            'mindmap_id': mindmap_obj.id,
+            'revision': mindmap_obj.revision,
+            'full': since is None
+        }
+        if since is not None:
+            payload['deleted'] = get_deleted_node_ids(mindmap_obj.id, since)
+        return sync_response(payload, etag)
     
     elif request.method == 'POST':
         # ノード作成
         data = request.get_json()
-        
-        new_node = MindmapNode(
-            mindmap_id=mindmap_obj.id,
-            parent_id=data.get('parent_id'),
-            title=data.get('title', '新規ノード'),
-            description=data.get('description', ''),
-            position_x=data.get('position_x', 0),
-            position_y=data.get('position_y', 0),
-            is_task=data.get('is_task', False)
-        )
-        
-        # 期日を設定
-        due_date_str = data.get('due_date')
-        if due_date_str:
-            try:
-                new_node.due_date = datetime.strptime(due_date_str, '%Y-%m-%d').date()
-            except ValueError:
-                new_node.due_date = None
-        
-        db.session.add(new_node)
+        new_node = _create_personal_mindmap_node(mindmap_obj, data, data.get('parent_id'))
         db.session.commit()
         
         return jsonify({
@@ -2715,8 +2471,7 @@ def personal_mindmap_nodes():
 @login_required
 def update_personal_mindmap_node(node_id):
     """個人マインドマップノードの更新・削除"""
-    from models import Mindmap, MindmapNode, Task, UserPerformance
-    from zoneinfo import ZoneInfo
+    from models import Mindmap, MindmapNode, UserPerformance
     
     node = MindmapNode.query.get_or_404(node_id)
     
@@ -2728,98 +2483,192 @@ def update_personal_mindmap_node(node_id):
     if request.method == 'PUT':
         # ノード更新
         data = request.get_json()
-        
-        if 'title' in data:
-            node.title = data['title']
-        if 'description' in data:
-            node.description = data['description']
-        if 'position_x' in data:
-            node.position_x = data['position_x']
-        if 'position_y' in data:
-            node.position_y = data['position_y']
-        if 'progress' in data:
-            node.progress = data['progress']
-        if 'completed' in data:
-            node.completed = data['completed']
-        if 'due_date' in data:
-            due_date_str = data['due_date']
-            if due_date_str:
-                try:
-                    node.due_date = datetime.strptime(due_date_str, '%Y-%m-%d').date()
-                except ValueError:
-                    node.due_date = None
-            else:
-                node.due_date = None
-        
-        # is_taskが変更された場合の処理
-        if 'is_task' in data:
-            is_task = data['is_task']
-            
-            # is_taskがTrueになった場合、個人タスクを作成
-            if is_task and not node.task_id:
-                new_task = Task(
-                    title=node.title,
-                    description=node.description or '',
-                    user_id=current_user.id,
-                    category='other',
-                    priority='medium',
-                    completed=False,
-                    start_date=node.due_date,
-                    end_date=node.due_date
-                )
-                db.session.add(new_task)
-                db.session.flush()
-                node.task_id = new_task.id
-                
-                # パフォーマンス更新
-                UserPerformance.update_daily_performance(current_user.id)
-            
-            # is_taskがFalseになった場合、リンクされたタスクを削除
-            elif not is_task:
-                linked_tasks = Task.query.filter_by(task_card_node_id=node.id).all()
-                for linked in linked_tasks:
-                    db.session.delete(linked)
-                node.task_id = None
-                UserPerformance.update_daily_performance(current_user.id)
-            
-            node.is_task = is_task
-        
-        # 既存のタスクがリンクされている場合、タスクも更新
-        if node.task_id:
-            task = Task.query.get(node.task_id)
-            if task:
-                if 'title' in data:
-                    task.title = data['title']
-                if 'description' in data:
-                    task.description = data.get('description', '')
-                if 'due_date' in data:
-                    task.start_date = node.due_date
-                    task.end_date = node.due_date
-                if 'completed' in data:
-                    task.completed = data['completed']
-                    task.completed_at = datetime.now(ZoneInfo('Asia/Tokyo')).replace(tzinfo=None) if task.completed else None
-                
-                # パフォーマンス更新
-                UserPerformance.update_daily_performance(current_user.id)
-        
-        node.updated_at = datetime.utcnow()
-        _update_task_card_progress(node.id)
+        if _update_personal_mindmap_node(node, data):
+            # パフォーマンス更新
+            UserPerformance.sync_daily_performance(current_user.id)
         db.session.commit()
         
         return jsonify({'success': True, 'task_id': node.task_id})
     
     elif request.method == 'DELETE':
-        # ノード削除時、リンクされたタスクも削除
-        linked_tasks = Task.query.filter_by(task_card_node_id=node.id).all()
-        for linked in linked_tasks:
-            db.session.delete(linked)
-        
-        db.session.delete(node)
+        # ノード削除時、子孫ノードとリンクされたタスクもまとめて削除
+        from mindmap_cascade import delete_mindmap_subtrees, sync_deleted_task_performance
+        summary = delete_mindmap_subtrees([node])
         db.session.commit()
-        UserPerformance.update_daily_performance(current_user.id)
+        sync_deleted_task_performance(summary['user_ids'])
         
-        return jsonify({'success': True})
+        return jsonify({'success': True, 'deleted': summary})
+
+
+def _create_personal_mindmap_node(mindmap_obj, data, parent_id):
+    """個人マップのノードを作成"""
+    from models import MindmapNode
+    
+    new_node = MindmapNode(
+        mindmap_id=mindmap_obj.id,
+        parent_id=parent_id,
+        title=data.get('title', '新規ノード'),
+        description=data.get('description', ''),
+        position_x=data.get('position_x', 0),
+        position_y=data.get('position_y', 0),
+        is_task=data.get('is_task', False)
+    )
+    
+    # 期日を設定
+    due_date_str = data.get('due_date')
+    if due_date_str:
+        try:
+            new_node.due_date = datetime.strptime(due_date_str, '%Y-%m-%d').date()
+        except ValueError:
+            new_node.due_date = None
+    
+    db.session.add(new_node)
+    return new_node
 
+def _update_personal_mindmap_node(node, data):
+    """
+    個人マップのノードの項目を更新（リンクされた個人タスクにも反映）
+    戻り値: 個人タスクを作成・更新・削除した場合 True（パフォーマンスの更新が必要）
+    """
+    from models import Task
+    
+    tasks_changed = False
+    if 'title' in data:
+        node.title = data['title']
+    if 'description' in data:
+        node.description = data['description']
+    if 'position_x' in data:
+        node.position_x = data['position_x']
+    if 'position_y' in data:
+        node.position_y = data['position_y']
+    if 'progress' in data:
+        node.progress = data['progress']
+    if 'completed' in data:
+        node.completed = data['completed']
+    if 'due_date' in data:
+        due_date_str = data['due_date']
+        if due_date_str:
+            try:
+                node.due_date = datetime.strptime(due_date_str, '%Y-%m-%d').date()
+            except ValueError:
+                node.due_date = None
+        else:
+            node.due_date = None
+    
+    # is_taskが変更された場合の処理
+    if 'is_task' in data:
+        is_task = data['is_task']
+        
+        # is_taskがTrueになった場合、個人タスクを作成
+        if is_task and not node.task_id:
+            new_task = Task(
+                title=node.title,
+                description=node.description or '',
+                user_id=current_user.id,
+                category='other',
+                priority='medium',
+                completed=False,
+                start_date=node.due_date,
+                end_date=node.due_date
+            )
+            db.session.add(new_task)
+            db.session.flush()
+            node.task_id = new_task.id
+            tasks_changed = True
+        
+        # is_taskがFalseになった場合、リンクされたタスクを削除
+        elif not is_task:
+            linked_tasks = Task.query.filter_by(task_card_node_id=node.id).all()
+            for linked in linked_tasks:
+                db.session.delete(linked)
+            node.task_id = None
+            tasks_changed = True
+        
+        node.is_task = is_task
+    
+    # 既存のタスクがリンクされている場合、タスクも更新
+    if node.task_id:
+        task = Task.query.get(node.task_id)
+        if task:
+            if 'title' in data:
+                task.title = data['title']
+            if 'description' in data:
+                task.description = data.get('description', '')
+            if 'due_date' in data:
+                task.start_date = node.due_date
+                task.end_date = node.due_date
+            if 'completed' in data:
+                task.completed = data['completed']
+                task.completed_at = datetime.now(ZoneInfo('Asia/Tokyo')).replace(tzinfo=None) if task.completed else None
+            tasks_changed = True
+    
+    node.updated_at = datetime.utcnow()
+    update_task_card_progress(node.id)
+    return tasks_changed
+
+def _move_personal_mindmap_node(node, old_parent_id):
+    node.updated_at = datetime.utcnow()
+
+@main.route('/personal/mindmap/nodes/batch', methods=['POST'])
+@login_required
+def batch_personal_mindmap_nodes():
+    """
+    個人マップのノードを一括で作成・更新・移動・削除
+    - 権限の確認は1回だけ行い、全ての操作を1トランザクションで反映する
+    - パフォーマンスの更新も最後に1回だけ行う
+    """
+    from models import Mindmap, UserPerformance
+    from mindmap_batch import BatchOperationError, apply_node_operations, validate_operations
+    from mindmap_cascade import delete_mindmap_subtrees
+    
+    data = request.get_json(silent=True)
+    mindmap_id = data.get('mindmap_id') if isinstance(data, dict) else None
+    if mindmap_id is None:
+        mindmap_id = request.args.get('mindmap_id', type=int)
+    
+    # 自分のマインドマップか確認（未指定の場合は最新のマップ）
+    if mindmap_id:
+        mindmap_obj = Mindmap.query.filter_by(id=mindmap_id, user_id=current_user.id).first()
+        if not mindmap_obj:
+            return jsonify({'error': '権限がありません'}), 403
+    else:
+        mindmap_obj = Mindmap.query.filter_by(user_id=current_user.id).order_by(Mindmap.date.desc(), Mindmap.created_at.desc()).first()
+        if not mindmap_obj:
+            return jsonify({'success': False, 'message': 'マインドマップが見つかりません'}), 404
+    
+    tasks_changed = []
+    
+    def update_node(node, data):
+        if _update_personal_mindmap_node(node, data):
+            tasks_changed.append(node.id)
+    
+    def delete_node(node):
+        if delete_mindmap_subtrees([node])['tasks']:
+            tasks_changed.append(node.id)
+    
+    try:
+        operations = validate_operations(data)
+        result = apply_node_operations(
+            mindmap_obj,
+            operations,
+            create_node=lambda data, parent_id: _create_personal_mindmap_node(mindmap_obj, data, parent_id),
+            update_node=update_node,
+            delete_node=delete_node,
+            move_node=_move_personal_mindmap_node
+        )
+    except BatchOperationError as error:
+        return _batch_error_response(error)
+    
+    db.session.commit()
+    if tasks_changed:
+        UserPerformance.sync_daily_performance(current_user.id)
+    
+    return jsonify({
+        'success': True,
+        'mindmap_id': mindmap_obj.id,
+        'revision': mindmap_obj.revision,
+        **result
+    })
 
 @main.route('/personal/mindmap/nodes/<int:node_id>/create-task', methods=['POST'])
 @login_required
@@ -2871,10 +2720,10 @@ def create_task_from_personal_card(node_id):
     node.is_task = True
     if not node.task_id:
         node.task_id = new_task.id
-    _update_task_card_progress(node.id)
+    update_task_card_progress(node.id)
     db.session.commit()
 
-    UserPerformance.update_daily_performance(current_user.id)
+    UserPerformance.sync_daily_performance(current_user.id)
     
     return jsonify({
         'success': True,
@@ -2898,11 +2747,18 @@ def get_personal_mindmap_progress():
         mindmap_obj = Mindmap.query.filter_by(user_id=current_user.id).order_by(Mindmap.date.desc(), Mindmap.created_at.desc()).first()
     
     if not mindmap_obj:
-        return jsonify({'progress': 0})
+        return jsonify({'progress': 0, 'nodes': {}})
     
-    progress = mindmap_obj.calculate_progress()
+    # 保存済みの達成度を返す（タスク・ノードの変更時に mindmap_progress で更新済み）
+    from models import MindmapNode
+    node_progress = db.session.query(MindmapNode.id, MindmapNode.progress).filter(
+        MindmapNode.mindmap_id == mindmap_obj.id
+    ).all()
     
-    return jsonify({'progress': progress})
+    return jsonify({
+        'progress': mindmap_obj.progress,
+        'nodes': {node_id: progress for node_id, progress in node_progress}
+    })
 
 @main.route('/personal/mindmaps')
 @login_required
@@ -3033,7 +2889,7 @@ def reset_password():
 @login_required
 def delete_user():
     """ユーザー削除（管理者のみ）"""
-    from models import User, Task, TeamMember, Team, Notification, ConversationSession
+    from models import User, Task, TeamMember, Team, Notification, ConversationSession, DailyTaskRollup
     
     # 管理者権限チェック
     if not current_user.is_admin:
@@ -3062,8 +2918,13 @@ def delete_user():
     # 自分が作成したチームがある場合、チームも削除（cascadeで自動削除）
     Team.query.filter_by(created_by=user_id).delete()
     
+    # 日別集計を削除
+    DailyTaskRollup.query.filter_by(user_id=user_id).delete()
+    
     # Notificationを削除
     Notification.query.filter_by(user_id=user_id).delete()
+    from cache import unread_counter
+    unread_counter.invalidate(user_id)
     
     # ConversationSessionとその関連データはcascadeで自動削除される
     
@@ -3262,6 +3123,7 @@ def export_data():
         'read': n.read,
         'related_team_id': n.related_team_id,
         'related_task_id': n.related_task_id,
+        'related_team_task_id': n.related_team_task_id,
         'created_at': n.created_at.isoformat() if n.created_at else None
     } for n in notifications]
     
@@ -3319,7 +3181,7 @@ def import_data():
     from models import (
         User, Task, UserPerformance, Team, TeamMember, TeamTask, TaskAssignee,
         Mindmap, MindmapNode, TaskTemplate, Notification,
-        ConversationSession, ConversationMessage, SuggestedTask
+        ConversationSession, ConversationMessage, SuggestedTask, DailyTaskRollup, MindmapNodeTombstone
     )
     import json
     from datetime import datetime
@@ -3349,6 +3211,10 @@ def import_data():
     if 'version' not in import_data or 'data' not in import_data:
         return jsonify({'success': False, 'message': '不正なバックアップファイルです'}), 400
     
+    # インポートしたタスクの差分を UserPerformance に二重計上しないよう増分更新を止める
+    from performance_tracker import PAUSE_KEY
+    db.session.info[PAUSE_KEY] = True
+    
     try:
         # 既存データを削除（外部キー制約を考慮して順序よく削除）
         # 依存関係の逆順で削除
@@ -3357,10 +3223,12 @@ def import_data():
         ConversationSession.query.delete()
         Notification.query.delete()
         TaskAssignee.query.delete()
+        MindmapNodeTombstone.query.delete()
         MindmapNode.query.delete()
         Task.query.delete()
         TeamTask.query.delete()
         TaskTemplate.query.delete()
+        DailyTaskRollup.query.delete()
         UserPerformance.query.delete()
         TeamMember.query.delete()
         Mindmap.query.delete()
@@ -3608,7 +3476,8 @@ def import_data():
                 notification_type=n_data.get('notification_type', 'info'),
                 read=n_data.get('read', False),
                 related_team_id=id_mapping['teams'].get(n_data['related_team_id']) if n_data.get('related_team_id') else None,
-                related_task_id=id_mapping['tasks'].get(n_data['related_task_id']) if n_data.get('related_task_id') else None
+                related_task_id=id_mapping['tasks'].get(n_data['related_task_id']) if n_data.get('related_task_id') else None,
+                related_team_task_id=id_mapping['team_tasks'].get(n_data['related_team_task_id']) if n_data.get('related_team_task_id') else None
             )
             if n_data.get('created_at'):
                 new_n.created_at = datetime.fromisoformat(n_data['created_at'].replace('Z', '+00:00'))
@@ -3656,8 +3525,18 @@ def import_data():
                 new_st.created_at = datetime.fromisoformat(st_data['created_at'].replace('Z', '+00:00'))
             db.session.add(new_st)
         
+        # インポートしたユーザーの日別集計（レポート用）をタスク履歴から作り直す
+        db.session.flush()
+        from report_stats import rebuild_user_rollups
+        rebuild_user_rollups(id_mapping['users'].values())
+        
         db.session.commit()
         
+        # 一括削除・再作成のため全ユーザーの集計スナップショット・未読通知数を破棄
+        from cache import snapshot_cache, unread_counter
+        snapshot_cache.clear()
+        unread_counter.clear()
+        
         return jsonify({
             'success': True,
             'message': 'データのインポートが完了しました'
@@ -3669,6 +3548,8 @@ def import_data():
             'success': False,
             'message': f'インポート中にエラーが発生しました: {str(e)}'
         }), 500
+    finally:
+        db.session.info.pop(PAUSE_KEY, None)
 
 # ===== 壁打ち機能 =====
 
@@ -4138,7 +4019,7 @@ def edit_task_template(template_id):
 @login_required
 def delete_task_template(template_id):
     """タスクテンプレート削除"""
-    from models import TaskTemplate, db
+    from models import TaskTemplate, Task, db
 
     template = TaskTemplate.query.get_or_404(template_id)
 
@@ -4146,6 +4027,10 @@ def delete_task_template(template_id):
         flash('このテンプレートを削除する権限がありません', 'error')
         return redirect(url_for('main.task_templates'))
 
+    # 生成済みタスクは残し、テンプレートとの紐付けのみ解除（SQLiteでは ON DELETE SET NULL が効かないため明示的に実行）
+    Task.query.filter_by(template_id=template.id).update(
+        {Task.template_id: None}, synchronize_session=False
+    )
     db.session.delete(template)
     db.session.commit()
 
@@ -4171,7 +4056,7 @@ def _get_personal_task_card_context(node_id):
     active_tasks = [task for task in tasks if not task.completed]
     completed_tasks = [task for task in tasks if task.completed]
 
-    _update_task_card_progress(node.id)
+    update_task_card_progress(node.id)
     db.session.commit()
 
     return {
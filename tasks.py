@@ -6,6 +6,75 @@ from zoneinfo import ZoneInfo
 
 tasks = Blueprint('tasks', __name__)
 
+COMPLETED_LIST_LIMIT = 200
+
+# 一覧の表示に使う列（それ以外の列は読み込まない）
+_LIST_COLUMNS = (
+    'id', 'title', 'description', 'completed', 'completed_at', 'end_date', 'priority', 'category',
+    'order_index', 'is_tracking', 'total_seconds', 'task_card_node_id'
+)
+
+
+def _load_task_lists(user_id, today):
+    """
+    タスク一覧の「本日」「明日」「その他」「完了済み」を1クエリで取得して振り分ける
+    - 完了済みは完了日時の新しい順に COMPLETED_LIST_LIMIT 件（ROW_NUMBER で件数を絞る）
+    - 本日のタスクのうち、前日以前に完了したものは除外する
+    - 一覧に必要な列と、カード・マインドマップとの連携の有無（ノードの ID のみ）を同じクエリで読み込む
+    - セッション全体を expire せず、読み込んだタスクだけを DB の値で上書きする（populate_existing）
+    戻り値: (today_tasks, tomorrow_tasks, other_tasks, completed_tasks)
+    """
+    from sqlalchemy.orm import aliased, joinedload, load_only
+
+    day_start = datetime.combine(today, datetime.min.time())
+    is_done = db.and_(Task.completed == True, Task.completed_at.isnot(None))
+    ranked = db.select(
+        Task,
+        db.func.row_number().over(
+            partition_by=is_done,
+            order_by=(Task.completed_at.desc(), Task.id.desc())
+        ).label('completed_rank')
+    ).where(
+        Task.user_id == user_id,
+        Task.archived == False
+    ).subquery()
+    task = aliased(Task, ranked)
+
+    in_today = db.and_(
+        task.category == 'today',
+        db.or_(task.completed == False, task.completed_at.is_(None), task.completed_at >= day_start)
+    )
+    in_open = db.and_(task.category.in_(('tomorrow', 'other')), task.completed == False)
+    in_completed = db.and_(
+        task.completed == True,
+        task.completed_at.isnot(None),
+        ranked.c.completed_rank <= COMPLETED_LIST_LIMIT
+    )
+
+    rows = db.session.query(task, ranked.c.completed_rank).options(
+        load_only(*[getattr(task, name) for name in _LIST_COLUMNS]),
+        joinedload(task.task_card_node).load_only(MindmapNode.id),
+        joinedload(task.mindmap_node).load_only(MindmapNode.id)
+    ).filter(
+        db.or_(in_today, in_open, in_completed)
+    ).order_by(task.order_index, task.id).populate_existing().all()
+
+    lists = {'today': [], 'tomorrow': [], 'other': []}
+    completed_tasks = []
+    for row_task, completed_rank in rows:
+        done = row_task.completed and row_task.completed_at is not None
+        if row_task.category == 'today':
+            if not (done and row_task.completed_at < day_start):
+                lists['today'].append(row_task)
+        elif row_task.category in lists and not row_task.completed:
+            lists[row_task.category].append(row_task)
+        if done and completed_rank <= COMPLETED_LIST_LIMIT:
+            completed_tasks.append(row_task)
+    completed_tasks.sort(key=lambda item: (item.completed_at, item.id), reverse=True)
+
+    return lists['today'], lists['tomorrow'], lists['other'], completed_tasks
+
+
 @tasks.route('/tasks')
 @login_required
 def list_tasks():
@@ -24,41 +93,10 @@ def list_tasks():
     # 日次の自動処理は実行しない
     # 理由: タスク移動後に日次処理を実行すると、「明日のタスク」が「本日のタスク」に移動してしまい、
     # ユーザーが移動したタスクが戻ってしまうため
-    # 日次処理はダッシュボードで実行される
-    
-    # 分類別にタスクを取得（アーカイブ済みは除外）
-    # データベースから最新の状態を取得（キャッシュを回避）
-    db.session.expire_all()  # セッションのキャッシュをクリア
-    today_tasks_all = Task.query.filter(
-        Task.user_id == current_user.id,
-        Task.category == 'today',
-        Task.archived == False
-    ).order_by(Task.order_index).all()
-    today_tasks = []
-    for task in today_tasks_all:
-        if task.completed and task.completed_at:
-            if task.completed_at.date() < today:
-                continue
-        today_tasks.append(task)
-    tomorrow_tasks = Task.query.filter(
-        Task.user_id == current_user.id,
-        Task.category == 'tomorrow',
-        Task.archived == False,
-        Task.completed == False
-    ).order_by(Task.order_index).all()
-    other_tasks = Task.query.filter(
-        Task.user_id == current_user.id,
-        Task.category == 'other',
-        Task.archived == False,
-        Task.completed == False
-    ).order_by(Task.order_index).all()
-
-    completed_tasks = Task.query.filter(
-        Task.user_id == current_user.id,
-        Task.completed == True,
-        Task.archived == False,
-        Task.completed_at.isnot(None)
-    ).order_by(Task.completed_at.desc()).limit(200).all()
+    # 日次処理は 0時のバッチ（flask atd rollover / スケジューラー）で実行される
+    
+    # 分類別のタスクと完了済みタスクを1クエリで取得（アーカイブ済みは除外）
+    today_tasks, tomorrow_tasks, other_tasks, completed_tasks = _load_task_lists(current_user.id, today)
 
     completed_tasks_by_date = OrderedDict()
     for task in completed_tasks:
@@ -151,7 +189,7 @@ def create_task():
         
         # パフォーマンスデータを更新
         from models import UserPerformance
-        UserPerformance.update_daily_performance(current_user.id)
+        UserPerformance.sync_daily_performance(current_user.id)
         
         flash('タスクを作成しました', 'success')
         return redirect(url_for('tasks.list_tasks'))
@@ -277,7 +315,7 @@ def mobile_create_task():
         db.session.commit()
 
         from models import UserPerformance
-        UserPerformance.update_daily_performance(current_user.id)
+        UserPerformance.sync_daily_performance(current_user.id)
 
         flash('タスクを作成しました', 'success')
         return redirect(url_for('main.mobile_tasks'))
@@ -452,7 +490,7 @@ def import_csv():
         
         # パフォーマンスデータを更新
         from models import UserPerformance
-        UserPerformance.update_daily_performance(current_user.id)
+        UserPerformance.sync_daily_performance(current_user.id)
         
         if errors:
             return jsonify({
@@ -546,8 +584,8 @@ def delete_task(task_id):
     db.session.commit()
     
     if card_node_id:
-        from routes import _update_task_card_progress
-        _update_task_card_progress(card_node_id)
+        from mindmap_progress import update_task_card_progress
+        update_task_card_progress(card_node_id)
         db.session.commit()
     
     flash('タスクを削除しました', 'success')
@@ -584,7 +622,7 @@ def toggle_task(task_id):
     
     # チームタスクと紐付いている場合、TaskAssigneeを更新
     if task.team_task_id:
-        from models import TaskAssignee, TeamTask, MindmapNode
+        from models import TaskAssignee, TeamTask
         task_assignee = TaskAssignee.query.filter_by(
             team_task_id=task.team_task_id,
             user_id=current_user.id
@@ -599,22 +637,15 @@ def toggle_task(task_id):
             completion_rate = team_task.calculate_completion_rate()
             team_task.completed = (completion_rate == 100)
             team_task.updated_at = datetime.utcnow()
-            
-            # 親ノードの進捗率を更新
-            if team_task.parent_node_id:
-                parent_node = MindmapNode.query.get(team_task.parent_node_id)
-                if parent_node:
-                    parent_node.progress = parent_node.calculate_progress()
-                    db.session.add(parent_node)
 
     if task.task_card_node_id:
-        from routes import _update_task_card_progress
-        _update_task_card_progress(task.task_card_node_id)
+        from mindmap_progress import update_task_card_progress
+        update_task_card_progress(task.task_card_node_id)
 
     db.session.commit()
     
     # パフォーマンスデータを更新
-    UserPerformance.update_daily_performance(current_user.id)
+    UserPerformance.sync_daily_performance(current_user.id)
     
     flash(f'タスクを{"完了" if task.completed else "未完了"}に変更しました', 'success')
     
@@ -673,11 +704,11 @@ def create_task_card(task_id):
     db.session.flush()
     task.task_card_node_id = new_node.id
     
-    from routes import _update_task_card_progress
-    _update_task_card_progress(new_node.id)
+    from mindmap_progress import update_task_card_progress
+    update_task_card_progress(new_node.id)
     db.session.commit()
     
-    UserPerformance.update_daily_performance(current_user.id)
+    UserPerformance.sync_daily_performance(current_user.id)
     
     return jsonify({
         'success': True,
@@ -800,7 +831,7 @@ def toggle_tracking(task_id):
     
     # パフォーマンスデータを更新（計測停止時のみ）
     if not task.is_tracking:
-        UserPerformance.update_daily_performance(current_user.id)
+        UserPerformance.sync_daily_performance(current_user.id)
     
     response = {
         'success': True,
@@ -964,7 +995,7 @@ def bulk_delete_tasks():
             if task and task.user_id == current_user.id:
                 # チームタスクと紐付いている場合、TaskAssigneeを更新
                 if task.team_task_id:
-                    from models import TaskAssignee, TeamTask, MindmapNode
+                    from models import TaskAssignee, TeamTask
                     task_assignee = TaskAssignee.query.filter_by(
                         team_task_id=task.team_task_id,
                         user_id=current_user.id
@@ -978,12 +1009,6 @@ def bulk_delete_tasks():
                         completion_rate = team_task.calculate_completion_rate()
                         team_task.completed = (completion_rate == 100)
                         team_task.updated_at = datetime.utcnow()
-                        
-                        # 親ノードの進捗率を更新
-                        if team_task.parent_node_id:
-                            parent_node = MindmapNode.query.get(team_task.parent_node_id)
-                            if parent_node:
-                                parent_node.progress = parent_node.calculate_progress()
                 
                 db.session.delete(task)
                 deleted_count += 1
@@ -993,7 +1018,7 @@ def bulk_delete_tasks():
     db.session.commit()
     
     # パフォーマンスデータを更新
-    UserPerformance.update_daily_performance(current_user.id)
+    UserPerformance.sync_daily_performance(current_user.id)
     
     return jsonify({
         'success': True,
@@ -1006,7 +1031,7 @@ def bulk_delete_tasks():
 @login_required
 def bulk_complete_tasks():
     """タスクの一括完了/未完了更新"""
-    from models import UserPerformance, TaskAssignee, TeamTask, MindmapNode
+    from models import UserPerformance, TaskAssignee, TeamTask
     from datetime import datetime
     
     payload = request.get_json() or {}
@@ -1080,12 +1105,6 @@ def bulk_complete_tasks():
                     team_task.completed = (completion_rate == 100)
                     team_task.updated_at = datetime.utcnow()
     
-                    if team_task.parent_node_id:
-                        parent_node = MindmapNode.query.get(team_task.parent_node_id)
-                        if parent_node:
-                            parent_node.progress = parent_node.calculate_progress()
-                            db.session.add(parent_node)
-    
             if task.task_card_node_id:
                 affected_card_ids.add(task.task_card_node_id)
     
@@ -1098,12 +1117,12 @@ def bulk_complete_tasks():
         return jsonify({'success': False, 'message': f'更新に失敗しました: {str(exc)}'}), 500
     
     if affected_card_ids:
-        from routes import _update_task_card_progress
+        from mindmap_progress import update_task_card_progress
         for card_id in affected_card_ids:
-            _update_task_card_progress(card_id)
+            update_task_card_progress(card_id)
     
     if updated_count > 0:
-        UserPerformance.update_daily_performance(current_user.id)
+        UserPerformance.sync_daily_performance(current_user.id)
     
     if updated_count == 0:
         return jsonify({'success': True, 'message': '指定したタスクは既に同じ状態です', 'updated_count': 0})
@@ -1221,7 +1240,7 @@ def copy_task(task_id):
     db.session.add(new_task)
     db.session.commit()
 
-    UserPerformance.update_daily_performance(current_user.id)
+    UserPerformance.sync_daily_performance(current_user.id)
 
     return jsonify({
         'success': True,
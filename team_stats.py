@@ -0,0 +1,192 @@
+"""
+チームの統計（タスク数・完了数・メンバー数・権限）をまとめて取得するモジュール
+- チーム数に関係なく、チームタスクの集計とメンバーの集計をそれぞれ GROUP BY team_id の1クエリで取得する
+- 選択したチームのメンバーの個人タスクも GROUP BY user_id の1クエリで集計する
+- メンバー別の担当チームタスク数・個人タスク数は、メンバー・チームタスク・個人タスクそれぞれの
+  GROUP BY を UNION ALL でまとめた1クエリで取得する（タスク件数に比例して行を読み込まない）
+"""
+from datetime import datetime, timedelta
+
+
+def _rate(completed, total):
+    return (completed / total * 100) if total > 0 else 0
+
+
+def get_team_stats(team_ids, user_id, is_system_admin=False):
+    """
+    指定チームの統計を返す
+    戻り値: {team_id: {'total', 'completed', 'completion_rate', 'member_count', 'role', 'is_admin'}}
+    - role: user_id のチーム内での役割（メンバーでない場合は None）
+    - is_admin: チーム管理者またはシステム管理者
+    """
+    from models import TeamTask, TeamMember, db
+
+    team_ids = list(team_ids)
+    stats = {
+        team_id: {
+            'total': 0,
+            'completed': 0,
+            'completion_rate': 0,
+            'member_count': 0,
+            'role': None,
+            'is_admin': bool(is_system_admin)
+        } for team_id in team_ids
+    }
+    if not team_ids:
+        return stats
+
+    # チームタスク数・完了数（期間フィルタなし）
+    task_rows = db.session.query(
+        TeamTask.team_id,
+        db.func.count(TeamTask.id),
+        db.func.sum(db.case((TeamTask.completed == True, 1), else_=0))
+    ).filter(
+        TeamTask.team_id.in_(team_ids)
+    ).group_by(TeamTask.team_id).all()
+
+    for team_id, total, completed in task_rows:
+        entry = stats[team_id]
+        entry['total'] = total
+        entry['completed'] = int(completed or 0)
+        entry['completion_rate'] = _rate(entry['completed'], total)
+
+    # メンバー数と、呼び出し元ユーザーの役割
+    member_rows = db.session.query(
+        TeamMember.team_id,
+        db.func.count(TeamMember.id),
+        db.func.max(db.case((TeamMember.user_id == user_id, TeamMember.role), else_=None))
+    ).filter(
+        TeamMember.team_id.in_(team_ids)
+    ).group_by(TeamMember.team_id).all()
+
+    for team_id, member_count, role in member_rows:
+        entry = stats[team_id]
+        entry['member_count'] = member_count
+        entry['role'] = role
+        entry['is_admin'] = role == 'admin' or bool(is_system_admin)
+
+    return stats
+
+
+def summarize_team_stats(stats):
+    """複数チームの統計の合計（タスク数・完了数・進捗率）"""
+    total = sum(entry['total'] for entry in stats.values())
+    completed = sum(entry['completed'] for entry in stats.values())
+    return {
+        'total': total,
+        'completed': completed,
+        'completion_rate': _rate(completed, total)
+    }
+
+
+def get_member_task_breakdown(team_id, include_archived=False):
+    """
+    チームメンバーの個人タスク（Task）の件数をメンバー別に集計（1クエリ）
+    戻り値: {'members': {user_id: {'total', 'completed', 'completion_rate'}}, 'total', 'completed', 'completion_rate'}
+    - タスクが無いメンバーも 0 件として含める
+    """
+    from models import Task, TeamMember, db
+
+    join_condition = Task.user_id == TeamMember.user_id
+    if not include_archived:
+        join_condition = db.and_(join_condition, Task.archived == False)
+
+    rows = db.session.query(
+        TeamMember.user_id,
+        db.func.count(Task.id),
+        db.func.sum(db.case((Task.completed == True, 1), else_=0))
+    ).outerjoin(
+        Task, join_condition
+    ).filter(
+        TeamMember.team_id == team_id
+    ).group_by(TeamMember.user_id).all()
+
+    members = {}
+    for member_user_id, total, completed in rows:
+        completed = int(completed or 0)
+        members[member_user_id] = {
+            'total': total,
+            'completed': completed,
+            'completion_rate': _rate(completed, total)
+        }
+
+    total = sum(entry['total'] for entry in members.values())
+    completed = sum(entry['completed'] for entry in members.values())
+    return {
+        'members': members,
+        'total': total,
+        'completed': completed,
+        'completion_rate': _rate(completed, total)
+    }
+
+
+def _created_between(column, start_date, end_date):
+    """作成日時が start_date〜end_date の範囲（インデックスを使えるよう日付の範囲条件にする）"""
+    filters = []
+    if start_date is not None:
+        filters.append(column >= datetime.combine(start_date, datetime.min.time()))
+    if end_date is not None:
+        filters.append(column < datetime.combine(end_date + timedelta(days=1), datetime.min.time()))
+    return filters
+
+
+def get_member_rollup(team_id, start_date=None, end_date=None, include_archived=False):
+    """
+    チームメンバー別の担当チームタスク数と個人タスク数（1クエリ）
+    - start_date / end_date を指定した場合は、その期間に作成されたタスクだけを数える
+    戻り値: {user_id: {'assigned', 'assigned_completed', 'assigned_rate',
+                       'personal_total', 'personal_completed', 'personal_rate'}}
+    - 担当チームタスクは TeamTask.assigned_to、個人タスクはアーカイブ済みを除く（include_archived で含める）
+    - タスクが無いメンバーも 0 件として含める
+    """
+    from models import Task, TeamMember, TeamTask, db
+
+    zero = db.literal(0)
+    member_ids = db.select(TeamMember.user_id).where(TeamMember.team_id == team_id)
+
+    members = db.select(
+        TeamMember.user_id.label('user_id'),
+        zero.label('assigned'), zero.label('assigned_completed'),
+        zero.label('personal_total'), zero.label('personal_completed')
+    ).where(TeamMember.team_id == team_id)
+
+    assigned = db.select(
+        TeamTask.assigned_to.label('user_id'),
+        db.func.count(TeamTask.id).label('assigned'),
+        db.func.sum(db.case((TeamTask.completed == True, 1), else_=0)).label('assigned_completed'),
+        zero.label('personal_total'), zero.label('personal_completed')
+    ).where(
+        TeamTask.team_id == team_id,
+        TeamTask.assigned_to.in_(member_ids),
+        *_created_between(TeamTask.created_at, start_date, end_date)
+    ).group_by(TeamTask.assigned_to)
+
+    personal_filters = [Task.user_id.in_(member_ids)]
+    if not include_archived:
+        personal_filters.append(Task.archived == False)
+    personal = db.select(
+        Task.user_id.label('user_id'),
+        zero.label('assigned'), zero.label('assigned_completed'),
+        db.func.count(Task.id).label('personal_total'),
+        db.func.sum(db.case((Task.completed == True, 1), else_=0)).label('personal_completed')
+    ).where(
+        *personal_filters,
+        *_created_between(Task.created_at, start_date, end_date)
+    ).group_by(Task.user_id)
+
+    rollup = {}
+    for user_id, *values in db.session.execute(db.union_all(members, assigned, personal)).all():
+        entry = rollup.setdefault(user_id, [0, 0, 0, 0])
+        for i, value in enumerate(values):
+            entry[i] += int(value or 0)
+
+    return {
+        user_id: {
+            'assigned': assigned_count,
+            'assigned_completed': assigned_completed,
+            'assigned_rate': _rate(assigned_completed, assigned_count),
+            'personal_total': personal_total,
+            'personal_completed': personal_completed,
+            'personal_rate': _rate(personal_completed, personal_total)
+        } for user_id, (assigned_count, assigned_completed, personal_total, personal_completed) in rollup.items()
+    }
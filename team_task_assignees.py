@@ -0,0 +1,149 @@
+"""
+チームタスクの担当者の変更（差分の一括反映）
+- 現在の担当者を1クエリで読み込み、追加・削除・継続する担当者を求める
+- (team_task_id, user_id) をキーに、種類ごとに1文でまとめて反映する（担当者ごとにクエリを発行しない）
+  - 追加: task_assignees と個人タスクを executemany で INSERT
+  - 削除: 個人タスクと task_assignees を DELETE ... WHERE team_task_id = :id AND user_id IN (...)
+  - 継続: 個人タスクのタイトル・期日などを UPDATE 1文で更新
+- ORM を経由しないため、セッションのリスナーで行っている処理をここで明示的に行う
+  - 担当者数（team_task_counters）、ノードの達成度（mindmap_progress）、リビジョン（mindmap_sync）
+  - 個人タスクの UserPerformance（performance_tracker）、スナップショットキャッシュの破棄
+"""
+from datetime import datetime
+
+PERSONAL_TASK_FIELDS = ('title', 'description', 'start_date', 'end_date', 'priority')
+
+
+def apply_assignee_changes(team_task, user_ids, personal_values):
+    """
+    team_task の担当者を user_ids に合わせる（commit は呼び出し元で行う）
+    - personal_values: 担当者の個人タスクに設定する値（PERSONAL_TASK_FIELDS）
+      追加した担当者の個人タスクは この値で作成し、継続する担当者の個人タスクは この値で更新する
+    戻り値: {'added': [(user_id, 個人タスクID), ...], 'removed': [user_id, ...], 'kept': [user_id, ...]}
+    """
+    from models import Mindmap, MindmapNode, TeamTask, TaskAssignee, Task, db
+    from team_task_counters import recompute_team_task_counters
+    from mindmap_progress import propagate_bulk_changes
+    from mindmap_sync import bump_revisions
+    from performance_tracker import apply_created_tasks, apply_deleted_tasks
+    from cache import invalidate_users_on_commit
+    from sqlalchemy import inspect as sa_inspect
+
+    session = db.session
+    session.flush()
+    connection = session.connection()
+    nodes = MindmapNode.__table__
+    assignees = TaskAssignee.__table__
+    tasks = Task.__table__
+    team_task_id = team_task.id
+    values = {name: personal_values.get(name) for name in PERSONAL_TASK_FIELDS}
+    now = datetime.utcnow()
+
+    existing_user_ids = {
+        row[0] for row in connection.execute(
+            db.select(assignees.c.user_id).where(assignees.c.team_task_id == team_task_id)
+        )
+    }
+    user_ids = set(user_ids)
+    to_add = sorted(user_ids - existing_user_ids)
+    to_remove = sorted(existing_user_ids - user_ids)
+    kept = sorted(existing_user_ids & user_ids)
+    result = {'added': [], 'removed': to_remove, 'kept': kept}
+
+    changed_node_ids = set()
+    removed_rows = []
+    removed_ids = set()
+
+    # 削除する担当者（個人タスクにリンクしているノードはリンクを外す）
+    if to_remove:
+        removed_rows = connection.execute(
+            db.select(tasks.c.id, tasks.c.task_card_node_id, tasks.c.user_id, tasks.c.created_at, tasks.c.completed,
+                      tasks.c.completed_at, tasks.c.archived, tasks.c.total_seconds).where(
+                tasks.c.team_task_id == team_task_id,
+                tasks.c.user_id.in_(to_remove)
+            )
+        ).all()
+        removed_ids = {row.id for row in removed_rows}
+        if removed_ids:
+            changed_node_ids.update(row.task_card_node_id for row in removed_rows)
+            changed_node_ids.update(
+                row[0] for row in connection.execute(db.select(nodes.c.id).where(nodes.c.task_id.in_(removed_ids)))
+            )
+            connection.execute(nodes.update().where(nodes.c.task_id.in_(removed_ids)).values(task_id=None))
+            connection.execute(tasks.delete().where(tasks.c.id.in_(removed_ids)))
+        connection.execute(assignees.delete().where(
+            assignees.c.team_task_id == team_task_id,
+            assignees.c.user_id.in_(to_remove)
+        ))
+
+    # 追加する担当者
+    if to_add:
+        connection.execute(assignees.insert(), [
+            {'team_task_id': team_task_id, 'user_id': user_id, 'completed': False, 'created_at': now}
+            for user_id in to_add
+        ])
+        connection.execute(tasks.insert(), [
+            dict(values, user_id=user_id, category='other', team_task_id=team_task_id,
+                 created_at=now, updated_at=now)
+            for user_id in to_add
+        ])
+        result['added'] = [
+            (row.user_id, row.id) for row in connection.execute(
+                db.select(tasks.c.id, tasks.c.user_id).where(
+                    tasks.c.team_task_id == team_task_id,
+                    tasks.c.user_id.in_(to_add)
+                ).order_by(tasks.c.user_id, tasks.c.id)
+            )
+        ]
+
+    # 継続する担当者の個人タスク
+    if kept:
+        connection.execute(tasks.update().where(
+            tasks.c.team_task_id == team_task_id,
+            tasks.c.user_id.in_(kept)
+        ).values(updated_at=now, **values))
+
+    # 担当者数とノードの達成度（サブタスクの親ノード・リンクしているタスクノードから親方向）
+    if to_add or to_remove:
+        recompute_team_task_counters([team_task_id], connection=connection)
+        start_ids = {team_task.parent_node_id}
+        start_ids.update(
+            row[0] for row in connection.execute(db.select(nodes.c.id).where(nodes.c.team_task_id == team_task_id))
+        )
+        changed_node_ids.update(propagate_bulk_changes(start_ids, (), connection=connection))
+
+    changed_node_ids.discard(None)
+    changed = {}
+    if changed_node_ids:
+        for node_id, mindmap_id in connection.execute(
+            db.select(nodes.c.id, nodes.c.mindmap_id).where(nodes.c.id.in_(changed_node_ids))
+        ):
+            changed.setdefault(mindmap_id, set()).add(node_id)
+        bump_revisions(connection, changed)
+
+    # 削除した行をセッションから外し、DB 側で更新した値は次回アクセス時に読み直す
+    # （削除済みの行を読み込まないよう、読み込み済みの値だけを見る）
+    for obj in list(session.identity_map.values()):
+        state = sa_inspect(obj)
+        if isinstance(obj, Task) and state.dict.get('team_task_id') == team_task_id:
+            if state.identity[0] in removed_ids:
+                session.expunge(obj)
+            else:
+                session.expire(obj)
+        elif isinstance(obj, TaskAssignee) and state.dict.get('team_task_id') == team_task_id:
+            if state.dict.get('user_id') in to_remove:
+                session.expunge(obj)
+        elif isinstance(obj, TeamTask) and state.identity[0] == team_task_id:
+            session.expire(obj, ['assignee_count', 'completed_assignee_count', 'assignees_rel'])
+        elif isinstance(obj, MindmapNode) and state.identity[0] in changed_node_ids:
+            session.expire(obj, ['progress', 'revision', 'task_id'])
+        elif isinstance(obj, Mindmap) and state.identity[0] in changed:
+            session.expire(obj, ['revision', 'progress', 'leaf_count', 'leaf_progress_sum'])
+
+    # UserPerformance とスナップショットキャッシュ
+    apply_deleted_tasks([tuple(row)[2:] for row in removed_rows], connection=connection)
+    apply_created_tasks([(user_id, now, False, None, False, 0) for user_id, _ in result['added']],
+                        connection=connection)
+    invalidate_users_on_commit(session, set(to_add) | set(to_remove) | set(kept))
+
+    return result
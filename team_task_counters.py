@@ -0,0 +1,174 @@
+"""
+TeamTask の担当者数・完了済み担当者数（assignee_count / completed_assignee_count）の同期
+- TaskAssignee の追加・削除・完了状態の変更をセッションの flush で検知し、
+  同じトランザクション内で team_tasks に差分を加算する（UPDATE ... SET x = x + :delta）
+- 変更前の値が分からない場合は、その TeamTask の件数を task_assignees から数え直す
+- ORM を経由しない一括更新の後やずれの補正には `flask atd repair-team-counters` を使う
+"""
+from sqlalchemy import event
+
+_PENDING_KEY = 'team_task_counter_deltas'
+_EXPIRE_KEY = 'team_task_counter_expire'
+_COUNTER_FIELDS = ['assignee_count', 'completed_assignee_count']
+
+_registered = False
+
+
+def _add(deltas, team_task_id, count, completed):
+    if team_task_id is None:
+        return
+    entry = deltas.setdefault(team_task_id, [0, 0])
+    if entry is not None:
+        entry[0] += count
+        entry[1] += completed
+
+
+def _collect_deltas(session, flush_context, instances):
+    """flush 前の状態から担当者数の差分を計算して session.info に保持"""
+    from models import TaskAssignee
+    from sqlalchemy import inspect as sa_inspect
+
+    session.info.pop(_PENDING_KEY, None)
+    deltas = {}
+
+    for obj in session.new:
+        if isinstance(obj, TaskAssignee):
+            _add(deltas, obj.team_task_id, 1, 1 if obj.completed else 0)
+
+    for obj in session.dirty:
+        if not isinstance(obj, TaskAssignee):
+            continue
+        state = sa_inspect(obj)
+        task_history = state.attrs.team_task_id.history
+        completed_history = state.attrs.completed.history
+        if not task_history.has_changes() and not completed_history.has_changes():
+            continue
+        old_task_id = task_history.deleted[0] if task_history.deleted else obj.team_task_id
+        if completed_history.has_changes() and not completed_history.deleted:
+            # 変更前の値が分からない場合は数え直す
+            deltas[old_task_id] = None
+            deltas[obj.team_task_id] = None
+            continue
+        old_completed = completed_history.deleted[0] if completed_history.deleted else obj.completed
+        _add(deltas, old_task_id, -1, -1 if old_completed else 0)
+        _add(deltas, obj.team_task_id, 1, 1 if obj.completed else 0)
+
+    for obj in session.deleted:
+        if isinstance(obj, TaskAssignee):
+            values = sa_inspect(obj).dict
+            team_task_id = values.get('team_task_id')
+            if 'completed' not in values:
+                if team_task_id is not None:
+                    deltas[team_task_id] = None
+                continue
+            _add(deltas, team_task_id, -1, -1 if values['completed'] else 0)
+
+    deltas = {key: values for key, values in deltas.items() if key is not None and values != [0, 0]}
+    if deltas:
+        session.info[_PENDING_KEY] = deltas
+
+
+def _apply_deltas(session, flush_context):
+    """flush 後に、同じトランザクション内で差分を team_tasks に反映"""
+    deltas = session.info.pop(_PENDING_KEY, None)
+    if not deltas:
+        return
+
+    from models import TeamTask
+
+    connection = session.connection()
+    recount_ids = []
+    for team_task_id, values in deltas.items():
+        if values is None:
+            recount_ids.append(team_task_id)
+            continue
+        connection.execute(
+            TeamTask.__table__.update().where(TeamTask.__table__.c.id == team_task_id).values(
+                assignee_count=TeamTask.__table__.c.assignee_count + values[0],
+                completed_assignee_count=TeamTask.__table__.c.completed_assignee_count + values[1]
+            )
+        )
+    if recount_ids:
+        recompute_team_task_counters(recount_ids, connection=connection)
+
+    session.info.setdefault(_EXPIRE_KEY, set()).update(deltas)
+
+
+def _expire_counters(session, flush_context):
+    """DB 側で更新したカウンターを、読み込み済みの TeamTask から破棄（次回アクセス時に再取得）"""
+    team_task_ids = session.info.pop(_EXPIRE_KEY, None)
+    if not team_task_ids:
+        return
+
+    from models import TeamTask
+
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, TeamTask) and obj.id in team_task_ids:
+            session.expire(obj, _COUNTER_FIELDS)
+
+
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_EXPIRE_KEY, None)
+
+
+def has_pending_assignee_changes(session):
+    """未 flush の TaskAssignee の変更があるか"""
+    from models import TaskAssignee
+
+    return any(
+        isinstance(obj, TaskAssignee)
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+    )
+
+
+def recompute_team_task_counters(team_task_ids=None, connection=None):
+    """
+    task_assignees から担当者数・完了済み担当者数を数え直して team_tasks を更新
+    - team_task_ids を省略した場合は全件
+    戻り値: 値がずれていて更新した行数
+    """
+    from models import TeamTask, TaskAssignee, db
+
+    team_tasks = TeamTask.__table__
+    assignees = TaskAssignee.__table__
+    assignee_count = db.select(db.func.count(assignees.c.id)).where(
+        assignees.c.team_task_id == team_tasks.c.id
+    ).scalar_subquery()
+    completed_count = db.select(db.func.count(assignees.c.id)).where(
+        assignees.c.team_task_id == team_tasks.c.id,
+        assignees.c.completed == True
+    ).scalar_subquery()
+
+    statement = team_tasks.update().values(
+        assignee_count=assignee_count,
+        completed_assignee_count=completed_count
+    ).where(
+        db.or_(
+            team_tasks.c.assignee_count != assignee_count,
+            team_tasks.c.completed_assignee_count != completed_count,
+            team_tasks.c.assignee_count.is_(None),
+            team_tasks.c.completed_assignee_count.is_(None)
+        )
+    )
+    if team_task_ids is not None:
+        team_task_ids = list(team_task_ids)
+        if not team_task_ids:
+            return 0
+        statement = statement.where(team_tasks.c.id.in_(team_task_ids))
+
+    if connection is None:
+        connection = db.session.connection()
+    return connection.execute(statement).rowcount
+
+
+def register_team_task_counter_listeners(session):
+    """セッションに担当者数同期用のイベントリスナーを登録（1回のみ）"""
+    global _registered
+    if _registered:
+        return
+    event.listen(session, 'before_flush', _collect_deltas)
+    event.listen(session, 'after_flush', _apply_deltas)
+    event.listen(session, 'after_flush_postexec', _expire_counters)
+    event.listen(session, 'after_rollback', _discard_pending)
+    _registered = True
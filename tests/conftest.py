@@ -0,0 +1,62 @@
+"""
+テスト共通の設定
+- メモリ上の SQLite でアプリを作成し、起動時に作成されるユーザー（テスト/1234）でログインする
+- before_cursor_execute で発行された SQL 文を記録し、リクエストごとのクエリ数を確認する
+"""
+import os
+import sys
+
+import pytest
+from sqlalchemy import event
+
+# config は読み込み時に DATABASE_URL を参照するため、アプリの読み込み前に設定する
+os.environ['DATABASE_URL'] = 'sqlite://'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from config import Config  # noqa: E402
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+@pytest.fixture
+def app():
+    from cache import snapshot_cache, unread_counter
+    from models import db
+
+    app = create_app(TestConfig)
+    # キャッシュはアプリをまたいで共有されるため、前のテストの値を消しておく
+    snapshot_cache.clear()
+    unread_counter.clear()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    response = client.post('/auth/login', data={'username': 'テスト', 'password': '1234'})
+    assert response.status_code == 302
+    return client
+
+
+@pytest.fixture
+def statements(app):
+    """発行された SQL 文の一覧（テスト中に clear() して区間ごとに数える）"""
+    from models import db
+
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', record)
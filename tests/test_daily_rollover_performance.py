@@ -0,0 +1,48 @@
+"""日次処理のアーカイブと UserPerformance の増分更新"""
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import create_app
+from conftest import TestConfig
+from models import Task, User, UserPerformance, db
+
+TODAY = date(2025, 1, 10)
+
+
+class IncrementalConfig(TestConfig):
+    PERFORMANCE_INCREMENTAL = True
+
+
+@pytest.fixture
+def incremental_app():
+    app = create_app(IncrementalConfig)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_archiving_matches_recompute(incremental_app):
+    from daily_processor import process_daily_rollover
+
+    with incremental_app.app_context():
+        user = User.query.filter_by(username='テスト').first()
+        user.last_rollover_date = TODAY - timedelta(days=1)
+        user_id = user.id
+        completed_day = TODAY - timedelta(days=5)
+        completed_at = datetime.combine(completed_day, datetime.min.time()) + timedelta(hours=9)
+        db.session.add(Task(
+            title='done', user_id=user_id, priority='medium', category='today',
+            start_date=completed_day, end_date=completed_day,
+            created_at=completed_at, updated_at=completed_at,
+            completed=True, completed_at=completed_at, total_seconds=600
+        ))
+        db.session.commit()
+
+        process_daily_rollover(user_id, today=TODAY)
+        assert Task.query.filter_by(title='done').first().archived
+
+        stored = UserPerformance.query.filter_by(user_id=user_id, date=completed_day).first().total_work_seconds
+        recomputed = UserPerformance.update_daily_performance(user_id, completed_day).total_work_seconds
+        assert stored == recomputed == 0
@@ -0,0 +1,44 @@
+"""ダッシュボードのクエリ数（スナップショットキャッシュが無い場合の上限）"""
+from cache import snapshot_cache
+
+# タスク一覧・サマリー・レポート系列・通知・チームなど、キャッシュが無い場合に発行する SQL 文の上限
+DASHBOARD_STATEMENT_BUDGET = 11
+
+
+def _create_tasks(client, count, prefix='task'):
+    for index in range(count):
+        response = client.post('/tasks/create', data={
+            'title': f'{prefix} {index}',
+            'start_date': '2025-01-01',
+            'end_date': '2025-01-01',
+            'priority': ('high', 'medium', 'low')[index % 3],
+            'category': ('today', 'tomorrow', 'other')[index % 3]
+        })
+        assert response.status_code == 302
+
+
+def _dashboard_statements(client, statements):
+    snapshot_cache.clear()
+    statements.clear()
+    response = client.get('/dashboard')
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_dashboard_statement_budget(client, statements):
+    _create_tasks(client, 6)
+    # その日の最初のリクエストで行う日次処理を済ませておく
+    client.get('/dashboard')
+
+    assert _dashboard_statements(client, statements) == DASHBOARD_STATEMENT_BUDGET
+
+
+def test_dashboard_statements_do_not_grow_with_tasks(client, statements):
+    _create_tasks(client, 3)
+    client.get('/dashboard')
+    few = _dashboard_statements(client, statements)
+
+    _create_tasks(client, 30, prefix='more')
+    many = _dashboard_statements(client, statements)
+
+    assert few == many
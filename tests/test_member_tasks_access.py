@@ -0,0 +1,73 @@
+"""メンバーのタスク一覧（API）の権限と分類の絞り込み"""
+from models import Team, TeamMember, User, db
+
+
+def _user_id(app, username):
+    with app.app_context():
+        return User.query.filter_by(username=username).first().id
+
+
+def _create_team(client, app, name):
+    response = client.post('/team/create', data={'name': name, 'description': 'd'})
+    assert response.status_code == 302
+    with app.app_context():
+        return Team.query.filter_by(name=name).first().id
+
+
+def _add_member(app, team_id, user_id):
+    with app.app_context():
+        db.session.add(TeamMember(team_id=team_id, user_id=user_id, role='member'))
+        db.session.commit()
+
+
+def test_own_tasks(app, client):
+    user_id = _user_id(app, 'テスト')
+    response = client.get(f'/member/{user_id}/tasks?section=today')
+    assert response.status_code == 200
+
+
+def test_other_user_without_shared_team(app, client):
+    other_id = _user_id(app, '市村一貴')
+    response = client.get(f'/member/{other_id}/tasks?section=today')
+    assert response.status_code == 403
+
+    response = client.get(f'/member/{other_id}/detail')
+    assert response.status_code == 302
+
+
+def test_other_user_in_shared_team(app, client):
+    other_id = _user_id(app, '市村一貴')
+    team_id = _create_team(client, app, 'T1')
+    _add_member(app, team_id, other_id)
+
+    assert client.get(f'/member/{other_id}/tasks?section=today').status_code == 200
+    assert client.get(f'/member/{other_id}/tasks?section=today&team_id={team_id}').status_code == 200
+
+
+def test_team_id_of_team_the_user_is_not_in(app, client):
+    other_id = _user_id(app, '市村一貴')
+    shared_team_id = _create_team(client, app, 'T1')
+    _add_member(app, shared_team_id, other_id)
+    own_team_id = _create_team(client, app, 'T2')
+
+    response = client.get(f'/member/{other_id}/tasks?section=today&team_id={own_team_id}')
+    assert response.status_code == 403
+
+
+def test_team_section_uses_team_task_index(app):
+    from member_tasks import _section_filter, get_member_task_page
+    from models import Task
+
+    with app.app_context():
+        user_id = User.query.filter_by(username='テスト').first().id
+        query = Task.query.filter(
+            Task.user_id == user_id,
+            Task.archived == False,
+            _section_filter('team'),
+            Task.id > 0
+        ).order_by(Task.id).limit(21)
+        compiled = query.statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+        plan = ' '.join(str(row[-1]) for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {compiled}')))
+
+        assert 'ix_tasks_user_id_team_id' in plan
+        assert get_member_task_page(user_id, 'team') == ([], None)
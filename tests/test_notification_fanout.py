@@ -0,0 +1,26 @@
+"""通知の一括作成（重複の抑止）"""
+from models import Notification, User, db
+from notification_fanout import notification_fanout
+
+
+def _notify(user_id, personal_task_id, team_task_id):
+    return notification_fanout.notify(
+        [(user_id, personal_task_id)],
+        title='チームタスクが割り当てられました',
+        message='チーム「T1」からタスク「t」が割り当てられました。',
+        related_team_id=None,
+        related_team_task_id=team_task_id
+    )
+
+
+def test_assignment_notifications_coalesce_on_team_task(app):
+    with app.app_context():
+        user_id = User.query.filter_by(username='テスト').first().id
+
+        # 割り当て直すたびに個人タスクは新しく作成されるが、同じチームタスクなら1件だけ
+        assert _notify(user_id, 101, team_task_id=5) == 1
+        assert _notify(user_id, 102, team_task_id=5) == 0
+        assert _notify(user_id, 103, team_task_id=6) == 1
+        db.session.commit()
+
+        assert Notification.query.filter_by(user_id=user_id).count() == 2
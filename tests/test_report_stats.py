@@ -0,0 +1,47 @@
+"""期間レポートの日別統計（daily_task_rollups の利用）"""
+from datetime import date, datetime, timedelta
+
+from models import Task, User, db
+from report_stats import get_daily_series, get_report_series, refresh_daily_rollups
+
+TODAY = date(2025, 1, 10)
+
+
+def _add_task(user_id, title, day, completed=False):
+    created_at = datetime.combine(day, datetime.min.time()) + timedelta(hours=9)
+    db.session.add(Task(
+        title=title, user_id=user_id, priority='medium', category='other',
+        start_date=day, end_date=day, created_at=created_at, updated_at=created_at,
+        completed=completed, completed_at=created_at if completed else None, total_seconds=60
+    ))
+
+
+def test_idle_days_are_served_from_rollups(app, statements):
+    with app.app_context():
+        user_id = User.query.filter_by(username='テスト').first().id
+        # 1/2 と 1/4 だけ活動があり、1/3 と 1/5〜1/9 は活動の無い日
+        _add_task(user_id, 'a', date(2025, 1, 2), completed=True)
+        _add_task(user_id, 'b', date(2025, 1, 4))
+        db.session.commit()
+        refresh_daily_rollups(date(2025, 1, 1), TODAY - timedelta(days=1), user_ids=[user_id])
+        db.session.commit()
+
+        statements.clear()
+        series = get_report_series(user_id, date(2025, 1, 1), date(2025, 1, 9), today=TODAY)
+
+        assert len(statements) == 1
+        assert series == get_daily_series(user_id, date(2025, 1, 1), date(2025, 1, 9))
+
+
+def test_days_without_rollups_fall_back_to_tasks(app):
+    with app.app_context():
+        user_id = User.query.filter_by(username='テスト').first().id
+        _add_task(user_id, 'a', date(2025, 1, 2), completed=True)
+        _add_task(user_id, 'b', date(2025, 1, 8))
+        db.session.commit()
+        refresh_daily_rollups(date(2025, 1, 1), date(2025, 1, 5), user_ids=[user_id])
+        db.session.commit()
+
+        series = get_report_series(user_id, date(2025, 1, 1), date(2025, 1, 9), today=TODAY)
+
+        assert series == get_daily_series(user_id, date(2025, 1, 1), date(2025, 1, 9))
@@ -0,0 +1,42 @@
+"""チームのタスク一覧画面のクエリ数（チームタスクの件数に関係なく一定）"""
+from models import Team, User
+
+
+def _create_team(client, app):
+    response = client.post('/team/create', data={'name': 'T1', 'description': 'd'})
+    assert response.status_code == 302
+    with app.app_context():
+        team_id = Team.query.filter_by(name='T1').first().id
+        user_id = User.query.filter_by(username='テスト').first().id
+    client.post(f'/mindmap/{team_id}/create', json={'name': 'm'})
+    node_id = client.post(f'/mindmap/{team_id}/nodes', json={'title': 'root'}).get_json()['node_id']
+    return team_id, user_id, node_id
+
+
+def _add_team_tasks(client, team_id, node_id, user_id, start, count):
+    for index in range(start, start + count):
+        response = client.post(f'/team-task-detail/{team_id}/node/{node_id}/add-task',
+                               data={'title': f'team task {index}', 'assigned_to': [str(user_id)]})
+        assert response.status_code in (200, 302)
+
+
+def _count(client, statements, url):
+    # 未読数のキャッシュなど、初回のみのクエリを含めないよう一度表示してから数える
+    client.get(url)
+    statements.clear()
+    response = client.get(url)
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_team_views_statements_do_not_grow_with_tasks(app, client, statements):
+    team_id, user_id, node_id = _create_team(client, app)
+    team_tasks_url = f'/team-tasks?team_id={team_id}&user_id={user_id}'
+
+    _add_team_tasks(client, team_id, node_id, user_id, 0, 2)
+    few = {url: _count(client, statements, url) for url in ('/mobile/team', team_tasks_url)}
+
+    _add_team_tasks(client, team_id, node_id, user_id, 2, 18)
+    many = {url: _count(client, statements, url) for url in ('/mobile/team', team_tasks_url)}
+
+    assert few == many
@@ -0,0 +1,38 @@
+"""テンプレートからのタスク生成（同じ日の重複防止）"""
+from datetime import date
+
+from models import Task, TaskTemplate, User, db
+
+TODAY = date(2025, 1, 7)
+
+
+def _setup():
+    user_id = User.query.filter_by(username='テスト').first().id
+    db.session.add(TaskTemplate(title='日報', user_id=user_id, repeat_type='daily', category='today'))
+    db.session.commit()
+    return user_id
+
+
+def test_generates_once_per_day(app):
+    from daily_processor import _generate_template_tasks
+
+    with app.app_context():
+        user_id = _setup()
+
+        assert _generate_template_tasks(user_id, TODAY) == 1
+        assert _generate_template_tasks(user_id, TODAY) == 0
+        assert Task.query.filter_by(title='日報', start_date=TODAY).count() == 1
+
+
+def test_skips_task_generated_before_template_id(app):
+    from daily_processor import _generate_template_tasks
+
+    with app.app_context():
+        user_id = _setup()
+        # template_id を記録する前の生成処理で作られたタスク
+        db.session.add(Task(title='日報', user_id=user_id, category='today', priority='medium',
+                            start_date=TODAY, end_date=TODAY))
+        db.session.commit()
+
+        assert _generate_template_tasks(user_id, TODAY) == 0
+        assert Task.query.filter_by(title='日報', start_date=TODAY).count() == 1